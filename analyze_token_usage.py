@@ -1,74 +1,152 @@
+"""
+Token usage report.
+
+Reads the usage log written by app/core/token_usage.py (set TOKEN_USAGE_LOG on the
+services) - one line per LLM call with the tokens reported by the API - and shows
+where the tokens and money go, per chain, per student and per session.
+
+    python analyze_token_usage.py --log token_usage.jsonl [--since-hours 24] [--top 10] [--json]
+    python analyze_token_usage.py --url http://localhost:8001    # live totals from /admin/tokens
+                                                                 # (X-Admin-Token from ADMIN_TOKEN)
+    python analyze_token_usage.py --prompts                      # prompt versions and sizes
+"""
+
+import argparse
+import json
 import os
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+from app.core.prompt_registry import prompt_registry
+
+def new_totals():
+    return {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cached_input_tokens': 0,
+            'estimated_calls': 0, 'cost_usd': 0.0}
+
+
+def add(totals, record):
+    totals['calls'] += 1
+    totals['input_tokens'] += record['input_tokens']
+    totals['output_tokens'] += record['output_tokens']
+    totals['cached_input_tokens'] += record.get('cached_input_tokens', 0)
+    totals['estimated_calls'] += record['source'] == 'estimate'
+    totals['cost_usd'] += record['cost_usd']
+
+
+def load_log(path, since_hours=None):
+    cutoff = time.time() - since_hours * 3600 if since_hours else 0
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if r['timestamp'] >= cutoff]
+
+
+def aggregate(records, top):
+    report = {'total': new_totals(), 'by_chain': defaultdict(new_totals),
+              'by_student': defaultdict(new_totals), 'by_session': defaultdict(new_totals)}
+    for record in records:
+        add(report['total'], record)
+        add(report['by_chain'][record['chain']], record)
+        if record.get('student_id'):
+            add(report['by_student'][record['student_id']], record)
+        if record.get('session_id'):
+            add(report['by_session'][record['session_id']], record)
+    sessions = sorted(report['by_session'].items(), key=lambda kv: kv[1]['cost_usd'], reverse=True)
+    return {
+        'total': report['total'],
+        'by_chain': dict(report['by_chain']),
+        'by_student': dict(report['by_student']),
+        'top_sessions': dict(sessions[:top]),
+        'sessions_tracked': len(sessions),
+    }
+
 
-# Calculate prompt sizes
-files_to_check = {
-    'System Prompt (backend)': 'backend/agents/prompts.py',
-    'Feedback Template (app)': 'app/prompts/deeper_feedback.txt',
-    'T/F/NG Theory': 'app/prompts/tfng_theory_compact.txt'
-}
-
-print("=" * 70)
-print("FEEDBACK TOKEN USAGE BREAKDOWN")
-print("=" * 70)
-print()
-
-sizes = {}
-for name, path in files_to_check.items():
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            char_count = len(content)
-            token_estimate = char_count // 4
-            sizes[name] = {'chars': char_count, 'tokens': token_estimate}
+def print_table(title, rows, grand_total):
+    print(title)
+    print(f"  {'':28} {'calls':>7} {'input':>10} {'cached':>7} {'output':>9} {'avg in':>7} {'avg out':>7} "
+          f"{'cost $':>9} {'share':>6}")
+    for name, t in sorted(rows.items(), key=lambda kv: kv[1]['input_tokens'] + kv[1]['output_tokens'], reverse=True):
+        calls = max(t['calls'], 1)
+        tokens = t['input_tokens'] + t['output_tokens']
+        share = tokens / grand_total if grand_total else 0
+        estimated = ' *' if t.get('estimated_calls') else ''
+        cached = t.get('cached_input_tokens', 0) / t['input_tokens'] if t['input_tokens'] else 0
+        print(f"  {str(name)[:28]:28} {t['calls']:7,} {t['input_tokens']:10,} {cached:7.1%} {t['output_tokens']:9,} "
+              f"{t['input_tokens'] // calls:7,} {t['output_tokens'] // calls:7,} {t['cost_usd']:9.4f} {share:6.1%}{estimated}")
+    print()
+
+
+def print_report(report):
+    total = report['total']
+    grand = total['input_tokens'] + total['output_tokens']
+    print("=" * 70)
+    print("TOKEN USAGE REPORT")
+    print("=" * 70)
+    print(f"{'LLM calls':35} {total['calls']:,}")
+    print(f"{'Input tokens':35} {total['input_tokens']:,}")
+    print(f"{'Output tokens':35} {total['output_tokens']:,}")
+    if total['input_tokens']:
+        print(f"{'Input served from prompt cache':35} {total.get('cached_input_tokens', 0):,} "
+              f"({total.get('cached_input_tokens', 0) / total['input_tokens']:.1%})")
+    print(f"{'Estimated cost':35} ${total['cost_usd']:.4f}")
+    if total['calls']:
+        print(f"{'Cost per call':35} ${total['cost_usd'] / total['calls']:.5f}")
+    if total.get('estimated_calls'):
+        print(f"{'Calls counted with the tokenizer':35} {total['estimated_calls']:,} (no usage metadata)")
+    print()
+    print_table("BY CHAIN:", report['by_chain'], grand)
+    if report['by_student']:
+        print_table("BY STUDENT:", report['by_student'], grand)
+    if report['top_sessions']:
+        print_table(f"TOP SESSIONS (of {report['sessions_tracked']:,}):", report['top_sessions'], grand)
+    print("* includes calls counted locally because the response had no usage metadata")
+
+
+def print_prompt_sizes():
+    print("=" * 70)
+    print("PROMPT SIZES (app/prompts via the prompt registry, tokenizer count)")
+    print("=" * 70)
+    prompt_registry.preload()
+    total = 0
+    for name, info in prompt_registry.stats()['prompts'].items():
+        total += info['tokens']
+        print(f"{name:35} v{info['version']} {info['chars']:7,} chars = {info['tokens']:6,} tokens")
+        for segment, segment_info in info['segments'].items():
+            print(f"  + segment {segment:25} {segment_info['tokens']:23,} tokens")
+    print("-" * 70)
+    print(f"{'TOTAL':35} {total:29,} tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--log', default=os.getenv('TOKEN_USAGE_LOG', 'token_usage.jsonl'))
+    parser.add_argument('--url', help='read live totals from a running service instead of the log')
+    parser.add_argument('--since-hours', type=float)
+    parser.add_argument('--top', type=int, default=10, help='sessions to list')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--prompts', action='store_true', help='show prompt versions and sizes and exit')
+    args = parser.parse_args()
+
+    if args.prompts:
+        print_prompt_sizes()
+        return
+
+    if args.url:
+        request = urllib.request.Request(f"{args.url.rstrip('/')}/admin/tokens?top_sessions={args.top}",
+                                         headers={'X-Admin-Token': os.getenv('ADMIN_TOKEN', '')})
+        with urllib.request.urlopen(request) as response:
+            report = json.loads(response.read())
+    else:
+        if not os.path.exists(args.log):
+            sys.exit(f"No usage log at {args.log} - start the services with TOKEN_USAGE_LOG={args.log}")
+        report = aggregate(load_log(args.log, args.since_hours), args.top)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
     else:
-        sizes[name] = {'chars': 0, 'tokens': 0}
-
-# Display breakdown
-total_tokens = 0
-for name, data in sizes.items():
-    print(f"{name:35} {data['chars']:6,} chars = ~{data['tokens']:5,} tokens")
-    total_tokens += data['tokens']
-
-print("-" * 70)
-print(f"{'TOTAL PROMPTS':35} ~{total_tokens:6,} tokens")
-print()
-
-# Add variable costs per interaction
-print("PLUS per interaction (variable):")
-print(f"{'  Passage text':35} ~500-800 tokens")
-print(f"{'  Question statement':35} ~20-50 tokens")
-print(f"{'  Correct answer':35} ~5-10 tokens")
-print(f"{'  Student answer':35} ~5-10 tokens")
-print("-" * 70)
-input_low = total_tokens + 530
-input_high = total_tokens + 870
-print(f"{'TOTAL INPUT (to LLM)':35} ~{input_low:,}-{input_high:,} tokens")
-print()
-
-print("OUTPUT (from LLM):")
-print(f"{'  LLM Response (feedback)':35} ~300-500 tokens")
-print("=" * 70)
-grand_low = input_low + 300
-grand_high = input_high + 500
-print(f"{'GRAND TOTAL PER FEEDBACK':35} ~{grand_low:,}-{grand_high:,} tokens")
-print()
-
-# Cost estimate
-input_cost_per_1k = 0.0025  # GPT-4 Turbo input pricing
-output_cost_per_1k = 0.01   # GPT-4 Turbo output pricing
-
-input_cost = ((input_low + input_high) / 2 / 1000) * input_cost_per_1k
-output_cost = (400 / 1000) * output_cost_per_1k
-
-total_cost = input_cost + output_cost
-
-print(f"Estimated cost per feedback: ${total_cost:.4f}")
-print()
-
-# Breakdown by component
-print("WHERE THE TOKENS GO:")
-print(f"  System Prompt: ~{sizes.get('System Prompt (backend)', {}).get('tokens', 0):,} tokens (fixed)")
-print(f"  T/F/NG Theory: ~{sizes.get('T/F/NG Theory', {}).get('tokens', 0):,} tokens (NEWLY ADDED)")
-print(f"  Feedback Template: ~{sizes.get('Feedback Template (app)', {}).get('tokens', 0):,} tokens (fixed)")
-print(f"  Passage + Q&A: ~500-850 tokens (variable, biggest component)")
-print(f"  LLM Output: ~300-500 tokens (variable)")
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
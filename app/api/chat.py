@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 
 from app.services.agent_service import AgentService, DeeperFeedbackResponse
+from app.services.turn_guard import IdempotencyConflict, TurnBusy
+from app.core.disconnect import run_until_disconnect
 from app.models.chat_models import DeeperFeedbackRequest, ChatRequest, ChatMessage
 
 
@@ -23,6 +25,7 @@ def get_agent_service():
 @router.post("/feedback/deeper", response_model=DeeperFeedbackResponse)
 async def get_deeper_feedback(
     request: DeeperFeedbackRequest,
+    http_request: Request,
     service: AgentService = Depends(get_agent_service)
 ):
     # Get full context for the question
@@ -31,8 +34,9 @@ async def get_deeper_feedback(
         request.student_answer
     )
     
-    # Generate deeper feedback
-    result = await service.generate_deeper_feedback(context)
+    # Generate deeper feedback (cancelled if the client disconnects)
+    result = await run_until_disconnect(
+        http_request, service.generate_deeper_feedback(context), "tutor", "/api/feedback/deeper")
     
     return result
 
@@ -40,16 +44,34 @@ async def get_deeper_feedback(
 @router.post("/chat/message", response_model=ChatMessage)
 async def post_chat_message(
     request: ChatRequest,
-    service: AgentService = Depends(get_agent_service)
+    http_request: Request,
+    service: AgentService = Depends(get_agent_service),
+    idempotency_key: str | None = Header(None)
 ):
     """
     This is the main endpoint for the interactive chat.
     It receives the current conversation history and returns the agent's next message.
+    The turn's LLM calls are cancelled if the client disconnects before the reply is ready.
     """
-    response_message = await service.handle_chat_message(
-        session_id=request.session_id,
-        messages=request.messages,
-        dropped_question_id=request.dropped_question_id
-    )
+    if not request.messages:
+        raise HTTPException(status_code=422, detail="messages must contain at least the student's message")
+    try:
+        response_message = await run_until_disconnect(http_request, service.handle_chat_message(
+            session_id=request.session_id,
+            messages=request.messages,
+            dropped_question_id=request.dropped_question_id,
+            idempotency_key=idempotency_key or request.idempotency_key
+        ), "tutor", "/api/chat/message")
+    except TurnBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     return response_message
 
+
+
+def active_session_count() -> int:
+    """Sessions held in memory by the agent service (0 before the first request)."""
+    if _agent_service_instance is None:
+        return 0
+    return len(_agent_service_instance.active_sessions)
@@ -0,0 +1,44 @@
+# app/core/deadline.py
+
+"""
+Per-turn deadline propagated through contextvars.
+
+handle_chat_message opens an llm_deadline() block; everything awaited inside it
+(rate limiter admission, hedged chains) sees the same absolute deadline without
+passing it through every call.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def llm_deadline(seconds: float) -> Iterator[None]:
+    """LLM work in this block must finish (or start, for queued calls) within `seconds`."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    """Absolute time.monotonic() deadline of the enclosing llm_deadline block, if any."""
+    return _deadline.get()
+
+
+def set_deadline(deadline: Optional[float]) -> None:
+    """Set the absolute deadline of the current context (work started in a fresh contextvars.Context)."""
+    _deadline.set(deadline)
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current deadline (None when there is none)."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
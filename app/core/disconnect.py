@@ -0,0 +1,143 @@
+# app/core/disconnect.py
+
+"""
+Stop a request's LLM work when its client goes away.
+
+run_until_disconnect() runs an endpoint's work as a task next to a watcher that waits
+for the ASGI http.disconnect message (no polling). When the student closes the tab or
+the frontend gives up first, the task is cancelled: every ainvoke it is awaiting is
+cancelled and its HTTP request to the provider closed, and so are the subtasks it
+awaits through gather(), hedged attempts and single-flight calls nobody else waits for.
+The endpoint then ends with ClientDisconnected, which the apps answer with 499.
+
+Work that is worth finishing anyway runs under finish_anyway(): its caller stops
+waiting, but the work completes and its result goes to a callback (the tutor keeps a
+generated practice battle for the session's next request).
+
+The LLM calls in flight at the moment of cancellation are tracked per request (the
+callbacks in app.core.llm_callbacks call track_llm_call / untrack_llm_call) and charged
+to the token ledger as cancelled, with the output tokens they did not generate
+estimated from their chain's average. Counters: http_requests_cancelled_total{app,route},
+llm_calls_cancelled_total{chain}, llm_tokens_saved_total{chain}.
+
+    CANCEL_ON_DISCONNECT   set to false to let requests run to completion (default true)
+
+No app.core.config import: the backend service uses this too.
+"""
+
+import asyncio
+import logging
+import os
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.core.metrics import registry
+from app.core.token_usage import token_ledger
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CANCEL_ON_DISCONNECT = os.getenv("CANCEL_ON_DISCONNECT", "true").strip().lower() != "false"
+
+HTTP_REQUESTS_CANCELLED = registry.counter(
+    "http_requests_cancelled_total", "Requests whose work was cancelled because the client disconnected.",
+    ["app", "route"])
+WORK_KEPT = registry.counter(
+    "cancelled_work_kept_total", "Work that finished after its client disconnected and was kept.", ["kind"])
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready; the work was cancelled."""
+
+
+# run_id -> (chain, model) of the LLM calls in flight for the current request
+_in_flight: ContextVar[Optional[Dict[Any, Tuple[str, str]]]] = ContextVar("llm_calls_in_flight", default=None)
+# Called with the run_id of every call cancelled in flight (handlers drop their state for it)
+_cancel_listeners: List[Callable[[Any], None]] = []
+
+
+def track_llm_call(run_id: Any, chain: str, model: str) -> None:
+    calls = _in_flight.get()
+    if calls is not None:
+        calls[run_id] = (chain, model)
+
+
+def untrack_llm_call(run_id: Any) -> None:
+    calls = _in_flight.get()
+    if calls is not None:
+        calls.pop(run_id, None)
+
+
+def on_llm_call_cancelled(listener: Callable[[Any], None]) -> None:
+    _cancel_listeners.append(listener)
+
+
+async def _wait_for_disconnect(receive: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+    # The body has been read by now, so the next message is the disconnect
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def run_until_disconnect(request: Any, work: Awaitable[T], app: str, route: str) -> T:
+    """
+    Await `work`, cancelling it (and raising ClientDisconnected) if the client disconnects first.
+    `work` must be a coroutine that has not started, so its calls are tracked for this request.
+    """
+    if not CANCEL_ON_DISCONNECT:
+        return await work
+    calls: Dict[Any, Tuple[str, str]] = {}
+    token = _in_flight.set(calls)
+    try:
+        task = asyncio.ensure_future(work)     # copies the context: the task sees `calls`
+    finally:
+        _in_flight.reset(token)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request.receive))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        if not watcher.done():
+            watcher.cancel()
+    if task.done() or watcher.exception() is not None:
+        return await task
+
+    in_flight = dict(calls)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.debug(f"[DISCONNECT] {route}: cancelled work ended with {e!r}")
+    saved = 0
+    for run_id, (chain, model) in in_flight.items():
+        saved += token_ledger.record_cancelled(chain, model)
+        for listener in _cancel_listeners:
+            listener(run_id)
+    HTTP_REQUESTS_CANCELLED.inc(1, app=app, route=route)
+    logger.info(f"[DISCONNECT] {route}: client went away, cancelled {len(in_flight)} LLM call(s) in flight "
+                f"(~{saved} output tokens saved)")
+    raise ClientDisconnected(f"client disconnected from {route}")
+
+
+async def finish_anyway(work: Awaitable[T], keep: Callable[[T], None], kind: str) -> T:
+    """Await `work`; if the caller is cancelled, let it finish and pass its result to `keep`."""
+    token = _in_flight.set(None)     # its calls are not the request's: they are not cancelled
+    try:
+        task = asyncio.ensure_future(work)
+    finally:
+        _in_flight.reset(token)
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        def done(finished: "asyncio.Task") -> None:
+            if finished.cancelled() or finished.exception() is not None:
+                return
+            keep(finished.result())
+            WORK_KEPT.inc(1, kind=kind)
+            logger.info(f"[DISCONNECT] Kept a {kind} finished after its client went away")
+        task.add_done_callback(done)
+        raise
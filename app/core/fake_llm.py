@@ -0,0 +1,541 @@
+# app/core/fake_llm.py
+
+"""
+Record/replay fake LLM provider for offline runs and load tests.
+
+Selected by app.core.llm with LLM_PROVIDER (OPENAI_API_KEY may be any placeholder):
+
+    LLM_PROVIDER=openai   real OpenAI models (default)
+    LLM_PROVIDER=fake     FakeChatModel / FakeEmbeddings, no network
+    LLM_PROVIDER=record   real OpenAI models; every chat response is appended to the cassette
+
+Fake settings:
+
+    FAKE_LLM_CASSETTE       JSONL of recorded responses keyed by prompt hash; replayed
+                            when a prompt matches, otherwise a synthetic reply is generated
+    FAKE_LLM_LATENCY        "none" | "fixed:MS" | "uniform:MIN_MS:MAX_MS" |
+                            "lognormal:MEDIAN_MS:SIGMA"                    (default none)
+    FAKE_LLM_MS_PER_TOKEN   extra latency per output token, ms             (default 0)
+    FAKE_LLM_SEED           seed for latency and synthetic content         (default 42)
+    FAKE_EMBEDDING_DIM      size of the fake embedding vectors             (default 256)
+    FAKE_LLM_PROMPT_CACHE   simulate provider prompt caching and report
+                            cache_read tokens in usage metadata            (default true)
+
+Synthetic replies are chosen by recognising the prompt: router (RouterOutput), micro
+battles (MicroBattle), deeper feedback (DeeperFeedbackResponse), backend feedback
+(FeedbackOutput), explanations, evidence re-asks and hints; anything else gets a short
+plain-text tutor reply. JSON replies are schema-valid for those models.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult, LLMResult
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_hash(messages: Sequence[BaseMessage]) -> str:
+    """Stable key for a prompt: roles and contents only (model settings are ignored)."""
+    payload = json.dumps([[m.type, m.content] for m in messages], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ---------------------------------------------------------------------------
+# Latency
+# ---------------------------------------------------------------------------
+
+class LatencyModel:
+    """Samples a response latency (seconds) from a FAKE_LLM_LATENCY spec."""
+
+    def __init__(self, spec: str = "none", ms_per_token: float = 0.0, seed: int = 42):
+        self.spec = spec or "none"
+        self.ms_per_token = ms_per_token
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sample_ms = self._parse(self.spec)
+
+    def _parse(self, spec: str) -> Callable[[], float]:
+        kind, _, args = spec.partition(":")
+        values = [float(v) for v in args.split(":") if v]
+        if kind == "none":
+            return lambda: 0.0
+        if kind == "fixed" and len(values) == 1:
+            return lambda: values[0]
+        if kind == "uniform" and len(values) == 2:
+            return lambda: self._rng.uniform(values[0], values[1])
+        if kind == "lognormal" and len(values) == 2:
+            return lambda: self._rng.lognormvariate(math.log(values[0]), values[1])
+        raise ValueError(f"Unknown FAKE_LLM_LATENCY spec: {spec!r}")
+
+    def sample(self, output_tokens: int = 0) -> float:
+        with self._lock:
+            return (self._sample_ms() + self.ms_per_token * output_tokens) / 1000.0
+
+
+# ---------------------------------------------------------------------------
+# Prompt cache
+# ---------------------------------------------------------------------------
+
+class PrefixCacheModel:
+    """
+    Provider-style prompt cache (modelled on OpenAI's): prompts of at least
+    `min_tokens` reuse the longest prefix seen before, counted in `block_tokens`
+    blocks; a cached prefix shorter than `min_tokens` counts as a miss.
+    """
+
+    def __init__(self, min_tokens: int = 1024, block_tokens: int = 128, max_blocks: int = 100_000):
+        self.min_tokens = min_tokens
+        self.block_tokens = block_tokens
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[bytes, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached_tokens(self, messages: Sequence[BaseMessage]) -> int:
+        text = "".join(f"<{m.type}>{m.content}" for m in messages)
+        if _estimate_tokens(text) < self.min_tokens:
+            return 0
+        block_chars = self.block_tokens * 4
+        digest = hashlib.sha1()
+        cached_blocks, hit = 0, True
+        with self._lock:
+            for start in range(0, len(text) - block_chars + 1, block_chars):
+                digest.update(text[start:start + block_chars].encode("utf-8"))
+                key = digest.digest()  # hash of the whole prefix up to this block
+                if hit and key in self._blocks:
+                    cached_blocks += 1
+                    self._blocks.move_to_end(key)
+                else:
+                    hit = False
+                    self._blocks[key] = None
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        cached = cached_blocks * self.block_tokens
+        return cached if cached >= self.min_tokens else 0
+
+
+# ---------------------------------------------------------------------------
+# Cassette (record/replay)
+# ---------------------------------------------------------------------------
+
+class Cassette:
+    """Recorded responses, one JSON object per line: {"key", "content", "model", "recorded_at"}."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+        self._entries: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, str]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and self.path.exists():
+                with self.path.open(encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._entries[entry["key"]] = entry["content"]
+                logger.info(f"[FAKE_LLM] Loaded {len(self._entries)} recorded responses from {self.path}")
+        return self._entries
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._load().get(key)
+
+    def record(self, key: str, content: str, model: str = "") -> None:
+        if self.path is None:
+            return
+        entry = {"key": key, "content": content, "model": model, "recorded_at": time.time()}
+        with self._lock:
+            self._load()[key] = content
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+
+class CassetteRecorder(BaseCallbackHandler):
+    """Callback for real chat models (LLM_PROVIDER=record): writes every response to the cassette."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self._pending: Dict[Any, str] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]],
+                            *, run_id: Any, **kwargs: Any) -> None:
+        self._pending[run_id] = prompt_hash(messages[0])
+
+    def on_llm_end(self, response: LLMResult, *, run_id: Any, **kwargs: Any) -> None:
+        key = self._pending.pop(run_id, None)
+        if key is not None and response.generations and response.generations[0]:
+            model = (response.llm_output or {}).get("model_name", "")
+            self.cassette.record(key, response.generations[0][0].text, model)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._pending.pop(run_id, None)
+
+
+# ---------------------------------------------------------------------------
+# Synthetic responses
+# ---------------------------------------------------------------------------
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+_FILLER_SENTENCES = [
+    "Researchers have studied {topic} for several decades.",
+    "Early studies suggested that {topic} changed slowly over time.",
+    "More recent work, however, shows a far more complex picture.",
+    "Several factors appear to interact, including climate, economics and human behaviour.",
+    "Some experts argue that the evidence is still incomplete.",
+    "Others believe that practical applications will follow within a generation.",
+    "A survey of 2,000 participants found that most were unaware of these findings.",
+    "The authors concluded that further long-term research is essential.",
+]
+
+
+def _field(prompt: str, label: str) -> str:
+    match = re.search(rf"^{re.escape(label)}:[ \t]*(.*)$", prompt, re.MULTILINE)
+    return match.group(1).strip() if match else ""
+
+
+def _passage(prompt: str) -> str:
+    for pattern in (r"passage_text:\s*(.+?)\n(?:question_statement|student_answer):",
+                    r"PASSAGE:\n(.+?)\n\n",
+                    r'Passage: "(.+?)"\n'):
+        match = re.search(pattern, prompt, re.DOTALL)
+        if match:
+            return match.group(1).strip()
+    return ""
+
+
+def _first_sentence(text: str) -> str:
+    for sentence in _SENTENCE_RE.split(text.strip()):
+        sentence = sentence.strip().strip('"')
+        if len(sentence.split()) >= 4:
+            return sentence
+    return text.strip()[:200]
+
+
+_LEVEL_WORDS = {"1": "beginner", "beginner": "beginner", "2": "intermediate",
+                 "intermediate": "intermediate", "3": "advanced", "advanced": "advanced"}
+
+
+def _router(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    message = _field(prompt, "User message").lower()
+    history = prompt.split("Chat history:", 1)[-1].split("User message:", 1)[0]
+    awaiting_reasoning = "say 'skip'" in history[history.rfind("assistant:"):]
+    if any(word in message for word in ("skip", "just tell me", "i don't know", "not sure")):
+        action, parameters = "GENERATE_EXPLANATION", {"skip_socratic": True}
+    elif awaiting_reasoning:
+        action, parameters = "ASK_SOCRATIC_QUESTION", {"follow_up": True}
+    elif message.strip(" .!") in _LEVEL_WORDS:
+        action, parameters = "GENERATE_MICRO_BATTLE", {"level": _LEVEL_WORDS[message.strip(" .!")]}
+    elif any(word in message for word in ("hint", "clue")):
+        action, parameters = "GENERATE_HINT", {"hint_level": "low"}
+    elif any(word in message for word in ("battle", "practice", "quiz", "test me", "exercise")):
+        level = next((lvl for lvl in ("beginner", "intermediate", "advanced") if lvl in message), "intermediate")
+        action, parameters = "GENERATE_MICRO_BATTLE", {"level": level}
+    elif any(word in message for word in ("explain", "breakdown", "why")):
+        action, parameters = "GENERATE_EXPLANATION", {"explanation_depth": "brief"}
+    elif re.search(r"\b(true|false|not given)\b", message):
+        action, parameters = "PROVIDE_FEEDBACK", {}
+    elif any(word in message for word in ("struggl", "problem", "help")):
+        action, parameters = "ASK_FOR_CLARIFICATION", {}
+    elif message.endswith("?"):
+        action, parameters = "ANSWER_GENERAL_QUESTION", {"target_skill": "general"}
+    else:
+        action, parameters = "CHITCHAT", {}
+    return {
+        "action": action,
+        "parameters": parameters,
+        "confidence": round(rng.uniform(0.7, 0.95), 2),
+        "reason": "synthetic routing",
+    }
+
+
+def _micro_battle(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    level = _field(prompt, "Level").lower()
+    level = level if level in ("beginner", "intermediate", "advanced") else "intermediate"
+    topic = _field(prompt, "Topic") or rng.choice(["urban beekeeping", "deep-sea mining", "sleep research"])
+    sentences = [s.format(topic=topic) for s in _FILLER_SENTENCES]
+    passage = [" ".join(sentences[:4]), " ".join(sentences[4:])]
+    words = sum(len(p.split()) for p in passage)
+
+    if "T/F/NG practice session" in prompt:
+        formats = ["true-false-not-given"] * 5
+    elif "Multiple Choice practice session" in prompt:
+        formats = ["multiple-choice"] * 3
+    elif "Short Answer practice session" in prompt:
+        formats = ["short-answer"] * 3
+    else:
+        formats = ["multiple-choice", "short-answer", "true-false-not-given"]
+    skills = ["GIST", "DETAIL", "INFERENCE"]
+
+    questions = []
+    for i, question_format in enumerate(formats, start=1):
+        question: Dict[str, Any] = {
+            "id": i,
+            "skill": skills[(i - 1) % 3],
+            "format": question_format,
+            "rationale": f"Paragraph {1 + (i - 1) % 2}: \"{_first_sentence(passage[(i - 1) % 2])}\"",
+        }
+        if question_format == "multiple-choice":
+            question["question_text"] = f"What is the main point of paragraph {1 + (i - 1) % 2}?"
+            question["options"] = ["A) Research is complex", "B) Nothing has changed",
+                                   "C) The survey failed", "D) Experts fully agree"]
+            question["correct_answer"] = "A"
+        elif question_format == "short-answer":
+            question["question_text"] = "How many participants took part in the survey?"
+            question["correct_answer"] = "2,000"
+        else:
+            question["question_text"] = f"Experts agree that research on {topic} is complete."
+            question["correct_answer"] = rng.choice(["TRUE", "FALSE", "NOT GIVEN"])
+        questions.append(question)
+
+    return {
+        "level": level,
+        "topic": topic,
+        "time_target_seconds": 60 * len(questions) + 30,
+        "words_count": words,
+        "passage": passage,
+        "questions": questions,
+    }
+
+
+def _deeper_feedback(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    student, correct = _field(prompt, "student_answer"), _field(prompt, "correct_answer")
+    verdict = (f"You chose {student}, which is correct!" if student.upper() == correct.upper()
+               else f"You chose {student}, but the correct answer is {correct}.")
+    return {
+        "errorAnalysis": f"{verdict} The key is how the passage treats the `main claim` of the statement.",
+        "strategyTip": "Find the `key words`, scan for synonyms, then compare the statement sentence by sentence.",
+        "evidenceQuote": _first_sentence(_passage(prompt)),
+        "motivationalMessage": "Nice work sticking with it - this skill improves quickly with practice.",
+    }
+
+
+def _feedback(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    student, correct = _field(prompt, "STUDENT'S ANSWER"), _field(prompt, "CORRECT ANSWER")
+    is_correct = student.strip().lower() == correct.strip().lower()
+    return {
+        "is_correct": is_correct,
+        "feedback": "Well done - your answer matches the passage." if is_correct
+                    else f"Not quite - the passage supports '{correct}', not '{student}'.",
+        "reasoning": "1. Locate the paragraph. 2. Compare the statement with the text. 3. Decide.",
+        "strategy_tip": "Underline key words and scan for paraphrases before choosing.",
+        "passage_reference": _first_sentence(_passage(prompt)),
+        "confidence": "high",
+    }
+
+
+def _explanation(word: str) -> Dict[str, str]:
+    return {
+        "word": word,
+        "definition": f"A word or phrase meaning something related to '{word}'.",
+        "context_meaning": f"In this passage, '{word}' refers to the idea being discussed.",
+        "example_sentence": f"The article used '{word}' to describe the main idea.",
+    }
+
+
+def _explain_many(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    block = prompt.split("SELECTED TEXTS (one per line):", 1)[1].split("\n\n", 1)[0]
+    return {"explanations": [_explanation(line.strip()) for line in block.splitlines() if line.strip()]}
+
+
+def _explain_one(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    return _explanation(_field(prompt, "SELECTED TEXT"))
+
+
+def _evidence_reask(prompt: str, rng: random.Random) -> str:
+    return _first_sentence(_passage(prompt)) or "NONE"
+
+
+def _hint(prompt: str, rng: random.Random) -> str:
+    return rng.choice([
+        "Which paragraph mentions the key idea in the statement?",
+        "Does the passage agree, disagree, or say nothing about this?",
+        "Look for a synonym of the main noun - where does it appear?",
+    ])
+
+
+def _chat(prompt: str, rng: random.Random) -> str:
+    return rng.choice([
+        "Great question! Think of scanning like finding your favourite coffee shop on a busy street - "
+        "you look for the sign, not every shop window. Want to try a quick practice battle?",
+        "You're doing well. For True/False/Not Given, always ask: does the passage agree, contradict, "
+        "or stay silent? Shall we practise that now?",
+        "Let's break it down step by step. First, underline the key words in the question, then scan "
+        "the passage for synonyms. Would you like a hint or a new passage?",
+    ])
+
+
+# (name, recogniser, generator) - first match wins; the JSON ones are serialised
+_RESPONDERS: List[Tuple[str, Callable[[str], bool], Callable[[str, random.Random], Any]]] = [
+    ("router", lambda p: "planning/routing component" in p, _router),
+    ("micro_battle", lambda p: "Generate a" in p and '"questions"' in p and "Level:" in p, _micro_battle),
+    ("deeper_feedback", lambda p: "errorAnalysis" in p, _deeper_feedback),
+    ("evidence_reask", lambda p: "was NOT found in the passage" in p, _evidence_reask),
+    ("feedback", lambda p: "passage_reference" in p and "STUDENT'S ANSWER" in p, _feedback),
+    ("explain_many", lambda p: "SELECTED TEXTS (one per line):" in p, _explain_many),
+    ("explain", lambda p: "SELECTED TEXT:" in p, _explain_one),
+    ("hint", lambda p: "provide a single, short hint" in p, _hint),
+    ("chat", lambda p: True, _chat),
+]
+
+
+def synthesize(prompt: str, rng: random.Random) -> Tuple[str, str]:
+    """Returns (responder name, reply text) for a flattened prompt."""
+    for name, matches, generate in _RESPONDERS:
+        if matches(prompt):
+            reply = generate(prompt, rng)
+            return name, reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False)
+    raise AssertionError("unreachable: the chat responder matches everything")
+
+
+# ---------------------------------------------------------------------------
+# Provider and LangChain models
+# ---------------------------------------------------------------------------
+
+class FakeLLMProvider:
+    """Shared state of all fake models: cassette, latency model and counters."""
+
+    def __init__(self):
+        seed = int(os.getenv("FAKE_LLM_SEED", 42))
+        self.cassette = Cassette(os.getenv("FAKE_LLM_CASSETTE"))
+        self.latency = LatencyModel(
+            os.getenv("FAKE_LLM_LATENCY", "none"),
+            ms_per_token=float(os.getenv("FAKE_LLM_MS_PER_TOKEN", 0)),
+            seed=seed,
+        )
+        self.embedding_dim = int(os.getenv("FAKE_EMBEDDING_DIM", 256))
+        self.prompt_cache = (PrefixCacheModel()
+                             if os.getenv("FAKE_LLM_PROMPT_CACHE", "true").lower() == "true" else None)
+        self.counters: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def respond(self, messages: Sequence[BaseMessage]) -> Tuple[str, float]:
+        """Reply text and the latency to simulate for it."""
+        key = prompt_hash(messages)
+        content = self.cassette.get(key)
+        with self._lock:
+            if content is not None:
+                self.counters["replayed"] += 1
+            else:
+                prompt = "\n".join(str(m.content) for m in messages)
+                name, content = synthesize(prompt, self._rng)
+                self.counters[f"synthetic:{name}"] += 1
+            self.counters["calls"] += 1
+        return content, self.latency.sample(_estimate_tokens(content))
+
+    def embed(self, text: str) -> List[float]:
+        """Deterministic bag-of-words vector (hashed), L2-normalised."""
+        vector = [0.0] * self.embedding_dim
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.embedding_dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, "cassette_entries": len(self.cassette), "latency": self.latency.spec}
+
+
+class FakeChatModel(BaseChatModel):
+    """Drop-in chat model: replays the cassette or synthesises a reply, with injected latency."""
+
+    model_name: str = "fake"
+    provider: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-replay"
+
+    def _result(self, content: str, messages: List[BaseMessage]) -> ChatResult:
+        input_tokens = sum(_estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = _estimate_tokens(content)
+        cached_tokens = 0
+        if self.provider.prompt_cache is not None:
+            cached_tokens = min(self.provider.prompt_cache.cached_tokens(messages), input_tokens)
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens,
+                 "input_token_details": {"cache_read": cached_tokens}}
+        message = AIMessage(
+            content=content,
+            usage_metadata=usage,
+            response_metadata={"model_name": self.model_name, "token_usage": {
+                "prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            }},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"model_name": self.model_name})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        content, delay = self.provider.respond(messages)
+        if delay > 0:
+            time.sleep(delay)
+        return self._result(content, messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        content, delay = self.provider.respond(messages)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._result(content, messages)
+
+
+class FakeEmbeddings(Embeddings):
+    """Drop-in embeddings: deterministic hashed vectors, with injected latency per call."""
+
+    def __init__(self, provider: FakeLLMProvider):
+        self.provider = provider
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        delay = self.provider.latency.sample()
+        if delay > 0:
+            time.sleep(delay)
+        return [self.provider.embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        delay = self.provider.latency.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return [self.provider.embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+# Singleton instance
+fake_llm_provider = FakeLLMProvider()
@@ -0,0 +1,220 @@
+# app/core/http_client.py
+
+"""
+Process-wide HTTP clients for every LLM and embedding client.
+
+All OpenAI-compatible clients (both apps) share one connection pool per process, so
+TLS handshakes and keep-alive connections are reused across chains. Configured from
+environment variables (no app.core.config import, the backend service uses this too):
+
+    LLM_HTTP_MAX_CONNECTIONS    total pool size                      (default 100)
+    LLM_HTTP_MAX_KEEPALIVE      idle keep-alive connections          (default 20)
+    LLM_HTTP_KEEPALIVE_EXPIRY   seconds an idle connection is kept   (default 30)
+    LLM_HTTP_CONNECT_TIMEOUT    connect timeout, seconds             (default 5)
+    LLM_HTTP_READ_TIMEOUT       read/write timeout, seconds          (default 60)
+    LLM_HTTP_POOL_TIMEOUT       wait for a free connection, seconds  (default 10)
+    LLM_HTTP2                   "true"/"false", needs the h2 package (default true)
+
+The async client binds its connections to the event loop that first uses it, i.e.
+the server loop. Scripts that call asyncio.run() repeatedly should call
+aclose_http_clients() at the end of each run.
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.rate_limiter import (
+    RateLimitedAsyncTransport,
+    RateLimitedSyncTransport,
+    RateLimiter,
+    rate_limiter,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+@dataclass
+class HttpClientSettings:
+    """Pool and timeout settings shared by the sync and async clients."""
+    max_connections: int = field(default_factory=lambda: int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 100)))
+    max_keepalive_connections: int = field(default_factory=lambda: int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", 20)))
+    keepalive_expiry: float = field(default_factory=lambda: _env_float("LLM_HTTP_KEEPALIVE_EXPIRY", 30))
+    connect_timeout: float = field(default_factory=lambda: _env_float("LLM_HTTP_CONNECT_TIMEOUT", 5))
+    read_timeout: float = field(default_factory=lambda: _env_float("LLM_HTTP_READ_TIMEOUT", 60))
+    pool_timeout: float = field(default_factory=lambda: _env_float("LLM_HTTP_POOL_TIMEOUT", 10))
+    http2: bool = field(default_factory=lambda: os.getenv("LLM_HTTP2", "true").lower() == "true")
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.read_timeout,
+            pool=self.pool_timeout,
+        )
+
+    def http2_enabled(self) -> bool:
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("[HTTP] LLM_HTTP2 is on but the h2 package is missing - using HTTP/1.1")
+            return False
+        return self.http2
+
+
+class ConnectionStats:
+    """
+    Connection reuse counters, fed by httpx trace events.
+
+    A request that does not open a TCP connection went over a pooled one
+    (keep-alive, or a multiplexed HTTP/2 stream).
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _on_event(self, event_name: str) -> None:
+        key = _TRACE_EVENTS.get(event_name)
+        if key:
+            with self._lock:
+                self.counts[key] += 1
+
+    def on_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.counts["requests"] += 1
+        request.extensions["trace"] = self._trace_sync
+
+    async def aon_request(self, request: httpx.Request) -> None:
+        with self._lock:
+            self.counts["requests"] += 1
+        request.extensions["trace"] = self._trace_async
+
+    def _trace_sync(self, event_name: str, info: Dict[str, Any]) -> None:
+        self._on_event(event_name)
+
+    async def _trace_async(self, event_name: str, info: Dict[str, Any]) -> None:
+        self._on_event(event_name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.counts)
+        requests = counts.get("requests", 0)
+        opened = counts.get("connections_opened", 0)
+        return {
+            **counts,
+            "requests": requests,
+            "connections_opened": opened,
+            "reused": max(0, requests - opened),
+            "reuse_ratio": round((requests - opened) / requests, 3) if requests else 0.0,
+        }
+
+
+# httpcore trace event -> counter name
+_TRACE_EVENTS = {
+    "connection.connect_tcp.complete": "connections_opened",
+    "connection.start_tls.complete": "tls_handshakes",
+    "http11.send_request_headers.started": "http11_requests",
+    "http2.send_request_headers.started": "http2_requests",
+}
+
+
+class HttpClientFactory:
+    """Lazily builds the shared sync and async httpx clients."""
+
+    def __init__(self, settings: Optional[HttpClientSettings] = None, limiter: Optional[RateLimiter] = rate_limiter):
+        self.settings = settings or HttpClientSettings()
+        self.limiter = limiter
+        self.sync_stats = ConnectionStats()
+        self.async_stats = ConnectionStats()
+        self._sync_client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    def get_sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                transport: httpx.BaseTransport = httpx.HTTPTransport(
+                    limits=self.settings.limits(), http2=self.settings.http2_enabled()
+                )
+                if self.limiter is not None:
+                    transport = RateLimitedSyncTransport(transport, self.limiter)
+                self._sync_client = httpx.Client(
+                    transport=transport,
+                    timeout=self.settings.timeout(),
+                    event_hooks={"request": [self.sync_stats.on_request]},
+                )
+            return self._sync_client
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None or self._async_client.is_closed:
+                transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(
+                    limits=self.settings.limits(), http2=self.settings.http2_enabled()
+                )
+                if self.limiter is not None:
+                    transport = RateLimitedAsyncTransport(transport, self.limiter)
+                self._async_client = httpx.AsyncClient(
+                    transport=transport,
+                    timeout=self.settings.timeout(),
+                    event_hooks={"request": [self.async_stats.aon_request]},
+                )
+                logger.info(
+                    f"[HTTP] Shared async client: max_connections={self.settings.max_connections}, "
+                    f"keepalive={self.settings.max_keepalive_connections}, http2={self.settings.http2_enabled()}"
+                )
+            return self._async_client
+
+    async def aclose(self) -> None:
+        with self._lock:
+            sync_client, self._sync_client = self._sync_client, None
+            async_client, self._async_client = self._async_client, None
+        if sync_client is not None:
+            sync_client.close()
+        if async_client is not None:
+            await async_client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "async": self.async_stats.snapshot(),
+            "sync": self.sync_stats.snapshot(),
+            "http2": self.settings.http2,
+            "max_connections": self.settings.max_connections,
+            "max_keepalive_connections": self.settings.max_keepalive_connections,
+            "rate_limiter": self.limiter.stats() if self.limiter is not None else None,
+        }
+
+
+# Singleton instance
+http_client_factory = HttpClientFactory()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    return http_client_factory.get_async_client()
+
+
+def get_sync_http_client() -> httpx.Client:
+    return http_client_factory.get_sync_client()
+
+
+async def aclose_http_clients() -> None:
+    await http_client_factory.aclose()
+
+
+def http_client_stats() -> Dict[str, Any]:
+    return http_client_factory.stats()
@@ -0,0 +1,71 @@
+# app/core/llm.py
+
+"""
+Factory for chat models and embeddings.
+
+Every LLM/embedding client in both apps is created here so they all share the
+process-wide HTTP connection pool from app.core.http_client.
+
+LLM_PROVIDER picks the implementation (see app.core.fake_llm):
+    openai  ChatOpenAI / OpenAIEmbeddings (default)
+    fake    offline record/replay fakes with synthetic replies and injected latency
+    record  OpenAI models that also append every chat response to FAKE_LLM_CASSETTE
+
+Chat models get the callbacks from app.core.llm_callbacks (a tracing span and token
+accounting per call).
+"""
+
+import logging
+import os
+from typing import Any
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from app.core.llm_callbacks import llm_tracing_handler, token_usage_handler
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("openai", "fake", "record")
+
+
+def llm_provider() -> str:
+    provider = os.getenv("LLM_PROVIDER", "openai").strip().lower()
+    if provider not in PROVIDERS:
+        raise ValueError(f"LLM_PROVIDER must be one of {PROVIDERS}, got {provider!r}")
+    return provider
+
+
+def create_chat_model(**kwargs: Any) -> BaseChatModel:
+    """Chat model for the configured provider (kwargs go straight to ChatOpenAI)."""
+    provider = llm_provider()
+    callbacks = [llm_tracing_handler, token_usage_handler]
+    if provider == "fake":
+        from app.core.fake_llm import FakeChatModel, fake_llm_provider
+        logger.info(f"[LLM] Using the fake chat model for {kwargs.get('model', 'default')}")
+        return FakeChatModel(model_name=kwargs.get("model", "fake"), provider=fake_llm_provider, callbacks=callbacks)
+
+    from langchain_openai import ChatOpenAI
+    from app.core.http_client import get_async_http_client, get_sync_http_client
+
+    kwargs.setdefault("http_client", get_sync_http_client())
+    kwargs.setdefault("http_async_client", get_async_http_client())
+    if provider == "record":
+        from app.core.fake_llm import CassetteRecorder, fake_llm_provider
+        callbacks.append(CassetteRecorder(fake_llm_provider.cassette))
+    kwargs["callbacks"] = list(kwargs.get("callbacks") or []) + callbacks
+    return ChatOpenAI(**kwargs)
+
+
+def create_embeddings(**kwargs: Any) -> Embeddings:
+    """Embeddings for the configured provider (kwargs go straight to OpenAIEmbeddings)."""
+    if llm_provider() == "fake":
+        from app.core.fake_llm import FakeEmbeddings, fake_llm_provider
+        return FakeEmbeddings(fake_llm_provider)
+
+    from langchain_openai import OpenAIEmbeddings
+    from app.core.http_client import get_async_http_client, get_sync_http_client
+
+    kwargs.setdefault("http_client", get_sync_http_client())
+    kwargs.setdefault("http_async_client", get_async_http_client())
+    return OpenAIEmbeddings(**kwargs)
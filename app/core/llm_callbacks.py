@@ -0,0 +1,166 @@
+# app/core/llm_callbacks.py
+
+"""
+LangChain callbacks attached to every chat model by app.core.llm.
+
+LLMTracingHandler opens a span per LLM call as a child of the current stage span
+(see app.core.tracing). The span is tagged with the model, the chain it runs for
+(the nearest "chain" attribute up the span tree) and the token counts from the
+response's usage metadata (including prompt tokens served from the provider's
+prompt cache); the counts are also summed onto the root span, so a slow turn
+shows how many tokens it spent.
+
+TokenUsageHandler records every call in app.core.token_usage, attributed to the
+chain, session and student of the current trace; calls without usage metadata are
+counted with the local tokenizer.
+
+Both register each call with app.core.disconnect, which charges the calls still in
+flight when a client disconnects as cancelled and tells the handlers to drop them
+(LangChain reports no error for a cancelled call).
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from app.core.disconnect import on_llm_call_cancelled, track_llm_call, untrack_llm_call
+from app.core.token_usage import TokenLedger, count_tokens, token_ledger
+from app.core.tracing import STATUS_ERROR, Span, Tracer, tracer
+
+
+def usage_from_result(response: LLMResult) -> Tuple[Optional[int], Optional[int]]:
+    """(input_tokens, output_tokens) reported by the provider, or (None, None)."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens"), usage.get("output_tokens")
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if token_usage:
+        return token_usage.get("prompt_tokens"), token_usage.get("completion_tokens")
+    return None, None
+
+
+def cached_tokens_from_result(response: LLMResult) -> int:
+    """Prompt tokens the provider served from its prompt cache (0 when not reported)."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return (usage.get("input_token_details") or {}).get("cache_read") or 0
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    return (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+
+class LLMTracingHandler(BaseCallbackHandler):
+    """One span per chat model call."""
+
+    run_inline = True  # keep the caller's contextvars (current span) in async chains
+
+    def __init__(self, tracer: Tracer = tracer):
+        self.tracer = tracer
+        self._spans: Dict[Any, Span] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]],
+                            *, run_id: Any, **kwargs: Any) -> None:
+        if not self.tracer.enabled:
+            return
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "unknown"
+        parent = self.tracer.current_span()
+        chain = (parent.lookup("chain") if parent is not None else None) or "unknown"
+        self._spans[run_id] = self.tracer.start_span(
+            f"llm {chain}",
+            **{
+                "gen_ai.system": "openai",
+                "gen_ai.request.model": model,
+                "chain": chain,
+                "prompt_chars": sum(len(str(m.content)) for m in messages[0]) if messages else 0,
+            },
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: Any, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        input_tokens, output_tokens = usage_from_result(response)
+        if input_tokens is not None:
+            span.set_attribute("gen_ai.usage.input_tokens", input_tokens)
+            span.root.add_to_attribute("llm.input_tokens", input_tokens)
+            cached_tokens = cached_tokens_from_result(response)
+            span.set_attribute("gen_ai.usage.cache_read_input_tokens", cached_tokens)
+            span.root.add_to_attribute("llm.cached_input_tokens", cached_tokens)
+        if output_tokens is not None:
+            span.set_attribute("gen_ai.usage.output_tokens", output_tokens)
+            span.root.add_to_attribute("llm.output_tokens", output_tokens)
+        if span.root is not span:
+            span.root.add_to_attribute("llm.calls", 1)
+        self.tracer.end_span(span)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span.set_attribute("error.type", type(error).__name__)
+        self.tracer.end_span(span, status=STATUS_ERROR)
+
+    def on_cancelled(self, run_id: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.set_attribute("error.type", "ClientDisconnected")
+            self.tracer.end_span(span, status=STATUS_ERROR)
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Per-call token accounting (works with tracing disabled; attribution is then "unknown")."""
+
+    run_inline = True
+
+    def __init__(self, ledger: TokenLedger = token_ledger, tracer: Tracer = tracer):
+        self.ledger = ledger
+        self.tracer = tracer
+        # run_id -> (chain, model, session_id, student_id, prompt text)
+        self._calls: Dict[Any, Tuple[str, str, Optional[str], Optional[str], str]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]],
+                            *, run_id: Any, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "unknown"
+        span = self.tracer.current_span()
+        lookup = span.lookup if span is not None else (lambda key: None)
+        prompt = "\n".join(str(m.content) for m in messages[0]) if messages else ""
+        self._calls[run_id] = (lookup("chain") or "unknown", model, lookup("session_id"), lookup("student_id"), prompt)
+        track_llm_call(run_id, self._calls[run_id][0], model)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: Any, **kwargs: Any) -> None:
+        untrack_llm_call(run_id)
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        chain, model, session_id, student_id, prompt = call
+        input_tokens, output_tokens = usage_from_result(response)
+        estimated = input_tokens is None or output_tokens is None
+        if input_tokens is None:
+            input_tokens = count_tokens(prompt, model)
+        if output_tokens is None:
+            text = response.generations[0][0].text if response.generations and response.generations[0] else ""
+            output_tokens = count_tokens(text, model)
+        self.ledger.record(chain, model, input_tokens, output_tokens, estimated=estimated,
+                           cached_tokens=cached_tokens_from_result(response),
+                           session_id=session_id, student_id=student_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        untrack_llm_call(run_id)
+        self._calls.pop(run_id, None)
+
+    def on_cancelled(self, run_id: Any) -> None:
+        self._calls.pop(run_id, None)
+
+
+# Singleton instances
+llm_tracing_handler = LLMTracingHandler()
+token_usage_handler = TokenUsageHandler()
+on_llm_call_cancelled(llm_tracing_handler.on_cancelled)
+on_llm_call_cancelled(token_usage_handler.on_cancelled)
@@ -0,0 +1,284 @@
+# app/core/log_pipeline.py
+
+"""
+Non-blocking, sampled logging for both apps.
+
+configure_logging() puts a single QueueHandler on the root logger. The calling code
+(usually the event loop) only filters, redacts and enqueues a record; formatting and
+file/console I/O happen on a QueueListener thread. On the way in, each record:
+
+  - gets a category: the [TAG] prefix of the message (FEEDBACK, STORAGE, HEDGE, ...),
+    else the logger name;
+  - is sampled per category (DEBUG and INFO only) and rate limited per category with
+    a token bucket (everything below ERROR);
+  - has its message truncated to LOG_MAX_CHARS (a traceback is kept whole) and
+    secrets redacted: API keys, bearer tokens, e-mail addresses.
+
+Dropped records are counted in log_records_dropped_total{category,reason}. The time
+spent on logging in the calling thread is measured per record and, inside
+log_cost_scope() (one chat turn), per turn; both are in log_stats() (GET /health/logging).
+
+    LOG_LEVEL        root level (default INFO)
+    LOG_FORMAT       text | json, one JSON object per line (default text)
+    LOG_FILE         also write to this file (default: off)
+    LOG_SAMPLE       sample rates of DEBUG/INFO records, "CATEGORY=rate,..." with * as
+                     the default (default "*=1")
+    LOG_RATE_LIMIT   records per second per category, burst twice that, same syntax
+                     (default "*=50")
+    LOG_MAX_CHARS    longest message kept (default 500)
+    LOG_QUEUE_SIZE   records waiting for the writer before new ones are dropped (default 10000)
+
+No app.core.config import: the backend service uses this too.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+from app.core.metrics import registry
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+LOG_FILE = os.getenv("LOG_FILE", "")
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "*=1")
+LOG_RATE_LIMIT = os.getenv("LOG_RATE_LIMIT", "*=50")
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", 500))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+LOG_RECORDS_DROPPED = registry.counter(
+    "log_records_dropped_total", "Log records dropped before reaching a handler.", ["category", "reason"])
+
+_TAG = re.compile(r"\[([A-Z][A-Z0-9_]*)\]")
+_REDACTIONS = [
+    (re.compile(r"\bsk-[A-Za-z0-9_-]{8,}"), "sk-***"),
+    (re.compile(r"(?i)\bbearer\s+[A-Za-z0-9._~+/=-]{8,}"), "Bearer ***"),
+    (re.compile(r"(?i)(api[_-]?key|password|secret|token)(['\"]?\s*[:=]\s*['\"]?)[^\s'\",}]+"), r"\1\2***"),
+    (re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b"), "<email>"),
+]
+# LogRecord attributes; everything else on a record came from extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "category"}
+
+
+def parse_rates(spec: str) -> Dict[str, float]:
+    """"STORAGE=0.1,*=1" -> {"STORAGE": 0.1, "*": 1.0}"""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            rates[name.strip()] = float(value)
+    return rates
+
+
+def record_category(record: logging.LogRecord) -> str:
+    category = getattr(record, "category", None)
+    if category is None:
+        match = _TAG.match(record.msg[:40]) if isinstance(record.msg, str) else None
+        category = match.group(1) if match else record.name
+        record.category = category
+    return category
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def truncate(text: str, max_chars: int = LOG_MAX_CHARS) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} chars truncated]"
+
+
+class SamplingFilter(logging.Filter):
+    """Per-category sampling (DEBUG/INFO) and token-bucket rate limits (below ERROR)."""
+
+    def __init__(self, sample: str = LOG_SAMPLE, rate_limit: str = LOG_RATE_LIMIT):
+        super().__init__()
+        self.sample = parse_rates(sample)
+        self.rates = parse_rates(rate_limit)
+        self._buckets: Dict[str, list] = {}     # category -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        category = record_category(record)
+        if record.levelno >= logging.ERROR:
+            return True
+        if record.levelno < logging.WARNING:
+            rate = self.sample.get(category, self.sample.get("*", 1.0))
+            if rate < 1.0 and random.random() >= rate:
+                _stats.dropped("sampled", category)
+                return False
+        per_second = self.rates.get(category, self.rates.get("*"))
+        if per_second is None or self._take(category, per_second):
+            return True
+        _stats.dropped("rate_limited", category)
+        return False
+
+    def _take(self, category: str, per_second: float) -> bool:
+        now = time.monotonic()
+        burst = max(per_second * 2, 1.0)
+        with self._lock:
+            bucket = self._buckets.setdefault(category, [burst, now])
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * per_second)
+            bucket[1] = now
+            if bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+            return True
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that redacts and truncates, never blocks, and times itself."""
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        start = time.perf_counter_ns()
+        emitted = super().handle(record)
+        _stats.add(time.perf_counter_ns() - start, emitted)
+        return emitted
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Truncate the message itself; super().prepare() appends any traceback whole
+        record.msg = truncate(record.getMessage())
+        record.args = ()
+        record = super().prepare(record)
+        record.msg = record.message = redact(record.msg)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats.dropped("queue_full", record_category(record))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the category and any extra={...} fields."""
+
+    def __init__(self, app_name: str):
+        super().__init__()
+        self.app_name = app_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "app": self.app_name,
+            "logger": record.name,
+            "category": getattr(record, "category", record.name),
+            "msg": record.getMessage(),
+        }
+        entry.update((k, v) for k, v in vars(record).items() if k not in _RECORD_FIELDS)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+@dataclass
+class LogCost:
+    records: int = 0
+    ns: int = 0
+
+
+class _LogStats:
+    def __init__(self):
+        self.records = 0
+        self.emitted = 0
+        self.ns = 0
+        self.turns = 0
+        self.turn_records = 0
+        self.turn_ns = 0
+        self.drops: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, ns: int, emitted: bool) -> None:
+        cost = _turn_cost.get()
+        if cost is not None:
+            cost.records += 1
+            cost.ns += ns
+        with self._lock:
+            self.records += 1
+            self.emitted += bool(emitted)
+            self.ns += ns
+
+    def dropped(self, reason: str, category: str) -> None:
+        LOG_RECORDS_DROPPED.inc(1, category=category, reason=reason)
+        with self._lock:
+            self.drops[reason] = self.drops.get(reason, 0) + 1
+
+    def add_turn(self, cost: LogCost) -> None:
+        with self._lock:
+            self.turns += 1
+            self.turn_records += cost.records
+            self.turn_ns += cost.ns
+
+
+_stats = _LogStats()
+_turn_cost: ContextVar[Optional[LogCost]] = ContextVar("log_turn_cost", default=None)
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue: Optional[queue.Queue] = None
+
+
+@contextmanager
+def log_cost_scope() -> Iterator[LogCost]:
+    """Measure the logging done in this block (and the tasks it starts), e.g. one chat turn."""
+    cost = LogCost()
+    token = _turn_cost.set(cost)
+    try:
+        yield cost
+    finally:
+        _turn_cost.reset(token)
+        _stats.add_turn(cost)
+
+
+def configure_logging(app_name: str, level: str = LOG_LEVEL) -> None:
+    """Replace the root handlers with the queue pipeline; safe to call more than once."""
+    global _listener, _queue
+    if _listener is not None:
+        return
+    formatter = JsonFormatter(app_name) if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = AsyncQueueHandler(_queue)
+    queue_handler.addFilter(SamplingFilter())
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)     # flush what is still queued
+
+
+def log_stats() -> Dict[str, object]:
+    with _stats._lock:
+        return {
+            "records": _stats.records,
+            "emitted": _stats.emitted,
+            "dropped": dict(_stats.drops),
+            "avg_us_per_record": round(_stats.ns / _stats.records / 1000, 2) if _stats.records else 0.0,
+            "turns": _stats.turns,
+            "avg_records_per_turn": round(_stats.turn_records / _stats.turns, 1) if _stats.turns else 0.0,
+            "avg_us_per_turn": round(_stats.turn_ns / _stats.turns / 1000, 1) if _stats.turns else 0.0,
+            "queue_size": _queue.qsize() if _queue is not None else 0,
+            "format": LOG_FORMAT,
+        }
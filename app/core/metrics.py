@@ -0,0 +1,363 @@
+# app/core/metrics.py
+
+"""
+Prometheus-style metrics for both FastAPI services (stdlib only).
+
+A small registry of counters, histograms and scrape-time callbacks rendered in the
+Prometheus text format (version 0.0.4) by the /metrics endpoints. Hot-path cost is
+a dict lookup and a bisect under a lock per observation; callbacks (sessions,
+memory, cache stats) only run when /metrics is scraped.
+
+Where the numbers come from:
+    MetricsMiddleware       request count and latency per route template
+    MetricsSpanExporter     chat turns per router action, LLM calls/latency per
+                            chain - read from finished app.core.tracing traces
+    app.core.token_usage    LLM tokens and cost per chain
+    LoopLagMonitor          event-loop lag, sampled every LOOP_LAG_INTERVAL seconds
+    register_callback()     anything read at scrape time (sessions, caches)
+
+No app.core.config import: the backend service uses this too.
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+import resource
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.tracing import Span, SpanExporter, tracer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (+Inf last)], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter read at scrape time: `collect()` returns (labels, value) pairs."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]], type: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            logger.warning(f"[METRICS] Collecting {self.name} failed: {e}")
+            samples = []
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, self._key(labels))} {_format_value(value)}"
+            for labels, value in samples
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def register_callback(self, name: str, help: str, labelnames: Sequence[str],
+                          collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]],
+                          type: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, labelnames, collect, type))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status.", ["app", "route", "method", "status"])
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ["app", "route", "method"])
+CHAT_TURNS = registry.counter(
+    "chat_turns_total", "Chat turns by router action.", ["action", "status"])
+CHAT_TURN_LATENCY = registry.histogram(
+    "chat_turn_duration_seconds", "Chat turn latency by router action.", ["action"])
+LLM_CALLS = registry.counter(
+    "llm_calls_total", "LLM calls by chain, model and status.", ["chain", "model", "status"])
+LLM_LATENCY = registry.histogram(
+    "llm_call_duration_seconds", "LLM call latency by chain.", ["chain"], buckets=LLM_BUCKETS)
+LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes a sleeping probe task.", [], buckets=LAG_BUCKETS)
+
+
+def _process_stats() -> Iterable[Tuple[Dict[str, Any], float]]:
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, KiB on Linux
+    yield {}, rss
+
+
+def _cpu_seconds() -> Iterable[Tuple[Dict[str, Any], float]]:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    yield {}, usage.ru_utime + usage.ru_stime
+
+
+registry.register_callback("process_resident_memory_bytes", "Resident memory of this process.", [], _process_stats)
+registry.register_callback("process_cpu_seconds_total", "User and system CPU time.", [], _cpu_seconds, type="counter")
+
+
+_caches: Dict[str, Callable[[], Tuple[float, float]]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], Tuple[float, float]]) -> None:
+    """Expose a cache's (hits, misses) as cache_hits_total / cache_misses_total / cache_hit_ratio."""
+    _caches[name] = stats
+
+
+def _cache_samples(pick: Callable[[float, float], float]) -> Callable[[], Iterable[Tuple[Dict[str, Any], float]]]:
+    def collect():
+        for name, stats in list(_caches.items()):
+            hits, misses = stats()
+            yield {"cache": name}, pick(hits, misses)
+    return collect
+
+
+registry.register_callback("cache_hits_total", "Cache hits.", ["cache"],
+                           _cache_samples(lambda h, m: h), type="counter")
+registry.register_callback("cache_misses_total", "Cache misses.", ["cache"],
+                           _cache_samples(lambda h, m: m), type="counter")
+registry.register_callback("cache_hit_ratio", "Cache hits / lookups since start.", ["cache"],
+                           _cache_samples(lambda h, m: h / (h + m) if h + m else 0.0))
+
+
+class MetricsSpanExporter(SpanExporter):
+    """Turns finished traces into chat-turn and LLM metrics."""
+
+    def export(self, spans: List[Span]) -> None:
+        for span in spans:
+            if span.end_ns is None:
+                continue
+            seconds = (span.end_ns - span.start_ns) / 1e9
+            if span.name == "chat.turn":
+                action = span.attributes.get("action", "unknown")
+                CHAT_TURNS.inc(action=action, status=span.status.lower())
+                CHAT_TURN_LATENCY.observe(seconds, action=action)
+            elif span.name.startswith("llm "):
+                chain = span.attributes.get("chain", "unknown")
+                LLM_CALLS.inc(chain=chain, model=span.attributes.get("gen_ai.request.model", ""),
+                              status=span.status.lower())
+                LLM_LATENCY.observe(seconds, chain=chain)
+
+
+tracer.add_exporter(MetricsSpanExporter())
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request count and latency per route template (not raw path)."""
+
+    def __init__(self, app: Any, app_name: str):
+        self.app = app
+        self.app_name = app_name
+        self._routes: Dict[Tuple[str, str], str] = {}
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route(scope)
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(app=self.app_name, route=route, method=method, status=status["code"])
+            HTTP_LATENCY.observe(time.perf_counter() - started, app=self.app_name, route=route, method=method)
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        route = scope.get("route")
+        if route is not None and hasattr(route, "path"):
+            return route.path
+        key = (scope.get("method", ""), scope.get("path", ""))
+        cached = self._routes.get(key)
+        if cached is not None:
+            return cached
+        template = "unmatched"
+        app = scope.get("app")
+        if app is not None and hasattr(app, "router"):
+            from starlette.routing import Match
+            for candidate in app.router.routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    template = getattr(candidate, "path", template)
+                    break
+        if len(self._routes) > 1024:
+            self._routes.clear()
+        self._routes[key] = template
+        return template
+
+
+class LoopLagMonitor:
+    """
+    Background task that measures event-loop lag (sleep drift) into LOOP_LAG.
+    With keep_samples the lags (seconds) are also kept in `samples`, for exact
+    percentiles (benchmarks/chat_load.py).
+    """
+
+    def __init__(self, interval: Optional[float] = None, keep_samples: bool = False):
+        self.interval = interval or float(os.getenv("LOOP_LAG_INTERVAL", 0.5))
+        self.samples: Optional[List[float]] = [] if keep_samples else None
+        self._task: Optional["asyncio.Task"] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG.observe(lag)
+            if self.samples is not None:
+                self.samples.append(lag)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,197 @@
+# app/core/prompt_registry.py
+
+"""
+Prompt registry: every prompt is loaded once, versioned and sized.
+
+Prompts are .txt files in app/prompts, looked up by file name ("deeper_feedback"),
+or are registered from code (the backend's prompts.py constants). Each prompt has:
+
+    version    first 12 hex chars of the sha256 of its text. It goes into cache
+               keys and span attributes, so an edited prompt never serves results
+               produced by the old one
+    tokens     token count of the prompt text (app.core.token_usage.count_tokens)
+    segments   named variable sections that are appended per session or turn,
+               stored after the prompt in the same file, each one starting with a
+               line "#=== segment: <name> ===" and rendered with str.format
+    prefix     the static text before the first template variable. Prompts are laid
+               out static instructions -> per-session context -> per-turn data so
+               this prefix is long and identical across calls, which is what
+               provider-side prompt caching reuses; check_prompt_prefixes.py fails
+               when a prefix changes without its lock entry being updated
+
+File prompts hot-reload: a lookup checks the file's mtime at most every
+PROMPT_RELOAD_SECONDS (default 2, 0 disables) and re-reads the file when it has
+changed, so a prompt edit takes effect without a restart. Compiled
+ChatPromptTemplates are cached per prompt version.
+
+No app.core.config import: the backend service uses this too.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.token_usage import count_tokens
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
+SEGMENT_MARKER = re.compile(r"^#=== segment: ([\w.-]+) ===[ \t]*\n?", re.MULTILINE)
+TEMPLATE_VARIABLE = re.compile(r"(?<!\{)\{(\w+)\}(?!\})")  # {name} but not the escaped {{name}}
+
+
+def content_version(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def static_prefix(text: str) -> str:
+    """Text before the first template variable."""
+    match = TEMPLATE_VARIABLE.search(text)
+    return text[:match.start()] if match else text
+
+
+@dataclass(frozen=True)
+class Segment:
+    name: str
+    text: str
+    tokens: int
+
+    def render(self, **values: Any) -> str:
+        return self.text.format(**values)
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    text: str
+    version: str
+    tokens: int
+    prefix_version: str
+    prefix_tokens: int
+    segments: Dict[str, Segment] = field(default_factory=dict)
+    path: Optional[Path] = None
+
+    def segment(self, name: str) -> Segment:
+        return self.segments[name]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "tokens": self.tokens,
+            "chars": len(self.text),
+            "prefix_version": self.prefix_version,
+            "prefix_tokens": self.prefix_tokens,
+            "segments": {s.name: {"tokens": s.tokens} for s in self.segments.values()},
+            "source": str(self.path) if self.path else "code",
+        }
+
+
+def parse_prompt(name: str, raw: str, path: Optional[Path] = None) -> Prompt:
+    """Split a prompt file into the prompt text and its segments."""
+    parts = SEGMENT_MARKER.split(raw)
+    text = parts[0] if len(parts) == 1 else parts[0].rstrip("\n")
+    segments = {}
+    for segment_name, segment_text in zip(parts[1::2], parts[2::2]):
+        segment_text = segment_text.strip("\n")
+        segments[segment_name] = Segment(segment_name, segment_text, count_tokens(segment_text))
+    prefix = static_prefix(text)
+    return Prompt(name, text, content_version(raw), count_tokens(text),
+                  content_version(prefix), count_tokens(prefix), segments, path)
+
+
+class PromptRegistry:
+    def __init__(self, directory: Path = PROMPTS_DIR, reload_interval: float = 2.0):
+        self.directory = Path(directory)
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self._prompts: Dict[str, Prompt] = {}
+        self._mtimes: Dict[str, int] = {}
+        self._checked: Dict[str, float] = {}
+        self._templates: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Prompt:
+        prompt = self._prompts.get(name)
+        if prompt is None:
+            return self._load(name)
+        if prompt.path is not None and self.reload_interval > 0:
+            now = time.monotonic()
+            if now - self._checked.get(name, 0.0) >= self.reload_interval:
+                self._checked[name] = now
+                try:
+                    changed = prompt.path.stat().st_mtime_ns != self._mtimes.get(name)
+                except OSError:
+                    changed = False  # keep serving the last version we could read
+                if changed:
+                    try:
+                        return self._load(name)
+                    except OSError as e:
+                        logger.warning(f"[PROMPTS] Could not reload {name}: {e}")
+        return prompt
+
+    def text(self, name: str) -> str:
+        return self.get(name).text
+
+    def version(self, *names: str) -> str:
+        """Version of one prompt, or a combined version of several (for cache keys)."""
+        versions = [self.get(name).version for name in names]
+        return versions[0] if len(versions) == 1 else content_version(":".join(versions))
+
+    def register(self, name: str, text: str) -> Prompt:
+        """Register a prompt defined in code (no file, never reloaded)."""
+        prompt = parse_prompt(name, text)
+        with self._lock:
+            self._prompts[name] = prompt
+        return prompt
+
+    def template(self, name: str):
+        """ChatPromptTemplate.from_template for the current version, compiled once."""
+        prompt = self.get(name)
+        key = (name, prompt.version)
+        template = self._templates.get(key)
+        if template is None:
+            from langchain_core.prompts import ChatPromptTemplate
+            template = self._templates[key] = ChatPromptTemplate.from_template(prompt.text)
+        return template
+
+    def preload(self) -> int:
+        """Load every prompt file in the directory; returns how many there are."""
+        for path in sorted(self.directory.glob("*.txt")):
+            self.get(path.stem)
+        return len(self._prompts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "reloads": self.reloads,
+            "reload_interval_seconds": self.reload_interval,
+            "prompts": {name: p.info() for name, p in sorted(self._prompts.items())},
+        }
+
+    def _load(self, name: str) -> Prompt:
+        path = self.directory / f"{name}.txt"
+        with self._lock:
+            mtime = path.stat().st_mtime_ns
+            prompt = parse_prompt(name, path.read_text(encoding="utf-8"), path)
+            previous = self._prompts.get(name)
+            self._prompts[name] = prompt
+            self._mtimes[name] = mtime
+            self._checked[name] = time.monotonic()
+            if previous is not None and previous.version != prompt.version:
+                self.reloads += 1
+                self._templates = {k: v for k, v in self._templates.items() if k[0] != name}
+        if previous is None:
+            logger.info(f"[PROMPTS] Loaded {name} v{prompt.version} ({prompt.tokens} tokens)")
+        elif previous.version != prompt.version:
+            logger.info(f"[PROMPTS] Reloaded {name}: v{previous.version} -> v{prompt.version} "
+                        f"({previous.tokens} -> {prompt.tokens} tokens)")
+        return prompt
+
+
+# Singleton instance
+prompt_registry = PromptRegistry(reload_interval=float(os.getenv("PROMPT_RELOAD_SECONDS", 2)))
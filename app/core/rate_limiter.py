@@ -0,0 +1,450 @@
+# app/core/rate_limiter.py
+
+"""
+Adaptive admission control for every OpenAI call in the process.
+
+Sits in the shared httpx transport (app.core.http_client), so chat models and
+embeddings from both apps go through it:
+
+- token buckets for requests/minute and estimated tokens/minute
+- an AIMD concurrency limit: halved on HTTP 429, grows back by ~1 per window of successes
+- strict priority classes: INTERACTIVE (chat) > BATCH (grading) > BACKGROUND (precompute)
+- bounded queue per class; a waiter is shed when its queue is full or it cannot be
+  admitted before its deadline (per-class max wait, or the turn deadline from
+  app.core.deadline.llm_deadline)
+
+Shed calls get a synthetic 429 with `x-should-retry: false`, which the OpenAI SDK
+raises as RateLimitError without retrying, so the callers' existing fallbacks apply.
+
+Environment:
+    LLM_RPM, LLM_TPM                           provider limits (default 500 / 200000)
+    LLM_MAX_CONCURRENCY, LLM_MIN_CONCURRENCY   AIMD bounds (default 32 / 2)
+    LLM_QUEUE_INTERACTIVE/_BATCH/_BACKGROUND   queue sizes (default 100 / 500 / 1000)
+    LLM_WAIT_INTERACTIVE/_BATCH/_BACKGROUND    max queue wait, seconds (default 15 / 120 / 600)
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, Optional
+
+import httpx
+
+from app.core.deadline import current_deadline
+
+logger = logging.getLogger(__name__)
+
+# Priority classes (lower value = served first)
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+DEFAULT_COMPLETION_TOKENS = 500   # when a request does not set max_tokens
+CHARS_PER_TOKEN = 4
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """Run the enclosed LLM calls in a priority class (INTERACTIVE, BATCH, BACKGROUND)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    """Priority class of the LLM calls made from the current context."""
+    return _priority.get()
+
+
+def set_priority(priority: int) -> None:
+    """Set the priority class of the current context (work started in a fresh contextvars.Context)."""
+    _priority.set(priority)
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """Rough prompt + completion token estimate from an OpenAI request body."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return DEFAULT_COMPLETION_TOKENS
+    if "messages" in body:
+        chars = sum(len(str(m.get("content", ""))) for m in body["messages"])
+        completion = body.get("max_tokens") or body.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+        return chars // CHARS_PER_TOKEN + int(completion)
+    inputs = body.get("input", "")
+    inputs = inputs if isinstance(inputs, list) else [inputs]
+    return sum(len(str(i)) for i in inputs) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class RateLimiterSettings:
+    rpm: float = field(default_factory=lambda: float(os.getenv("LLM_RPM", 500)))
+    tpm: float = field(default_factory=lambda: float(os.getenv("LLM_TPM", 200000)))
+    max_concurrency: int = field(default_factory=lambda: int(os.getenv("LLM_MAX_CONCURRENCY", 32)))
+    min_concurrency: int = field(default_factory=lambda: int(os.getenv("LLM_MIN_CONCURRENCY", 2)))
+    queue_sizes: Dict[int, int] = field(default_factory=lambda: {
+        INTERACTIVE: int(os.getenv("LLM_QUEUE_INTERACTIVE", 100)),
+        BATCH: int(os.getenv("LLM_QUEUE_BATCH", 500)),
+        BACKGROUND: int(os.getenv("LLM_QUEUE_BACKGROUND", 1000)),
+    })
+    max_wait: Dict[int, float] = field(default_factory=lambda: {
+        INTERACTIVE: float(os.getenv("LLM_WAIT_INTERACTIVE", 15)),
+        BATCH: float(os.getenv("LLM_WAIT_BATCH", 120)),
+        BACKGROUND: float(os.getenv("LLM_WAIT_BACKGROUND", 600)),
+    })
+
+
+class _Bucket:
+    """Token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+
+class _Waiter:
+    __slots__ = ("future", "cost", "deadline", "priority", "enqueued")
+
+    def __init__(self, future: "asyncio.Future", cost: int, deadline: float, priority: int):
+        self.future = future
+        self.cost = cost
+        self.deadline = deadline
+        self.priority = priority
+        self.enqueued = time.monotonic()
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call is shed (queue full or deadline cannot be met)."""
+
+
+class RateLimiter:
+    """Central RPM/TPM token buckets with priority queues and an AIMD concurrency limit."""
+
+    def __init__(self, settings: Optional[RateLimiterSettings] = None):
+        self.settings = settings or RateLimiterSettings()
+        self.requests = _Bucket(self.settings.rpm)
+        self.tokens = _Bucket(self.settings.tpm)
+        self.limit = float(self.settings.max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.queues: Dict[int, Deque[_Waiter]] = {p: deque() for p in PRIORITY_NAMES}
+        self.counters: Counter = Counter()
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None    # the loop async waiters wait on
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    def _admit_delay(self, cost: int, now: float) -> float:
+        """0 if a call of `cost` tokens can start now, else seconds to wait (inf if concurrency bound)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return float("inf")
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.requests.wait_for(1), self.tokens.wait_for(cost))
+
+    def _take(self, cost: int) -> None:
+        self.requests.level -= 1
+        self.tokens.level -= min(cost, self.tokens.capacity)
+        self.in_flight += 1
+        self.counters["admitted"] += 1
+
+    def _deadline_for(self, priority: int, now: float) -> float:
+        deadline = now + self.settings.max_wait[priority]
+        explicit = current_deadline()
+        return deadline if explicit is None else min(deadline, explicit)
+
+    async def acquire(self, cost: int) -> None:
+        """Wait for a slot; raises AdmissionRejected if shed."""
+        priority = _priority.get()
+        now = time.monotonic()
+        deadline = self._deadline_for(priority, now)
+        with self._lock:
+            ahead = any(self.queues[p] for p in PRIORITY_NAMES if p <= priority)
+            delay = self._admit_delay(cost, now)
+            if not ahead and delay == 0:
+                self._take(cost)
+                return
+            if len(self.queues[priority]) >= self.settings.queue_sizes[priority]:
+                self.counters[f"shed_queue_full_{PRIORITY_NAMES[priority]}"] += 1
+                raise AdmissionRejected(f"{PRIORITY_NAMES[priority]} queue full")
+            if delay != float("inf") and now + delay > deadline and not ahead:
+                self.counters[f"shed_deadline_{PRIORITY_NAMES[priority]}"] += 1
+                raise AdmissionRejected(f"cannot start within deadline ({delay:.1f}s needed)")
+            self._loop = asyncio.get_running_loop()
+            waiter = _Waiter(self._loop.create_future(), cost, deadline, priority)
+            self.queues[priority].append(waiter)
+            self.counters["queued"] += 1
+        self._schedule_pump(0.0 if delay == float("inf") else delay)
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            admitted = False
+            with self._lock:
+                if waiter in self.queues[priority]:
+                    self.queues[priority].remove(waiter)
+                elif waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                    self.in_flight -= 1  # admitted just as we were cancelled
+                    admitted = True
+            if admitted:
+                self._schedule_pump(0.0)   # hand the slot to the next waiter
+            raise
+        self.wait_seconds += time.monotonic() - waiter.enqueued
+
+    def _pump(self) -> None:
+        """Admit queued waiters in priority order; reschedule for the next refill."""
+        self._timer = None
+        next_delay: Optional[float] = None
+        with self._lock:
+            now = time.monotonic()
+            for priority in sorted(PRIORITY_NAMES):
+                queue = self.queues[priority]
+                while queue:
+                    waiter = queue[0]
+                    if waiter.future.done():
+                        queue.popleft()
+                        continue
+                    if now >= waiter.deadline:
+                        queue.popleft()
+                        self.counters[f"shed_deadline_{PRIORITY_NAMES[priority]}"] += 1
+                        waiter.future.set_exception(AdmissionRejected("deadline passed while queued"))
+                        continue
+                    delay = self._admit_delay(waiter.cost, now)
+                    if delay > 0:
+                        next_delay = None if delay == float("inf") else min(delay, waiter.deadline - now)
+                        break
+                    queue.popleft()
+                    self._take(waiter.cost)
+                    waiter.future.set_result(None)
+                if queue:
+                    # Strict priority: lower classes wait while a higher one is blocked
+                    next_delay = next_delay if next_delay is not None else self._next_deadline(now)
+                    break
+        if next_delay is not None:
+            self._schedule_pump(next_delay)
+
+    def _next_deadline(self, now: float) -> Optional[float]:
+        deadlines = [w.deadline for q in self.queues.values() for w in q]
+        return max(0.0, min(deadlines) - now) if deadlines else None
+
+    def _schedule_pump(self, delay: float) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or loop is not self._loop:
+            # Called from another thread (a sync client's release()): wake the waiters' loop
+            if self._loop is not None and self._loop is not loop and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._schedule_pump, delay)
+            return
+        if self._timer is not None:
+            if self._timer.when() <= loop.time() + delay:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_later(max(0.0, delay), self._pump)
+
+    # ------------------------------------------------------------------
+    # Sync callers (no priority queue: wait on the buckets, shed past the deadline)
+    # ------------------------------------------------------------------
+
+    def acquire_sync(self, cost: int) -> None:
+        priority = _priority.get()
+        deadline = self._deadline_for(priority, time.monotonic())
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._admit_delay(cost, now)
+                if delay == 0:
+                    self._take(cost)
+                    return
+            if now + min(delay, 0.05) > deadline:
+                self.counters[f"shed_deadline_{PRIORITY_NAMES[priority]}"] += 1
+                raise AdmissionRejected("cannot start within deadline")
+            time.sleep(min(delay, 0.05))
+
+    # ------------------------------------------------------------------
+    # Feedback from responses (AIMD)
+    # ------------------------------------------------------------------
+
+    def release(self, status_code: int, headers: httpx.Headers) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if status_code == 429:
+                self.counters["throttled_429"] += 1
+                self.limit = max(float(self.settings.min_concurrency), self.limit / 2)
+                retry_after = _retry_after(headers)
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                logger.warning(f"[RATE_LIMIT] 429 from provider: concurrency limit -> {int(self.limit)}, "
+                               f"pausing {retry_after:.1f}s")
+            elif 200 <= status_code < 500:
+                self.limit = min(float(self.settings.max_concurrency), self.limit + 1.0 / self.limit)
+            # Trust the provider's view of the remaining budget when it sends one
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens and remaining_tokens.isdigit():
+                self.tokens.level = min(self.tokens.level, float(remaining_tokens))
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests and remaining_requests.isdigit():
+                self.requests.level = min(self.requests.level, float(remaining_requests))
+        self._schedule_pump(0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = self.counters.get("admitted", 0)
+        return {
+            **self.counters,
+            "concurrency_limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued_now": {PRIORITY_NAMES[p]: len(q) for p, q in self.queues.items()},
+            "avg_queue_wait_ms": round(self.wait_seconds / admitted * 1000, 2) if admitted else 0.0,
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level),
+        }
+
+
+def _retry_after(headers: httpx.Headers) -> float:
+    for name in ("retry-after-ms", "retry-after"):
+        value = headers.get(name)
+        if value:
+            try:
+                seconds = float(value) / (1000 if name == "retry-after-ms" else 1)
+                return min(max(seconds, 0.0), 60.0)
+            except ValueError:
+                pass
+    return 1.0
+
+
+def _shed_response(request: httpx.Request, reason: str) -> httpx.Response:
+    return httpx.Response(
+        429,
+        headers={"x-should-retry": "false"},
+        json={"error": {"message": f"Request shed by local rate limiter: {reason}",
+                        "type": "admission_rejected", "code": "admission_rejected"}},
+        request=request,
+    )
+
+
+class _ReleasingAsyncStream(httpx.AsyncByteStream):
+    """Hold the limiter slot until the response body is consumed or closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class _ReleasingSyncStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class RateLimitedAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: RateLimiter):
+        self._transport = transport
+        self._limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            await self._limiter.acquire(estimate_tokens(request))
+        except AdmissionRejected as e:
+            return _shed_response(request, str(e))
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._limiter.release(0, httpx.Headers())
+            raise
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_ReleasingAsyncStream(
+                response.stream, lambda: self._limiter.release(response.status_code, response.headers)
+            ),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class RateLimitedSyncTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.BaseTransport, limiter: RateLimiter):
+        self._transport = transport
+        self._limiter = limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            self._limiter.acquire_sync(estimate_tokens(request))
+        except AdmissionRejected as e:
+            return _shed_response(request, str(e))
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            self._limiter.release(0, httpx.Headers())
+            raise
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_ReleasingSyncStream(
+                response.stream, lambda: self._limiter.release(response.status_code, response.headers)
+            ),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+# Singleton instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,244 @@
+# app/core/token_usage.py
+
+"""
+Token accounting and cost attribution for every LLM call.
+
+app.core.llm_callbacks records each call here with the tokens reported in the
+response's usage metadata. When a provider reports nothing, the prompt and reply
+are counted locally (tiktoken when installed, otherwise ~4 chars per token) and
+the record is marked as an estimate. Prompt tokens the provider served from its
+prompt cache (usage metadata input_token_details.cache_read) are counted too and
+billed at CACHED_INPUT_PRICE_RATIO of the input price.
+
+Calls are aggregated per chain (router, micro_battle, deeper_feedback, hint,
+general_chat, socratic, evidence_reask, reading_feedback, explain), per session
+and per student, feed the llm_tokens_total / llm_cost_usd_total metrics, and are
+optionally appended to a JSONL log for analyze_token_usage.py. Calls cancelled in
+flight when a client disconnects (app.core.disconnect) are counted per chain with
+the output tokens they are estimated to have saved (the chain's average so far):
+
+    TOKEN_USAGE_LOG        path of the JSONL usage log          (default: off)
+    TOKEN_USAGE_SESSIONS   sessions kept in memory (LRU)        (default 10000)
+
+No app.core.config import: the backend service uses this too.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens (input, output)
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4-turbo-preview": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+DEFAULT_PRICE_MODEL = "gpt-4o-mini"
+CACHED_INPUT_PRICE_RATIO = 0.5
+
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "LLM tokens by chain, type (input/output/cache_read) and source (usage/estimate).",
+    ["chain", "type", "source"])
+LLM_COST = registry.counter(
+    "llm_cost_usd_total", "Estimated LLM spend in USD by chain.", ["chain"])
+LLM_CALLS_CANCELLED = registry.counter(
+    "llm_calls_cancelled_total", "LLM calls cancelled in flight because the client disconnected.", ["chain"])
+LLM_TOKENS_SAVED = registry.counter(
+    "llm_tokens_saved_total", "Estimated output tokens not generated by cancelled LLM calls.", ["chain"])
+
+# Most sessions breakdown() lists
+MAX_TOP_SESSIONS = 100
+
+# Output tokens assumed for a cancelled call of a chain with no completed call yet
+CANCELLED_OUTPUT_TOKENS = 300
+
+
+_encoding_failed = False
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    global _encoding_failed
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use: offline this is a network error
+        if not _encoding_failed:
+            _encoding_failed = True
+            logger.warning(f"[TOKENS] tiktoken encoding unavailable ({e!r}); estimating ~4 chars per token")
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_PRICE_MODEL) -> int:
+    """Tokens in `text` for `model` (tiktoken when installed, otherwise ~4 chars per token)."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def price_for(model: str) -> Tuple[float, float]:
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICES[name]
+    return MODEL_PRICES[DEFAULT_PRICE_MODEL]
+
+
+def cost_usd(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    input_price, output_price = price_for(model)
+    uncached = input_tokens - cached_tokens
+    return (uncached * input_price + cached_tokens * input_price * CACHED_INPUT_PRICE_RATIO
+            + output_tokens * output_price) / 1_000_000
+
+
+@dataclass
+class UsageTotals:
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0
+    estimated_calls: int = 0
+    cost_usd: float = 0.0
+
+    def add(self, record: "UsageRecord") -> None:
+        self.calls += 1
+        self.input_tokens += record.input_tokens
+        self.output_tokens += record.output_tokens
+        self.cached_input_tokens += record.cached_input_tokens
+        self.estimated_calls += int(record.source == "estimate")
+        self.cost_usd += record.cost_usd
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "cost_usd": round(self.cost_usd, 6),
+                "total_tokens": self.input_tokens + self.output_tokens,
+                "cache_hit_ratio": round(self.cached_input_tokens / self.input_tokens, 3) if self.input_tokens else 0.0}
+
+
+@dataclass
+class UsageRecord:
+    chain: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    source: str                      # "usage" (provider-reported) or "estimate"
+    cached_input_tokens: int = 0
+    session_id: Optional[str] = None
+    student_id: Optional[str] = None
+    cost_usd: float = 0.0
+    timestamp: float = field(default_factory=time.time)
+
+
+class TokenLedger:
+    """In-memory aggregates per chain, session (LRU) and student, plus the optional JSONL log."""
+
+    def __init__(self, log_path: Optional[str] = None, max_sessions: int = 10000):
+        self.log_path = log_path
+        self.max_sessions = max_sessions
+        self.total = UsageTotals()
+        self.by_chain: Dict[str, UsageTotals] = {}
+        self.by_student: Dict[str, UsageTotals] = {}
+        self.by_session: "OrderedDict[str, UsageTotals]" = OrderedDict()
+        self.cancelled: Dict[str, Dict[str, int]] = {}     # chain -> calls, output_tokens_saved
+        self._lock = threading.Lock()
+
+    def record(self, chain: str, model: str, input_tokens: int, output_tokens: int, estimated: bool = False,
+               cached_tokens: int = 0, session_id: Optional[str] = None,
+               student_id: Optional[str] = None) -> UsageRecord:
+        cost = cost_usd(model, input_tokens, output_tokens, cached_tokens)
+        record = UsageRecord(chain, model, input_tokens, output_tokens, "estimate" if estimated else "usage",
+                             cached_tokens, session_id, student_id, round(cost, 8))
+        with self._lock:
+            self.total.add(record)
+            self.by_chain.setdefault(chain, UsageTotals()).add(record)
+            if student_id:
+                self.by_student.setdefault(student_id, UsageTotals()).add(record)
+            if session_id:
+                totals = self.by_session.get(session_id)
+                if totals is None:
+                    totals = self.by_session[session_id] = UsageTotals()
+                    if len(self.by_session) > self.max_sessions:
+                        self.by_session.popitem(last=False)
+                else:
+                    self.by_session.move_to_end(session_id)
+                totals.add(record)
+            if self.log_path:
+                self._append(record)
+
+        LLM_TOKENS.inc(input_tokens, chain=chain, type="input", source=record.source)
+        LLM_TOKENS.inc(output_tokens, chain=chain, type="output", source=record.source)
+        if cached_tokens:
+            LLM_TOKENS.inc(cached_tokens, chain=chain, type="cache_read", source=record.source)
+        LLM_COST.inc(cost, chain=chain)
+        return record
+
+    def record_cancelled(self, chain: str, model: str) -> int:
+        """A call cancelled in flight; returns the output tokens it is estimated to have saved."""
+        with self._lock:
+            totals = self.by_chain.get(chain)
+            saved = totals.output_tokens // totals.calls if totals and totals.calls else CANCELLED_OUTPUT_TOKENS
+            entry = self.cancelled.setdefault(chain, {"calls": 0, "output_tokens_saved": 0})
+            entry["calls"] += 1
+            entry["output_tokens_saved"] += saved
+        LLM_CALLS_CANCELLED.inc(1, chain=chain)
+        LLM_TOKENS_SAVED.inc(saved, chain=chain)
+        return saved
+
+    def _append(self, record: UsageRecord) -> None:
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(asdict(record)) + "\n")
+        except OSError as e:
+            logger.warning(f"[TOKENS] Could not append to {self.log_path}: {e}")
+
+    def session(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            totals = self.by_session.get(session_id)
+            return totals.to_dict() if totals else UsageTotals().to_dict()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totals per chain: safe to expose, no session or student ids."""
+        with self._lock:
+            return {
+                "total": self.total.to_dict(),
+                "by_chain": {name: t.to_dict() for name, t in sorted(self.by_chain.items())},
+                "cancelled": {name: dict(c) for name, c in sorted(self.cancelled.items())},
+            }
+
+    def breakdown(self, top_sessions: int = 10) -> Dict[str, Any]:
+        """Spend per student and the costliest sessions (admin only: a session id is a credential)."""
+        top_sessions = max(0, min(top_sessions, MAX_TOP_SESSIONS))
+        with self._lock:
+            sessions = sorted(self.by_session.items(), key=lambda kv: kv[1].cost_usd, reverse=True)
+            return {
+                "by_student": {name: t.to_dict() for name, t in sorted(self.by_student.items())},
+                "top_sessions": {name: t.to_dict() for name, t in sessions[:top_sessions]},
+                "sessions_tracked": len(self.by_session),
+            }
+
+
+# Singleton instance
+token_ledger = TokenLedger(
+    log_path=os.getenv("TOKEN_USAGE_LOG") or None,
+    max_sessions=int(os.getenv("TOKEN_USAGE_SESSIONS", 10000)),
+)
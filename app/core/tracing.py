@@ -0,0 +1,265 @@
+# app/core/tracing.py
+
+"""
+Lightweight in-process tracing with OpenTelemetry-compatible spans.
+
+Spans carry the OTel data model (32-hex trace id, 16-hex span id, parent, start/end
+in ns, attributes, status) and nest through a contextvar, so child spans inside
+asyncio tasks attach to the stage that started them. Once the root span of a trace
+ends, the whole trace is handed to the exporters:
+
+    InMemorySpanExporter   last N finished spans (for tests and debugging)
+    SlowTraceSampler       ring buffer of traces slower than TRACE_SLOW_TURN_MS
+    OTelBridgeExporter     re-emits spans through opentelemetry-api when installed
+                           and TRACING_OTEL=true (use any OTel SDK exporter from there)
+
+Settings (environment):
+    TRACING_ENABLED      "true"/"false"                            (default true)
+    TRACE_SLOW_TURN_MS   root spans slower than this are kept      (default 3000)
+    TRACE_SLOW_KEPT      size of the slow-trace ring buffer        (default 50)
+    TRACING_OTEL         forward spans to opentelemetry            (default false)
+
+No app.core.config import: the backend service uses this too.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_UNSET = "UNSET"
+STATUS_OK = "OK"
+STATUS_ERROR = "ERROR"
+
+
+class Span:
+    """One timed operation; `root` is the first span of its trace."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent", "root", "start_ns", "end_ns",
+                 "attributes", "status")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"  # same id scheme as the OTel SDK
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = STATUS_UNSET
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        return self.parent.span_id if self.parent is not None else None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_to_attribute(self, key: str, value: float) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def lookup(self, key: str) -> Any:
+        """Attribute from this span or the nearest ancestor that has it."""
+        span: Optional[Span] = self
+        while span is not None:
+            if key in span.attributes:
+                return span.attributes[key]
+            span = span.parent
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "context": {"trace_id": self.trace_id, "span_id": self.span_id},
+            "parent_id": self.parent_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 2),
+            "attributes": self.attributes,
+            "status": {"status_code": self.status},
+        }
+
+
+class SpanExporter:
+    """Receives finished traces (all spans of a trace once its root has ended)."""
+
+    def export(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self, max_spans: int = 1000):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class SlowTraceSampler(SpanExporter):
+    """Keeps the most recent traces whose root span took longer than `threshold_ms`."""
+
+    def __init__(self, threshold_ms: float, max_traces: int = 50):
+        self.threshold_ms = threshold_ms
+        self._traces: Deque[Dict[str, Any]] = deque(maxlen=max_traces)
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        root = spans[-1].root
+        self.counters["traces"] += 1
+        if root.end_ns is None or root.duration_ms < self.threshold_ms:
+            return
+        self.counters["slow"] += 1
+        stages = sorted(spans, key=lambda s: s.start_ns)
+        with self._lock:
+            self._traces.append({
+                "trace_id": root.trace_id,
+                "name": root.name,
+                "duration_ms": round(root.duration_ms, 2),
+                "attributes": root.attributes,
+                "spans": [s.to_dict() for s in stages],
+            })
+
+    def snapshot(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()  # newest first
+        return traces[:limit] if limit else traces
+
+
+class OTelBridgeExporter(SpanExporter):
+    """Replays finished spans into opentelemetry-api (no-op tracer unless an SDK is configured)."""
+
+    def __init__(self):
+        from opentelemetry import trace as otel_trace
+        self._otel = otel_trace
+        self._tracer = otel_trace.get_tracer("ielts-tutor")
+
+    def export(self, spans: List[Span]) -> None:
+        started: Dict[str, Any] = {}
+        for span in sorted(spans, key=lambda s: s.start_ns):
+            parent = started.get(span.parent_id)
+            context = self._otel.set_span_in_context(parent) if parent is not None else None
+            otel_span = self._tracer.start_span(
+                span.name, context=context, start_time=span.start_ns,
+                attributes={k: v for k, v in span.attributes.items() if isinstance(v, (str, bool, int, float))},
+            )
+            if span.status == STATUS_ERROR:
+                otel_span.set_status(self._otel.Status(self._otel.StatusCode.ERROR))
+            started[span.span_id] = otel_span
+        for span in spans:
+            started[span.span_id].end(end_time=span.end_ns)
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True, exporters: Optional[List[SpanExporter]] = None):
+        self.enabled = enabled
+        self.exporters: List[SpanExporter] = list(exporters or [])
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+        self._pending: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter: SpanExporter) -> None:
+        self.exporters.append(exporter)
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """Start a span without making it current (end it with end_span)."""
+        span = Span(name, parent if parent is not None else self._current.get(), attributes)
+        if span.parent is None:
+            with self._lock:
+                self._pending[span.trace_id] = []
+        return span
+
+    def end_span(self, span: Span, status: str = STATUS_OK) -> None:
+        span.end_ns = time.time_ns()
+        if span.status == STATUS_UNSET:
+            span.status = status
+        with self._lock:
+            if span.parent is None:
+                spans = self._pending.pop(span.trace_id, [])
+                spans.append(span)
+            elif span.trace_id in self._pending:
+                self._pending[span.trace_id].append(span)
+                return
+            else:
+                spans = [span]  # ended after its root - export on its own
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                logger.warning(f"[TRACE] {type(exporter).__name__} failed: {e}")
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Start a span as the current one for the duration of the block."""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, **attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = STATUS_ERROR
+            span.set_attribute("error.type", type(e).__name__)
+            raise
+        finally:
+            self._current.reset(token)
+            self.end_span(span)
+
+    def annotate(self, **attributes: Any) -> None:
+        """Set attributes on the current span (no-op outside a span)."""
+        span = self._current.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def annotate_root(self, **attributes: Any) -> None:
+        """Set attributes on the root span of the current trace, e.g. the routed action."""
+        span = self._current.get()
+        if span is not None:
+            span.root.attributes.update(attributes)
+
+
+def _build_tracer() -> Tracer:
+    tracer = Tracer(enabled=os.getenv("TRACING_ENABLED", "true").lower() == "true")
+    if os.getenv("TRACING_OTEL", "false").lower() == "true":
+        try:
+            tracer.add_exporter(OTelBridgeExporter())
+        except ImportError:
+            logger.warning("[TRACE] TRACING_OTEL is on but opentelemetry-api is not installed")
+    return tracer
+
+
+# Singleton instances
+tracer = _build_tracer()
+slow_traces = SlowTraceSampler(
+    threshold_ms=float(os.getenv("TRACE_SLOW_TURN_MS", 3000)),
+    max_traces=int(os.getenv("TRACE_SLOW_KEPT", 50)),
+)
+tracer.add_exporter(slow_traces)
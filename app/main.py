@@ -1,18 +1,92 @@
+import time
+
+_import_started = time.perf_counter()
+
 import sys
 from pathlib import Path
 
 # Add parent directory to path to enable imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from fastapi import FastAPI
+import hmac
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from app.core.log_pipeline import configure_logging, log_stats
+
+# Before the app modules are imported, so their loggers go through the queue from the start
+configure_logging("tutor")
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.chat import router as chat_router
+from app.api.chat import router as chat_router, active_session_count, get_agent_service
+from app.core.http_client import aclose_http_clients, get_async_http_client, get_sync_http_client, http_client_stats
+from app.services.single_flight import single_flight_stats
+from app.services.turn_guard import turn_guard
+from app.services.explanation_prefetch import explanation_prefetcher
+from app.services.theory_index import theory_index
+from app.core.metrics import CONTENT_TYPE, LoopLagMonitor, MetricsMiddleware, register_cache, registry, render_metrics
+from app.services.hedging import hedger
+from app.services.grounding import grounding_verifier
+from app.core.tracing import slow_traces
+from app.core.token_usage import token_ledger
+from app.core.prompt_registry import prompt_registry
+from app.core.disconnect import ClientDisconnected
+
+
+logger = logging.getLogger(__name__)
+
+loop_lag_monitor = LoopLagMonitor()
+
+# Everything the first chat turn would otherwise build is built before the app takes
+# traffic; STARTUP_WARMUP=false skips it (benchmarks/startup.py compares both)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").strip().lower() != "false"
+startup_timings = {"import_ms": round((time.perf_counter() - _import_started) * 1000, 1)}
+
+
+def warm_up() -> None:
+    """
+    Load prompts, open the HTTP pool, create the chat models and compile the templates.
+    A failing step is logged and the rest is left to the first request, as without warm-up.
+    """
+    steps = [
+        ("prompts", prompt_registry.preload),
+        ("http_pool", lambda: (get_sync_http_client(), get_async_http_client())),
+        ("agent_service", get_agent_service),           # chat models (imports langchain_openai)
+        ("templates", lambda: get_agent_service().warm_up()),
+    ]
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            # Do not crash the app: the later steps depend on this one, so they wait for a request
+            logger.error(f"[STARTUP] Warm-up step {name} failed, continuing lazily: {e}")
+            startup_timings[f"{name}_error"] = str(e)
+            return
+        startup_timings[f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"[STARTUP] Warm-up done: {startup_timings}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_lag_monitor.start()
+    if STARTUP_WARMUP:
+        warm_up()
+    yield
+    await loop_lag_monitor.stop()
+    # Close pooled LLM connections on shutdown
+    await aclose_http_clients()
+
 
 # Create FastAPI application
 app = FastAPI(
     title="IELTS AI Tutor API",
     description="AI-powered IELTS Reading tutor with intelligent chat routing",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS for frontend
@@ -27,9 +101,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request count/latency per route for /metrics
+app.add_middleware(MetricsMiddleware, app_name="tutor")
+
 # Include routers
 app.include_router(chat_router, prefix="/api", tags=["chat"])
 
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request, exc):
+    """The client is gone; 499 only shows up in the access log and metrics."""
+    return Response(status_code=499)
+
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -43,6 +127,105 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/logging")
+async def logging_health():
+    """Log records, drops by reason and the logging cost per record and per chat turn."""
+    return log_stats()
+
+@app.get("/health/startup")
+async def startup_health():
+    """Import time of the app and duration of each warm-up step."""
+    return {"warmup": STARTUP_WARMUP, **startup_timings}
+
+@app.get("/health/http")
+async def http_health():
+    """Connection reuse stats of the shared LLM HTTP clients."""
+    return http_client_stats()
+
+@app.get("/health/turns")
+async def turns_health():
+    """Turns that waited for the previous turn of their session, replays and refusals."""
+    return turn_guard.stats()
+
+@app.get("/health/prefetch")
+async def prefetch_health():
+    """Socratic skip explanations computed in the background: served ready, waited for, cancelled."""
+    return explanation_prefetcher.stats()
+
+@app.get("/health/single-flight")
+async def single_flight_health():
+    """Counters for coalesced identical in-flight LLM calls."""
+    return single_flight_stats()
+
+
+@app.get("/health/grounding")
+async def grounding_health():
+    """Evidence quote checks: exact, snapped, missing, and re-asks recovered or failed."""
+    return grounding_verifier.stats()
+
+
+@app.get("/health/hedging")
+async def hedging_health():
+    """Hedge rate, hedge wins and deadline misses for the router and hint chains."""
+    return hedger.stats()
+
+
+@app.get("/health/tokens")
+async def token_usage():
+    """Real token usage and estimated cost, in total and per chain."""
+    return token_ledger.snapshot()
+
+
+@app.get("/health/prompts")
+async def prompts_health():
+    """Version, token count and segments of every loaded prompt."""
+    return prompt_registry.stats()
+
+
+@app.get("/health/theory")
+async def theory_health():
+    """Sections in the theory index and how many searches found nothing relevant."""
+    return theory_index.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
+registry.register_callback("tutor_active_sessions", "Chat sessions held in memory.", [],
+                           lambda: [({}, active_session_count())])
+register_cache("single_flight", lambda: (
+    sum(s.get("coalesced", 0) for s in single_flight_stats().values()),
+    sum(s.get("upstream", 0) for s in single_flight_stats().values()),
+))
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    """Admin endpoints need the X-Admin-Token header; without ADMIN_TOKEN set they are closed."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest(x_admin_token or "", expected):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/admin/tokens", dependencies=[Depends(require_admin)])
+async def token_breakdown(top_sessions: int = 10):
+    """Token usage per chain, per student and for the costliest sessions (at most 100)."""
+    return {**token_ledger.snapshot(), **token_ledger.breakdown(top_sessions)}
+
+
+@app.get("/admin/slow-turns", dependencies=[Depends(require_admin)])
+async def slow_turns(limit: int = 20):
+    """Most recent chat turns slower than TRACE_SLOW_TURN_MS, with every stage span."""
+    return {
+        "threshold_ms": slow_traces.threshold_ms,
+        **slow_traces.counters,
+        "turns": slow_traces.snapshot(limit),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -17,6 +17,9 @@ class ChatRequest(BaseModel):
     messages: list[ChatMessage]
     # This field will be present when a user drags and drops a question
     dropped_question_id: str | None = None
+    # Client-generated id of this message (or the Idempotency-Key header); a retry
+    # with the same id gets the stored reply instead of a second turn
+    idempotency_key: str | None = None
 
 
 class DeeperFeedbackRequest(BaseModel):
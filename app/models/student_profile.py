@@ -216,6 +216,9 @@ class ConversationMemory(BaseModel):
     pending_socratic_questions: Dict[int, Dict[str, Any]] = Field(default_factory=dict)  # {question_id: {student_answer, correct_answer, question_text}}
     waiting_for_reasoning: Optional[int] = None  # question_id we're waiting for student reasoning on
     student_reasoning: Dict[int, str] = Field(default_factory=dict)  # {question_id: reasoning_text}
+    # Explanations of the pending wrong answers, computed in the background after grading
+    # {question_id: DeeperFeedbackResponse} (see app/services/explanation_prefetch.py)
+    precomputed_explanations: Dict[int, Any] = Field(default_factory=dict)
     
     def add_follow_up(self, item: str, trigger_after: int = 3) -> None:
         """Add something to follow up on after n exchanges."""
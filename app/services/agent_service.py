@@ -1,15 +1,14 @@
 # app/services/agent_service.py
 
-from pathlib import Path
 from typing import Literal, Dict, Any, Optional, List
 
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from pydantic import BaseModel, Field
 
 from app.core.config import settings 
+from app.core.llm import create_chat_model
 from app.models.chat_models import ChatMessage
 from typing import Optional, List
 from app.models.tutor_persona import alex
@@ -17,21 +16,34 @@ from app.services.emotion_detector import emotion_detector, emotional_response_g
 from app.services.profile_service import profile_service
 from app.models.student_profile import ConversationMemory
 from app.services.answer_parser import parse_student_answers, extract_question_id_from_message
+from app.services.grounding import grounding_verifier
+from app.services.single_flight import get_single_flight, make_key
+from app.services.hedging import hedger, DeadlineExceeded
+from app.core.deadline import llm_deadline
+from app.core.tracing import tracer
+from app.core.prompt_registry import prompt_registry
+from app.services.intent_tagger import intent_tagger, MICRO_BATTLE, THEORY_TOPICS
+from app.services.prompt_assembler import general_chat_assembler, history_parts, text_part
+from app.services.theory_index import theory_index, compact_theory, format_hits, question_type_id
+from app.core.token_usage import count_tokens
+from app.core.log_pipeline import log_cost_scope
+from app.services.turn_guard import turn_guard
+from app.core.disconnect import finish_anyway
+from app.services.explanation_prefetch import explanation_prefetcher
 import logging
-from datetime import datetime
-
-# Setup file logging
-log_file = f"debug_log_{datetime.now().strftime('%Y%m%d')}.txt"
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
+import os
+
+# Handlers are set up by the app (app.core.log_pipeline.configure_logging)
 logger = logging.getLogger(__name__)
 
+# Whole-turn budget for LLM work; past it hedged chains answer deterministically
+TURN_DEADLINE_SECONDS = float(os.getenv("CHAT_TURN_DEADLINE_SECONDS", 30))
+
+# Largest prebuilt compact theory (app/prompts/theory) used when no theory section matches:
+# in deeper feedback, and in general chat while the conversation is on a question type
+FEEDBACK_THEORY_TOKENS = int(os.getenv("FEEDBACK_THEORY_TOKENS", 1200))
+TOPIC_THEORY_TOKENS = int(os.getenv("GENERAL_CHAT_TOPIC_THEORY_TOKENS", 600))
+
 class MicroBattleQuestion(BaseModel):
     id: int
     skill: Literal["GIST", "DETAIL", "INFERENCE"]
@@ -136,15 +148,28 @@ class MicroBattle(BaseModel):
     questions: List[MicroBattleQuestion]
 
 
+# Micro-battle prompt per requested question type (registry names)
+MICRO_BATTLE_PROMPTS = {
+    "mixed": "micro_battle",
+    "tfng": "micro_battle_tfng",
+    "multiple_choice": "micro_battle_multiple_choice",
+    "short_answer": "micro_battle_short_answer",
+}
+
+# Prompts run through prompt_registry.template() (the general chat builds its prompt per turn)
+TEMPLATE_PROMPTS = ("tutor_router", "hint_generation", "socratic_followup", "deeper_feedback",
+                    "evidence_reask", *MICRO_BATTLE_PROMPTS.values())
+
+
 class AgentService:
     def __init__(self):
         # Параметры (api_key) передаются напрямую в конструкторы моделей
-        self.quality_llm = ChatOpenAI(
+        self.quality_llm = create_chat_model(
             model="gpt-4o-mini",
             temperature=0.2,
             api_key=settings.OPENAI_API_KEY 
         )
-        self.fast_llm = ChatOpenAI(
+        self.fast_llm = create_chat_model(
             model="gpt-4o-mini",
             temperature=0.2,
             api_key=settings.OPENAI_API_KEY
@@ -160,357 +185,51 @@ class AgentService:
         # Initialize profile service
         self.profile_service = profile_service
         self.active_sessions: Dict[str, ConversationMemory] = {}
-        # Get the absolute path to the prompts directory
-        current_file = Path(__file__).resolve()
-        prompts_dir = current_file.parent.parent / "prompts"
-        self.deeper_feedback_prompt_template = (prompts_dir / "deeper_feedback.txt").read_text()
-        self.tutor_router_prompt_template = (prompts_dir / "tutor_router.txt").read_text()
-        self.hint_generation_prompt_template = (prompts_dir / "hint_generation.txt").read_text()
-        
-        # Load specialized micro-battle prompts
-        self.micro_battle_prompts = {
-            "mixed": (prompts_dir / "micro_battle.txt").read_text(),
-            "tfng": (prompts_dir / "micro_battle_tfng.txt").read_text(),
-            "multiple_choice": (prompts_dir / "micro_battle_multiple_choice.txt").read_text(),
-            "short_answer": (prompts_dir / "micro_battle_short_answer.txt").read_text()
+        # Battles that finished after their client disconnected: session_id -> ((level, question_type), battle)
+        self.undelivered_battles: Dict[str, tuple] = {}
+        # Prompts come from the registry (loaded once, hot-reloaded on file change)
+        self.prompts = prompt_registry
+
+    def warm_up(self) -> None:
+        """Compile every prompt template and load the theory index, so the first turn does not pay for it."""
+        for name in TEMPLATE_PROMPTS:
+            self.prompts.template(name)
+        theory_index.load()
+
+    @staticmethod
+    def explanation_context(memory: ConversationMemory, wrong_q: Dict[str, Any]) -> Dict[str, Any]:
+        """generate_deeper_feedback input for a wrong answer under Socratic review."""
+        return {
+            "passage_text": memory.current_passage,
+            "question_statement": wrong_q['question_text'],
+            "student_answer": wrong_q['student_answer'],
+            "correct_answer": wrong_q['correct_answer'],
+            "question_type_theory": "Review the passage carefully.",
+            "is_correct": False
         }
-        self.micro_battle_prompt_template = self.micro_battle_prompts["mixed"]
-
-        # Load T/F/NG theory for educational feedback
-        self.tfng_theory_compact = (prompts_dir / "tfng_theory_compact.txt").read_text()
-        
-        # Load Matching Headings theory for educational feedback
-        self.matching_headings_theory_compact = (prompts_dir / "matching_headings_theory_compact.txt").read_text()
-
-        self.general_chat_prompt_template = ChatPromptTemplate.from_messages([
-            ("system", """System: You are Alex, an expert IELTS Reading tutor with a warm, encouraging personality. You're a former IELTS examiner with 8 years of teaching experience, specialized in the IELTS Academic Reading module.
-
-Your personality:
-- Encouraging but honest, using humour to lighten stress
-- Occasionally uses coffee metaphors to explain concepts
-- Celebrates small wins enthusiastically
-- Uses British spellings (colour, favourite, analyse)
-- References common student mistakes warmly, without judgment
-- Shows empathy when students are frustrated, confused, anxious, or tired
-
-Your mission: help students improve reading skills (timing, accuracy, vocabulary, inference) using scaffolded teaching, short practice tasks, and clear feedback. Always be student-centred, motivational, and concise.
-
-RESPONSE FORMATTING RULES (CRITICAL):
-- Use MINIMAL vertical spacing - only ONE blank line between major sections
-- NO blank lines between bullet points or list items within the same section
-- NO blank lines between sub-sections (e.g., between "Absolute:" and "Qualified:")
-- NO blank lines between example components (passage, statement, analysis)
-- Group related content tightly together
-- Only separate distinct topics with a single blank line
-
-GOOD spacing example:
-"**Key Qualifiers to Watch For:**
-
-**Absolute vs. Qualified Statements:**
-• Absolute: "All", "always", "never"
-• Qualified: "Some", "often", "may"
-
-**Common Mistakes:**
-• Ignoring Small Words: A statement saying..."
-
-BAD spacing (DO NOT use):
-"**Key Qualifiers to Watch For:**
-
-
-**Absolute vs. Qualified Statements:**
-
-• Absolute: "All", "always", "never"
-
-• Qualified: "Some", "often", "may"
-
-
-**Common Mistakes:**
-
-• Ignoring Small Words: A statement saying..."
-
-SPECIFIC PROBLEM STRATEGIES:
-⚠️ IMPORTANT: Only use these comprehensive explanations when the student has clarified their SPECIFIC ASPECT!
-- If they mention a general problem type (e.g., "problem with t/f/ng"), ASK FOR CLARIFICATION FIRST
-- If they mention a specific aspect (e.g., "can't distinguish FALSE from NOT GIVEN"), use the relevant section below
-
-When a student has clarified their SPECIFIC ASPECT, provide comprehensive explanation with strategy AND mini examples:
-
-• T/F/NG Questions: "True/False/Not Given questions test whether a statement matches the passage exactly (TRUE), contradicts it (FALSE), or isn't mentioned at all (NOT GIVEN).
-
-**How to approach:**
-1. Read the statement carefully and identify key claims
-2. Scan the passage for relevant information
-3. Compare precisely - does it match, contradict, or is it missing?
-
-**Key tip:** Never use outside knowledge! Only what's written in the passage matters.
-
-**Mini example:**
-📖 Passage: 'The study involved 50 local participants.'
-✅ TRUE: 'Fifty people from the area took part' (same meaning, different words)
-❌ FALSE: 'International participants were included' (contradicts 'local')
-❓ NOT GIVEN: 'The study was expensive' (cost not mentioned)"
-
-• Matching Headings: "These questions require you to match paragraph headings based on the MAIN IDEA, not just keywords.
-
-**How to approach:**
-1. Skim each paragraph to identify the central theme
-2. Summarize the main point in your own words
-3. Match to the heading that captures that core idea
-
-**Key tip:** Distractor headings often contain similar keywords but wrong meanings. Focus on the overall message, not individual words.
-
-**Mini example:**
-📄 Paragraph: 'Research shows caffeine improves focus temporarily but causes crashes later. Studies recommend limiting intake to avoid dependency.'
-✅ Correct heading: 'The drawbacks of caffeine consumption'
-❌ Wrong heading: 'Benefits of caffeine' (mentions benefits but main idea is drawbacks)"
-
-• Timing Issues: "IELTS Reading gives you 60 minutes for 3 passages and 40 questions - that's 20 minutes per passage.
-
-**How to approach:**
-1. Spend 2-3 minutes skimming the passage for main ideas
-2. Allocate 15-17 minutes for questions
-3. If stuck on a question, move on and return later
-4. Leave 2-3 minutes at the end to transfer answers
-
-**Key tip:** Practice with a timer to build speed and develop time awareness.
-
-**Mini example:**
-⏰ Passage 1 (0-20 min): Skim 2 min + Questions 16 min + Review 2 min
-⏰ Passage 2 (20-40 min): Same approach
-⏰ Passage 3 (40-60 min): Same approach"
-
-• Vocabulary Problems: "Don't panic if you see unfamiliar words! IELTS tests your ability to understand meaning from context.
-
-**How to approach:**
-1. Read the sentences before and after the unknown word
-2. Look for context clues: definitions, examples, or synonyms nearby
-3. Try to infer the general meaning (positive/negative, action/description)
-4. Often you can answer without knowing the exact definition
-
-**Key tip:** Focus on understanding the general idea, not every single word.
-
-**Mini example:**
-📖 'The new policy was implemented to ameliorate working conditions.'
-Even if you don't know 'ameliorate', the context ('new policy', 'working conditions') suggests it means improve/make better."
 
-• Multiple Choice: "These questions test your ability to identify correct information while avoiding distractors.
-
-**How to approach:**
-1. Read the question stem carefully
-2. Predict a possible answer before looking at options
-3. Eliminate obviously wrong answers
-4. Watch for paraphrasing - correct answers rarely use exact passage words
-
-**Key tip:** Wrong answers often include passage vocabulary to mislead you!
-
-**Mini example:**
-📖 Passage: 'The experiment showed promising results in laboratory settings.'
-❓ Question: 'What did the experiment demonstrate?'
-A) It was successful in real-world conditions (❌ says 'laboratory')
-B) It showed potential in controlled environments (✅ 'promising' = 'potential', 'laboratory' = 'controlled')"
-
-• Gap Fill/Sentence Completion: "Fill in blanks using words directly from the passage that fit grammatically.
-
-**How to approach:**
-1. Read the incomplete sentence carefully
-2. Identify what type of word is needed (noun, verb, adjective)
-3. Scan the passage for the relevant section
-4. Choose words that fit both meaning AND grammar
-
-**Key tip:** Check grammar! If it's 'a ___', you need a singular noun. If it's 'were ___', you need past participle or adjective.
-
-**Mini example:**
-📖 Passage: 'Researchers discovered significant improvements in patient recovery times.'
-Complete: 'The study found _______ improvements.'
-Answer: 'significant' (matches grammar and meaning)"
-
-• Short Answer: "Write brief answers using passage words, respecting word limits.
-
-**How to approach:**
-1. Read the question and note the word limit (usually 1-3 words)
-2. Find the answer location in the passage
-3. Copy exact words from the passage
-4. Count your words - exceeding the limit = wrong answer
-
-**Key tip:** Don't paraphrase unless specifically asked! Use the passage's exact wording.
-
-**Mini example:**
-📖 Passage: 'The conference will take place in Geneva next spring.'
-❓ Question: 'Where will the conference be held? (ONE WORD)'
-Answer: 'Geneva' (✅) NOT 'in Geneva' (❌ two words)"
-
-If the problem is VAGUE (like "I'm struggling" without specifics), ask: "What specific area are you finding tricky? Is it timing, vocabulary, or a particular question type like T/F/NG or matching headings?"
-
-EDUCATIONAL REQUESTS VS PRACTICE REQUESTS:
-
-When a student asks to LEARN (show me, explain, teach me, what's the logic, give examples, demonstrate):
-1. PROVIDE a clear explanation with 2-3 CONCRETE EXAMPLES showing the logic
-2. Use simple language and break down the reasoning step-by-step
-3. DON'T immediately push for practice - they want to understand the theory first
-4. End with: "Does this make sense? Any questions about the logic?" OR "Want more examples, or shall we try applying this in practice?"
-
-When a student wants to PRACTICE (give me practice, let's try, test me, generate passage):
-1. ACKNOWLEDGE briefly
-2. Ask for their level (Beginner/Intermediate/Advanced or 1/2/3)
-3. Generate the practice passage immediately
-
-When a student mentions a PROBLEM (I have trouble with X, I struggle with Y):
-1. If GENERAL PROBLEM TYPE mentioned (e.g., "problem with t/f/ng") without specific aspect:
-   → ASK diagnostic clarification questions to identify the SPECIFIC aspect
-   → "What specifically are you finding tricky? [list 5-7 specific aspects]"
-   → WAIT for their response
-
-2. If SPECIFIC ASPECT mentioned (e.g., "can't distinguish FALSE from NOT GIVEN"):
-   → PROVIDE focused explanation on that ONE aspect only
-   → Include step-by-step approach and concrete examples
-   → End with: "Does this clear it up? Want to try a practice question?"
-
-3. If COMPLETELY VAGUE (e.g., "I'm struggling"):
-   → ASK about general area: "What area? (timing, vocab, question types)"
-   → WAIT for their response before proceeding
-
-PRACTICE SESSION GENERATION:
-- User says "practice" or wants a drill → ask for level
-- User provides ANY level indicator ("1", "beginner", "first", etc.) → IMMEDIATELY generate the passage (no confirmation)
-- User repeats level ("I said beginner") → apologize and generate immediately
-- NEVER use "micro-battle" to users; call it "Practice Session" or "Exercise"
-
-AFTER they complete practice:
-- Give feedback on their answers
-- ASK: "Want to try something more challenging?" or "Ready for a harder passage?"
-- If YES: ask for next level and generate immediately
-- Track difficulty progression in your responses
-
-NEVER:
-- Don't offer "micro-practice" without actually providing a passage
-- Don't give vague practice suggestions like "try skimming any text you have"
-- Don't promise practice and then not deliver it
-- Don't use the term "micro-battle" in user-facing messages
-
-Behavior rules:
-- Start responses with brief empathy/encouragement
-- Ask clarifying questions only when needed
-- Keep replies under 400 words and focused
-- End every turn with a clear next step or question
-
-Example flows:
-
-TEACHING REQUEST (wants explanation with examples):
-User: "Can you show me the logic when doing t/f/ng questions with examples?"
-You: "Absolutely! Let me break down the T/F/NG logic step-by-step. 🧠
-
-**The Three-Way Decision:**
-1. TRUE = Statement matches the passage exactly (or with synonyms/paraphrasing)
-2. FALSE = Statement directly contradicts what the passage says
-3. NOT GIVEN = The passage doesn't discuss this topic at all
-
-**Example 1 - TRUE:**
-📖 Passage: 'The experiment involved 50 participants from local universities.'
-📝 Statement: 'Fifty people took part in the study.'
-✅ TRUE - Same meaning, just different words ('50' = 'fifty', 'involved' = 'took part', 'participants' = 'people')
-
-**Example 2 - FALSE:**
-📖 Passage: 'The experiment involved 50 participants from local universities.'
-📝 Statement: 'The study included participants from international universities.'
-❌ FALSE - Direct contradiction! Passage says 'local', statement says 'international'
-
-**Example 3 - NOT GIVEN:**
-📖 Passage: 'The experiment involved 50 participants from local universities.'
-📝 Statement: 'The experiment was expensive to conduct.'
-❓ NOT GIVEN - Cost is never mentioned in the passage at all
-
-The key is comparing ONLY what's written—never use your outside knowledge!
-
-Does this make sense? Want more examples, or shall we try applying this in practice?"
-
-GENERAL PROBLEM TYPE (needs clarification):
-User: "I have problem with t/f/ng type of question"
-You: "I can help with T/F/NG questions! 📝 Let me understand better so I can give you the most useful advice.
-
-**What specifically are you finding tricky?**
-• Understanding what TRUE/FALSE/NOT GIVEN mean?
-• Distinguishing FALSE from NOT GIVEN? (This is the trickiest part!)
-• Finding the relevant information in the passage?
-• Taking too long to answer these questions?
-• Understanding qualifiers and keywords?
-• Something else?
-
-Let me know and I'll give you targeted strategies!"
-
-SPECIFIC ASPECT (provide focused explanation):
-User: "I can't distinguish FALSE from NOT GIVEN"
-You: "Ah, that's THE most common struggle with T/F/NG! This is where most students get confused. Let me break down the key difference:
-
-**FALSE = Direct Contradiction**
-The passage SAYS something that CONTRADICTS the statement.
-You CAN quote the opposing information.
-**NOT GIVEN = No Information**
-The passage DOESN'T MENTION this topic at all.
-You CANNOT find any relevant information.
-
-**The Two-Question Test:**
-1. Does the passage discuss this topic?
-   - If NO → NOT GIVEN (stop here)
-   - If YES → Go to question 2
-2. Does it agree or contradict?
-   - Agrees → TRUE
-   - Contradicts → FALSE
-
-**Example:**
-📖 Passage: 'The study involved 50 local participants.'
-Statement 1: 'International participants were involved'
-→ Question 1: Does passage discuss participants? YES ✓
-→ Question 2: Does it agree? NO, says 'local' not 'international'
-→ Answer: FALSE (contradiction!)
-Statement 2: 'The study was expensive'
-→ Question 1: Does passage discuss cost/expense? NO ✗
-→ Answer: NOT GIVEN (topic not mentioned)
-
-See the difference? FALSE contradicts something stated, NOT GIVEN isn't discussed at all.
-
-Does this clear it up? Want to try a practice question?"
-
-VAGUE PROBLEM (needs clarification):
-User: "I'm struggling with reading"
-You: "I hear you—IELTS Reading can feel overwhelming! 💪 Let me help narrow it down.
-
-What specifically are you finding challenging? Is it:
-• Timing (running out of time)?
-• Vocabulary (too many unknown words)?
-• Specific question types (like T/F/NG or matching headings)?
-• Understanding the main ideas?
-
-Let me know and I'll give you targeted strategies and examples!"
-
-GENERAL PROBLEM WITH TIMING (needs clarification):
-User: "I have problem with timing"
-You: "Timing issues are super common! ⏰ Let's pinpoint where you're losing time.
-
-**Where are you struggling?**
-• Reading the passage too slowly?
-• Spending too long on difficult questions?
-• Not sure how to allocate time across passages?
-• Getting stuck and can't move on?
-• Running out of time at the end?
-
-Which one sounds most like your situation?"
-
-PRACTICE REQUEST (wants to practice):
-User: "Let's try some practice" OR "Give me a passage"
-You: "Brilliant! Just tell me your level (Beginner/Intermediate/Advanced or 1/2/3) and I'll generate a Practice Session with questions. You'll get instant feedback when you submit!"
-
-AFTER PRACTICE COMPLETION:
-You: "[Feedback on answers]
-
-Great effort! Want to try a more challenging passage? Just say 'Advanced' or '3' for a harder one!"
-
-End."""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("user", "{user_message}")
-        ])
-
-    async def handle_chat_message(self, session_id: str, messages: list[ChatMessage], dropped_question_id: str | None) -> ChatMessage:
+    async def handle_chat_message(self, session_id: str, messages: list[ChatMessage], dropped_question_id: str | None,
+                                  idempotency_key: str | None = None) -> ChatMessage:
         """Главный обработчик сообщений чата."""
+        # One turn at a time per session; a retry with the same idempotency key gets the stored reply
+        async with turn_guard.turn(session_id, idempotency_key, messages[-1].content) as slot:
+            if slot.replay is not None:
+                return ChatMessage(role="assistant", content=slot.replay)
+            # Turn deadline: seen by the rate limiter and by hedged chains (router, hints)
+            memory = self.active_sessions.get(session_id)
+            student_id = memory.student_id if memory is not None else "guest"
+            with llm_deadline(TURN_DEADLINE_SECONDS), log_cost_scope() as log_cost, tracer.span(
+                "chat.turn", session_id=session_id, student_id=student_id, messages=len(messages)
+            ) as turn:
+                response = await self._handle_chat_message(session_id, messages, dropped_question_id)
+                if turn is not None:
+                    turn.set_attribute("response_chars", len(response.content))
+                    turn.set_attribute("log_records", log_cost.records)
+                    turn.set_attribute("log_us", round(log_cost.ns / 1000, 1))
+            slot.store(response.content)
+            return response
+
+    async def _handle_chat_message(self, session_id: str, messages: list[ChatMessage], dropped_question_id: str | None) -> ChatMessage:
         chat_history = messages[:-1]
         user_message = messages[-1].content
         router_decision: Optional[RouterOutput] = None
@@ -518,7 +237,8 @@ End."""),
         # Parse and store student answers if present
         if session_id in self.active_sessions:
             memory = self.active_sessions[session_id]
-            parsed_answers = parse_student_answers(user_message)
+            with tracer.span("parse_answers"):
+                parsed_answers = parse_student_answers(user_message)
             if parsed_answers:
                 # Store answers in memory
                 memory.student_answers.update(parsed_answers)
@@ -530,53 +250,59 @@ End."""),
                 router_decision = RouterOutput(action="PROVIDE_FEEDBACK", parameters={})
 
         # FAST-PATH: Bypass router for simple greetings/chitchat (saves 3-7 seconds)
-        lower_msg = user_message.lower().strip()
-        
-        # Simple greetings (1-2 words)
-        simple_greetings = {
-            "hello", "hi", "hey", "hiya", "howdy", "greetings",
-            "good morning", "good afternoon", "good evening", "good day",
-            "what's up", "whats up", "sup", "wassup", "yo"
-        }
+        # Tag the message with every fast-path intent and theory topic
+        with tracer.span("intent_tag"):
+            message_tags = intent_tagger.tag(user_message)
         
         # Check if message is a simple greeting
-        if lower_msg in simple_greetings or (len(user_message.split()) <= 2 and any(g in lower_msg for g in simple_greetings)):
+        if intent_tagger.is_simple_greeting(user_message, message_tags):
             logger.info("[FAST_PATH] Bypassing router for simple greeting")
             router_decision = RouterOutput(action="CHITCHAT", parameters={})
         
         # Shortcut: if user clearly asks for a micro-battle, route directly to GENERATE_MICRO_BATTLE
-        if router_decision is None:
-            micro_battle_keywords = [
-                "micro battle", "micro-battle", "micro passage", "micro-passage",
-                "3-minute drill", "three minute drill", "micro drill", "short practice",
-                "micro reading", "micro exercise", "micro passage battle"
-            ]
-            if any(k in lower_msg for k in micro_battle_keywords):
-                router_decision = RouterOutput(action="GENERATE_MICRO_BATTLE", parameters={})
+        if router_decision is None and MICRO_BATTLE in message_tags:
+            router_decision = RouterOutput(action="GENERATE_MICRO_BATTLE", parameters={})
         
         try:
             if router_decision is None:
                 router_chain = (
-                    ChatPromptTemplate.from_template(self.tutor_router_prompt_template)
+                    self.prompts.template("tutor_router")
                     | self.fast_llm 
                     | JsonOutputParser(pydantic_object=RouterOutput)
                 )
                 
                 formatted_history = "\n".join([f"{m.role}: {m.content}" for m in chat_history])
-                router_result = await router_chain.ainvoke({
+                router_input = {
                     "chat_history": formatted_history,
                     "user_message": user_message
-                })
+                }
+                # Hedged: a second request goes out if the first is slower than the router p95
+                with tracer.span("router", chain="router", prompt_version=self.prompts.version("tutor_router")):
+                    router_result = await hedger.call("router", lambda: router_chain.ainvoke(router_input))
                 # Convert dict to RouterOutput if needed
                 if isinstance(router_result, dict):
                     router_decision = RouterOutput(**router_result)
                 else:
                     router_decision = router_result
+        except DeadlineExceeded as e:
+            logger.warning(f"[HEDGE] Router missed its deadline, falling back to CHITCHAT: {e}")
+            router_decision = RouterOutput(action="CHITCHAT", parameters={})
         except Exception as e:
-            print(f"Error in router or parsing: {e}")
+            logger.error(f"[ROUTER] Routing or parsing failed, falling back to CHITCHAT: {e}")
             # Fallback to general chat if routing fails
             router_decision = RouterOutput(action="CHITCHAT", parameters={})
-        
+
+        tracer.annotate_root(action=router_decision.action)
+        with tracer.span("action", action=router_decision.action):
+            response_content = await self._run_action(
+                router_decision, session_id, chat_history, user_message, dropped_question_id
+            )
+
+        return ChatMessage(role="assistant", content=response_content)
+
+    async def _run_action(self, router_decision: RouterOutput, session_id: str, chat_history: list[ChatMessage],
+                          user_message: str, dropped_question_id: str | None) -> str:
+        """Run the routed action and return the reply text."""
         if router_decision.action == "GENERATE_EXPLANATION":
             params = router_decision.parameters or {}
             
@@ -591,18 +317,12 @@ End."""),
                     # Get context for explanation
                     context = await self.get_full_context_for_question(f"q{q_id}", wrong_q['student_answer'], session_id)
                     
-                    # Generate standard explanation
-                    feedback_context = {
-                        "passage_text": memory.current_passage,
-                        "question_statement": wrong_q['question_text'],
-                        "student_answer": wrong_q['student_answer'],
-                        "correct_answer": wrong_q['correct_answer'],
-                        "question_type_theory": "Review the passage carefully.",
-                        "is_correct": False
-                    }
+                    # Standard explanation: usually precomputed in the background after grading
+                    feedback_context = self.explanation_context(memory, wrong_q)
                     
                     try:
-                        feedback_model = await self.generate_deeper_feedback(feedback_context)
+                        feedback_model = await explanation_prefetcher.get(
+                            memory, q_id, feedback_context, self.generate_deeper_feedback)
                         response_content = f"**Q{q_id} Explanation:**\n\n"
                         response_content += f"**Why it's wrong:** {feedback_model.error_analysis}\n\n"
                         response_content += f"**Evidence from passage:** {feedback_model.evidence_quote}\n\n"
@@ -627,6 +347,7 @@ End."""),
                         response_content += "_(Or say 'skip' to see the explanation)_"
                     else:
                         # All wrong answers explained!
+                        explanation_prefetcher.cancel(memory)
                         response_content += "✅ **All questions reviewed! Ready for another practice?**"
                 
             # Standard GENERATE_EXPLANATION for all questions
@@ -720,17 +441,23 @@ End."""),
 
         elif router_decision.action == "GENERATE_HINT":
             hint_chain = (
-                ChatPromptTemplate.from_template(self.hint_generation_prompt_template)
+                self.prompts.template("hint_generation")
                 | self.fast_llm
                 | StrOutputParser()
             )
             # Use dropped_question_id or fall back to a default
             question_id = dropped_question_id if dropped_question_id else "q1"
             context = await self.get_full_context_for_question(question_id, "", session_id)
-            response_content = await hint_chain.ainvoke({
+            hint_input = {
                 "passage_text": context["passage_text"],
                 "question_statement": context["question_statement"]
-            })
+            }
+            try:
+                with tracer.span("hint", chain="hint", prompt_version=self.prompts.version("hint_generation")):
+                    response_content = await hedger.call("hint", lambda: hint_chain.ainvoke(hint_input))
+            except DeadlineExceeded:
+                logger.warning("[HEDGE] Hint chain missed its deadline - using the fallback hint")
+                response_content = self.fallback_hint(context["question_statement"])
 
         elif router_decision.action == "GENERATE_MICRO_BATTLE":
             params = router_decision.parameters or {}
@@ -767,8 +494,22 @@ End."""),
                 formatted_history_mb = "\n".join([f"{m.role}: {m.content}" for m in chat_history])
                 # Extract question_type from parameters, default to "mixed"
                 question_type = params.get("question_type", "mixed")
-                battle = await self.generate_micro_battle(mb_level, mb_topic, question_type, formatted_history_mb, session_id)
-                response_content = format_micro_battle_for_chat(battle)
+                battle_key = (mb_level, question_type)
+                undelivered = self.undelivered_battles.pop(session_id, None)
+                if undelivered is not None and undelivered[0] == battle_key:
+                    # Generated for this session's earlier request, whose client went away;
+                    # generate_micro_battle already stored it on the session
+                    logger.info(f"[MICRO_BATTLE] Delivering the battle generated after session {session_id} disconnected")
+                    battle = undelivered[1]
+                else:
+                    # A battle is worth keeping even if the student closes the tab meanwhile
+                    battle = await finish_anyway(
+                        self.generate_micro_battle(mb_level, mb_topic, question_type, formatted_history_mb, session_id),
+                        lambda result: self.undelivered_battles.__setitem__(session_id, (battle_key, result)),
+                        "micro_battle",
+                    )
+                with tracer.span("format"):
+                    response_content = format_micro_battle_for_chat(battle)
         
         elif router_decision.action == "REQUEST_USER_TEXT":
             response_content = (
@@ -785,8 +526,7 @@ End."""),
 
         elif router_decision.action == "PROVIDE_FEEDBACK":
             # Check submitted answers against correct answers
-            logger.info(f"[FEEDBACK] session_id: {session_id}")
-            logger.info(f"[FEEDBACK] Active sessions: {list(self.active_sessions.keys())}")
+            logger.info(f"[FEEDBACK] session_id: {session_id} ({len(self.active_sessions)} active sessions)")
             
             if session_id in self.active_sessions:
                 memory = self.active_sessions[session_id]
@@ -840,6 +580,10 @@ End."""),
                         if wrong_answers:
                             # Store all wrong answers in memory
                             memory.pending_socratic_questions = {wa["id"]: wa for wa in wrong_answers}
+                            # Start the "skip" explanations now, while the student thinks about the answer
+                            explanation_prefetcher.start(
+                                memory, {wa["id"]: self.explanation_context(memory, wa) for wa in wrong_answers},
+                                self.generate_deeper_feedback)
                             
                             # Ask about the first wrong answer
                             first_wrong = wrong_answers[0]
@@ -851,6 +595,7 @@ End."""),
                             response_content += "_(Or say 'skip' if you want me to explain directly)_"
                         else:
                             # All correct!
+                            explanation_prefetcher.cancel(memory)
                             response_content += "\n\n🎉 **Perfect score! Excellent work!**"
                     else:
                         response_content = "I couldn't match your answers to the questions. Try formatting like '1-A, 2-B, 3-C' next time!"
@@ -876,33 +621,44 @@ End."""),
                     # Get context for explanation
                     context = await self.get_full_context_for_question(f"q{q_id}", wrong_q['student_answer'], session_id)
                     
-                    # Generate explanation based on student's misconception
-                    socratic_prompt = f"""The student answered Question {q_id} incorrectly.
-
-Question: {wrong_q['question_text']}
-Student's answer: {wrong_q['student_answer']}
-Correct answer: {wrong_q['correct_answer']}
-
-Student's reasoning: "{user_message}"
-
-Relevant passage excerpt: {context['passage_text'][:600] if context.get('passage_text') else ''}
-
-Based on the student's reasoning, provide a response that:
-1. Acknowledges their thinking (e.g., "I see why you thought that!")
-2. Identifies the specific misconception that led them astray
-3. Explains what they missed or misunderstood in the passage
-4. Shows the correct reasoning with evidence from the passage
-5. Gives a tip to avoid this mistake in future
-
-Be warm and supportive. Focus on fixing the misconception, not blaming them for the mistake. Use British spellings."""
+                    # Generate explanation based on student's misconception; the explanation
+                    # precomputed after grading, if ready, supplies a verified evidence quote
+                    prefetched = explanation_prefetcher.peek(memory, q_id)
+                    socratic_chain = self.prompts.template("socratic_followup") | self.fast_llm
+                    socratic_input = {
+                        "passage_excerpt": context['passage_text'][:600] if context.get('passage_text') else '',
+                        "question_id": q_id,
+                        "question_text": wrong_q['question_text'],
+                        "student_answer": wrong_q['student_answer'],
+                        "correct_answer": wrong_q['correct_answer'],
+                        "student_reasoning": user_message,
+                        "verified_evidence": prefetched.evidence_quote if prefetched is not None else "",
+                    }
 
-                    explanation_response = await self.fast_llm.ainvoke(socratic_prompt)
-                    
-                    response_content = f"**Q{q_id} Explanation:**\n\n{explanation_response.content}\n\n"
+                    try:
+                        with tracer.span("socratic", chain="socratic",
+                                         prompt_version=self.prompts.version("socratic_followup")):
+                            explanation_response = await socratic_chain.ainvoke(socratic_input)
+                        response_content = f"**Q{q_id} Explanation:**\n\n{explanation_response.content}\n\n"
+                    except Exception as e:
+                        # The follow-up needs the student's reasoning, so it cannot be precomputed;
+                        # if it fails, answer with the explanation computed after grading
+                        logger.error(f"[SOCRATIC] Follow-up failed, using the precomputed explanation: {e}")
+                        try:
+                            feedback_model = await explanation_prefetcher.get(
+                                memory, q_id, self.explanation_context(memory, wrong_q), self.generate_deeper_feedback)
+                            response_content = f"**Q{q_id} Explanation:**\n\n"
+                            response_content += f"**Why it's wrong:** {feedback_model.error_analysis}\n\n"
+                            response_content += f"**Evidence from passage:** {feedback_model.evidence_quote}\n\n"
+                            response_content += f"**Strategy tip:** {feedback_model.strategy_tip}\n\n"
+                        except Exception as e:
+                            logger.error(f"Error generating explanation: {e}")
+                            response_content = f"**Q{q_id}:** The correct answer is **{wrong_q['correct_answer']}**. Review the passage carefully to see why.\n\n"
                     
                     # Remove this question and move to next wrong answer if any
                     del memory.pending_socratic_questions[q_id]
                     memory.waiting_for_reasoning = None
+                    explanation_prefetcher.discard(memory, q_id)
                     
                     # Check if there are more wrong answers
                     if memory.pending_socratic_questions:
@@ -916,6 +672,7 @@ Be warm and supportive. Focus on fixing the misconception, not blaming them for
                         response_content += "_(Or say 'skip' to see the explanation)_"
                     else:
                         # All wrong answers explained!
+                        explanation_prefetcher.cancel(memory)
                         response_content += "✅ **All questions reviewed! Great learning session.**\n\n"
                         response_content += "Want to try another practice passage?"
                 else:
@@ -1021,329 +778,54 @@ Be warm and supportive. Focus on fixing the misconception, not blaming them for
         
         else: # Обработка для CHITCHAT, ASK_SOCRATIC_QUESTION и т.д.
             try:
-                # Build base system message
-                base_system_message = """System: You are Alex, an expert IELTS Reading tutor with a warm, encouraging personality. You're a former IELTS examiner with 8 years of teaching experience, specialized in the IELTS Academic Reading module.
-
-Your personality:
-- Encouraging but honest, using humour to lighten stress
-- Occasionally uses coffee metaphors to explain concepts
-- Celebrates small wins enthusiastically
-- Uses British spellings (colour, favourite, analyse)
-- References common student mistakes warmly, without judgment
-- Shows empathy when students are frustrated, confused, anxious, or tired
-
-Your mission: help students improve reading skills (timing, accuracy, vocabulary, inference) using scaffolded teaching, short practice tasks, and clear feedback. Always be student-centred, motivational, and concise.
-
-RESPONSE FORMATTING RULES (CRITICAL):
-- Use MINIMAL vertical spacing - only ONE blank line between major sections
-- NO blank lines between bullet points or list items within the same section
-- NO blank lines between sub-sections (e.g., between "Absolute:" and "Qualified:")
-- NO blank lines between example components (passage, statement, analysis)
-- Group related content tightly together
-- Only separate distinct topics with a single blank line
-
-GOOD spacing example:
-"**Key Qualifiers to Watch For:**
-
-**Absolute vs. Qualified Statements:**
-• Absolute: "All", "always", "never"
-• Qualified: "Some", "often", "may"
-
-**Common Mistakes:**
-• Ignoring Small Words: A statement saying..."
-
-BAD spacing (DO NOT use):
-"**Key Qualifiers to Watch For:**
-
-
-**Absolute vs. Qualified Statements:**
-
-• Absolute: "All", "always", "never"
-
-• Qualified: "Some", "often", "may"
-
-
-**Common Mistakes:**
-
-• Ignoring Small Words: A statement saying..."
-
-SPECIFIC PROBLEM STRATEGIES:
-⚠️ IMPORTANT: Only use these comprehensive explanations when the student has clarified their SPECIFIC ASPECT!
-- If they mention a general problem type (e.g., "problem with t/f/ng"), ASK FOR CLARIFICATION FIRST
-- If they mention a specific aspect (e.g., "can't distinguish FALSE from NOT GIVEN"), use the relevant section below
-
-When a student has clarified their SPECIFIC ASPECT, provide comprehensive explanation with strategy AND mini examples:
-
-• T/F/NG Questions: "True/False/Not Given questions test whether a statement matches the passage exactly (TRUE), contradicts it (FALSE), or isn't mentioned at all (NOT GIVEN).
-
-**How to approach:**
-1. Read the statement carefully and identify key claims
-2. Scan the passage for relevant information
-3. Compare precisely - does it match, contradict, or is it missing?
-
-**Key tip:** Never use outside knowledge! Only what's written in the passage matters.
-
-**Mini example:**
-📖 Passage: 'The study involved 50 local participants.'
-✅ TRUE: 'Fifty people from the area took part' (same meaning, different words)
-❌ FALSE: 'International participants were included' (contradicts 'local')
-❓ NOT GIVEN: 'The study was expensive' (cost not mentioned)"
-
-• Matching Headings: "These questions require you to match paragraph headings based on the MAIN IDEA, not just keywords.
-
-**How to approach:**
-1. Skim each paragraph to identify the central theme
-2. Summarize the main point in your own words
-3. Match to the heading that captures that core idea
-
-**Key tip:** Distractor headings often contain similar keywords but wrong meanings. Focus on the overall message, not individual words.
-
-**Mini example:**
-📄 Paragraph: 'Research shows caffeine improves focus temporarily but causes crashes later. Studies recommend limiting intake to avoid dependency.'
-✅ Correct heading: 'The drawbacks of caffeine consumption'
-❌ Wrong heading: 'Benefits of caffeine' (mentions benefits but main idea is drawbacks)"
-
-• Timing Issues: "IELTS Reading gives you 60 minutes for 3 passages and 40 questions - that's 20 minutes per passage.
-
-**How to approach:**
-1. Spend 2-3 minutes skimming the passage for main ideas
-2. Allocate 15-17 minutes for questions
-3. If stuck on a question, move on and return later
-4. Leave 2-3 minutes at the end to transfer answers
-
-**Key tip:** Practice with a timer to build speed and develop time awareness.
-
-**Mini example:**
-⏰ Passage 1 (0-20 min): Skim 2 min + Questions 16 min + Review 2 min
-⏰ Passage 2 (20-40 min): Same approach
-⏰ Passage 3 (40-60 min): Same approach"
-
-• Vocabulary Problems: "Don't panic if you see unfamiliar words! IELTS tests your ability to understand meaning from context.
-
-**How to approach:**
-1. Read the sentences before and after the unknown word
-2. Look for context clues: definitions, examples, or synonyms nearby
-3. Try to infer the general meaning (positive/negative, action/description)
-4. Often you can answer without knowing the exact definition
-
-**Key tip:** Focus on understanding the general idea, not every single word.
-
-**Mini example:**
-📖 'The new policy was implemented to ameliorate working conditions.'
-Even if you don't know 'ameliorate', the context ('new policy', 'working conditions') suggests it means improve/make better."
-
-• Multiple Choice: "These questions test your ability to identify correct information while avoiding distractors.
-
-**How to approach:**
-1. Read the question stem carefully
-2. Predict a possible answer before looking at options
-3. Eliminate obviously wrong answers
-4. Watch for paraphrasing - correct answers rarely use exact passage words
-
-**Key tip:** Wrong answers often include passage vocabulary to mislead you!
-
-**Mini example:**
-📖 Passage: 'The experiment showed promising results in laboratory settings.'
-❓ Question: 'What did the experiment demonstrate?'
-A) It was successful in real-world conditions (❌ says 'laboratory')
-B) It showed potential in controlled environments (✅ 'promising' = 'potential', 'laboratory' = 'controlled')"
-
-• Gap Fill/Sentence Completion: "Fill in blanks using words directly from the passage that fit grammatically.
-
-**How to approach:**
-1. Read the incomplete sentence carefully
-2. Identify what type of word is needed (noun, verb, adjective)
-3. Scan the passage for the relevant section
-4. Choose words that fit both meaning AND grammar
-
-**Key tip:** Check grammar! If it's 'a ___', you need a singular noun. If it's 'were ___', you need past participle or adjective.
-
-**Mini example:**
-📖 Passage: 'Researchers discovered significant improvements in patient recovery times.'
-Complete: 'The study found _______ improvements.'
-Answer: 'significant' (matches grammar and meaning)"
-
-• Short Answer: "Write brief answers using passage words, respecting word limits.
-
-**How to approach:**
-1. Read the question and note the word limit (usually 1-3 words)
-2. Find the answer location in the passage
-3. Copy exact words from the passage
-4. Count your words - exceeding the limit = wrong answer
-
-**Key tip:** Don't paraphrase unless specifically asked! Use the passage's exact wording.
-
-**Mini example:**
-📖 Passage: 'The conference will take place in Geneva next spring.'
-❓ Question: 'Where will the conference be held? (ONE WORD)'
-Answer: 'Geneva' (✅) NOT 'in Geneva' (❌ two words)"
-
-If the problem is VAGUE (like "I'm struggling" without specifics), ask: "What specific area are you finding tricky? Is it timing, vocabulary, or a particular question type like T/F/NG or matching headings?"
-
-EDUCATIONAL REQUESTS VS PRACTICE REQUESTS:
-
-When a student asks to LEARN (show me, explain, teach me, what's the logic, give examples, demonstrate):
-1. PROVIDE a clear explanation with 2-3 CONCRETE EXAMPLES showing the logic
-2. Use simple language and break down the reasoning step-by-step
-3. DON'T immediately push for practice - they want to understand the theory first
-4. End with: "Does this make sense? Any questions about the logic?" OR "Want more examples, or shall we try applying this in practice?"
-
-When a student wants to PRACTICE (give me practice, let's try, test me, generate passage):
-1. ACKNOWLEDGE briefly
-2. Ask for their level (Beginner/Intermediate/Advanced or 1/2/3)
-3. Generate the practice passage immediately
-
-When a student mentions a PROBLEM (I have trouble with X, I struggle with Y):
-1. If GENERAL PROBLEM TYPE mentioned (e.g., "problem with t/f/ng") without specific aspect:
-   → ASK diagnostic clarification questions to identify the SPECIFIC aspect
-   → "What specifically are you finding tricky? [list 5-7 specific aspects]"
-   → WAIT for their response
-
-2. If SPECIFIC ASPECT mentioned (e.g., "can't distinguish FALSE from NOT GIVEN"):
-   → PROVIDE focused explanation on that ONE aspect only
-   → Include step-by-step approach and concrete examples
-   → End with: "Does this clear it up? Want to try a practice question?"
-
-3. If COMPLETELY VAGUE (e.g., "I'm struggling"):
-   → ASK about general area: "What area? (timing, vocab, question types)"
-   → WAIT for their response before proceeding
-
-PRACTICE SESSION GENERATION:
-- User says "practice" or wants a drill → ask for level
-- User provides ANY level indicator ("1", "beginner", "first", etc.) → IMMEDIATELY generate the passage (no confirmation)
-- User repeats level ("I said beginner") → apologize and generate immediately
-- NEVER use "micro-battle" to users; call it "Practice Session" or "Exercise"
-
-AFTER they complete practice:
-- Give feedback on their answers
-- ASK: "Want to try something more challenging?" or "Ready for a harder passage?"
-- If YES: ask for next level and generate immediately
-- Track difficulty progression in your responses
-
-NEVER:
-- Don't offer "micro-practice" without actually providing a passage
-- Don't give vague practice suggestions like "try skimming any text you have"
-- Don't promise practice and then not deliver it
-- Don't use the term "micro-battle" in user-facing messages
-
-Behavior rules:
-- Start responses with brief empathy/encouragement
-- Ask clarifying questions only when needed
-- Keep replies under 400 words and focused
-- End every turn with a clear next step or question
-
-Example flows:
-
-TEACHING REQUEST (wants explanation with examples):
-User: "Can you show me the logic when doing t/f/ng questions with examples?"
-You: "Absolutely! Let me break down the T/F/NG logic step-by-step. 🧠
-
-**The Three-Way Decision:**
-1. TRUE = Statement matches the passage exactly (or with synonyms/paraphrasing)
-2. FALSE = Statement directly contradicts what the passage says
-3. NOT GIVEN = The passage doesn't discuss this topic at all
-
-**Example 1 - TRUE:**
-📖 Passage: 'The experiment involved 50 participants from local universities.'
-📝 Statement: 'Fifty people took part in the study.'
-✅ TRUE - Same meaning, just different words ('50' = 'fifty', 'involved' = 'took part', 'participants' = 'people')
-
-**Example 2 - FALSE:**
-📖 Passage: 'The experiment involved 50 participants from local universities.'
-📝 Statement: 'The study included participants from international universities.'
-❌ FALSE - Direct contradiction! Passage says 'local', statement says 'international'
-
-**Example 3 - NOT GIVEN:**
-📖 Passage: 'The experiment involved 50 participants from local universities.'
-📝 Statement: 'The experiment was expensive to conduct.'
-❓ NOT GIVEN - Cost is never mentioned in the passage at all
-
-The key is comparing ONLY what's written—never use your outside knowledge!
-
-Does this make sense? Want more examples, or shall we try applying this in practice?"
-
-GENERAL PROBLEM TYPE (needs clarification):
-User: "I have problem with t/f/ng type of question"
-You: "I can help with T/F/NG questions! 📝 Let me understand better so I can give you the most useful advice.
-
-**What specifically are you finding tricky?**
-• Understanding what TRUE/FALSE/NOT GIVEN mean?
-• Distinguishing FALSE from NOT GIVEN? (This is the trickiest part!)
-• Finding the relevant information in the passage?
-• Taking too long to answer these questions?
-• Understanding qualifiers and keywords?
-• Something else?
-
-Let me know and I'll give you targeted strategies!"
-
-SPECIFIC ASPECT (provide focused explanation):
-User: "I can't distinguish FALSE from NOT GIVEN"
-You: "Ah, that's THE most common struggle with T/F/NG! This is where most students get confused. Let me break down the key difference:
-
-**FALSE = Direct Contradiction**
-The passage SAYS something that CONTRADICTS the statement.
-You CAN quote the opposing information.
-**NOT GIVEN = No Information**
-The passage DOESN'T MENTION this topic at all.
-You CANNOT find any relevant information.
-
-**The Two-Question Test:**
-1. Does the passage discuss this topic?
-   - If NO → NOT GIVEN (stop here)
-   - If YES → Go to question 2
-2. Does it agree or contradict?
-   - Agrees → TRUE
-   - Contradicts → FALSE
-
-**Example:**
-📖 Passage: 'The study involved 50 local participants.'
-Statement 1: 'International participants were involved'
-→ Question 1: Does passage discuss participants? YES ✓
-→ Question 2: Does it agree? NO, says 'local' not 'international'
-→ Answer: FALSE (contradiction!)
-Statement 2: 'The study was expensive'
-→ Question 1: Does passage discuss cost/expense? NO ✗
-→ Answer: NOT GIVEN (topic not mentioned)
-
-See the difference? FALSE contradicts something stated, NOT GIVEN isn't discussed at all.
-
-Does this clear it up? Want to try a practice question?"
-
-VAGUE PROBLEM (needs clarification):
-User: "I'm struggling with reading"
-You: "I hear you—IELTS Reading can feel overwhelming! 💪 Let me help narrow it down.
-
-What specifically are you finding challenging? Is it:
-• Timing (running out of time)?
-• Vocabulary (too many unknown words)?
-• Specific question types (like T/F/NG or matching headings)?
-• Understanding the main ideas?
-
-Let me know and I'll give you targeted strategies and examples!"
-
-GENERAL PROBLEM WITH TIMING (needs clarification):
-User: "I have problem with timing"
-You: "Timing issues are super common! ⏰ Let's pinpoint where you're losing time.
-
-**Where are you struggling?**
-• Reading the passage too slowly?
-• Spending too long on difficult questions?
-• Not sure how to allocate time across passages?
-• Getting stuck and can't move on?
-• Running out of time at the end?
-
-Which one sounds most like your situation?"
-
-PRACTICE REQUEST (wants to practice):
-User: "Let's try some practice" OR "Give me a passage"
-You: "Brilliant! Just tell me your level (Beginner/Intermediate/Advanced or 1/2/3) and I'll generate a Practice Session with questions. You'll get instant feedback when you submit!"
-
-AFTER PRACTICE COMPLETION:
-You: "[Feedback on answers]
-
-Great effort! Want to try a more challenging passage? Just say 'Advanced' or '3' for a harder one!"
-
-End."""
+                # Prompt-cache friendly layout, most shared first: the static persona, then this
+                # session's passage, then the history; the theory sections picked for this very
+                # message go last, just before it, so they never break the cached prefix.
+                general_chat = self.prompts.get("general_chat")
+
+                # READING THEORY: the 2-3 sections most relevant to the message, any question
+                # type; the topic of the last 5 user messages is preferred
+                recent_topics = intent_tagger.recent_topics(chat_history)
+                theory_hits = theory_index.search(user_message, prefer=recent_topics)
+
+                # Candidate parts with priorities; over the token budget the oldest history goes
+                # first, then the least relevant theory sections
+                parts = [text_part("persona", general_chat.text)]
+                if theory_hits:
+                    theory_segment = general_chat.segment("theory")
+
+                    def render_theory(hits):
+                        names = " / ".join(dict.fromkeys(h.section.type_name for h in hits))
+                        return theory_segment.render(theory_name=names, theory=format_hits(hits))
+
+                    def shrink_theory(max_tokens, hits=theory_hits):
+                        for keep in range(len(hits) - 1, 0, -1):
+                            text = render_theory(hits[:keep])
+                            tokens = count_tokens(text)
+                            if tokens <= max_tokens:
+                                return text, tokens, f"{keep}/{len(hits)} sections"
+                        return None
+
+                    parts.append(text_part("theory", render_theory(theory_hits), priority=3, shrink=shrink_theory))
+                    tracer.annotate(theory_sections=",".join(h.section.id for h in theory_hits))
+                else:
+                    # A follow-up without theory terms in a conversation about a question type:
+                    # that type's compact theory, the largest variant that fits the context left
+                    topic = next((t for t in THEORY_TOPICS if t in recent_topics), None)
+                    topic_theory = compact_theory(topic, TOPIC_THEORY_TOKENS) if topic else None
+                    if topic_theory:
+                        theory_segment = general_chat.segment("theory")
+                        theory_name = theory_index.type_name(topic)
+
+                        def shrink_topic_theory(max_tokens, topic=topic):
+                            theory = compact_theory(topic, max_tokens - theory_segment.tokens)
+                            if theory is None:
+                                return None
+                            text = theory_segment.render(theory_name=theory_name, theory=theory)
+                            return text, count_tokens(text), "smaller compact variant"
+
+                        parts.append(text_part("theory", theory_segment.render(theory_name=theory_name, theory=topic_theory),
+                                               priority=3, shrink=shrink_topic_theory))
 
                 # INJECT SESSION CONTEXT if available
                 if session_id in self.active_sessions:
@@ -1352,88 +834,9 @@ End."""
                         # Extract question texts for reference
                         question_list = "\n".join([f"  Q{q.get('id')}: {q.get('question_text', '')}" for q in memory.current_questions])
                         
-                        base_system_message += f"""
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🔒 CRITICAL CONTEXT: ACTIVE PRACTICE SESSION
-
-The student is currently working on THIS specific practice passage:
-
-📄 PASSAGE:
-{memory.current_passage}
-
-❓ QUESTIONS:
-{question_list}
-
-🚨 MANDATORY RULES:
-1. If the student asks about their answers, questions, or requests evidence/explanations:
-   - Quote EXCLUSIVELY from the passage above
-   - Reference ONLY the questions listed above
-   - Use the EXACT wording from the passage (no paraphrasing)
-
-2. If asked "Why is X wrong?" or "Show me evidence":
-   - Find the relevant sentence in the passage above
-   - Quote it word-for-word with quotation marks
-   - Explain using ONLY information from this passage
-
-3. NEVER EVER:
-   - Invent text that doesn't appear in the passage above
-   - Reference other passages or external knowledge
-   - Generate new passages or paraphrased versions
-   - Use placeholder examples like "ocean mapping" or "research projects"
-
-4. If you cannot find the answer in the passage above, say:
-   "I need to check the stored question details. Let me look that up for you."
+                        parts.append(text_part("session_context", general_chat.segment("session_context").render(
+                            passage=memory.current_passage, questions=question_list), priority=1))
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-
-                # Create dynamic prompt template
-                
-                # INJECT READING THEORY based on conversation context
-                theory_to_inject = None
-                theory_name = ""
-                
-                # Analyze last 5 user messages for topic detection
-                recent_user_messages = " ".join([
-                    msg.content.lower() 
-                    for msg in chat_history[-5:] if msg.role == "user"
-                ])
-                
-                # Check for matching headings keywords
-                if any(keyword in recent_user_messages for keyword in [
-                    "matching heading", "match heading", "heading", 
-                    "paragraph heading", "match paragraphs", "match title"
-                ]):
-                    if hasattr(self, 'matching_headings_theory_compact'):
-                        theory_to_inject = self.matching_headings_theory_compact
-                        theory_name = "Matching Headings"
-                        
-                # Check for T/F/NG keywords  
-                elif any(keyword in recent_user_messages for keyword in [
-                    "t/f/ng", "true false", "not given", "tfng",
-                    "true or false", "false or not given"
-                ]):
-                    if hasattr(self, 'tfng_theory_compact'):
-                        theory_to_inject = self.tfng_theory_compact
-                        theory_name = "T/F/NG"
-                
-                # Inject the appropriate theory
-                if theory_to_inject:
-                    base_system_message += f"\n\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                    base_system_message += f"📚 READING THEORY KNOWLEDGE (Use this to answer student questions about {theory_name}):\n"
-                    base_system_message += f"{theory_to_inject}\n"
-                    base_system_message += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-
-                dynamic_chat_prompt = ChatPromptTemplate.from_messages([
-                    ("system", base_system_message),
-                    MessagesPlaceholder(variable_name="chat_history"),
-                    ("user", "{user_message}")
-                ])
-                
-                general_chain = dynamic_chat_prompt | self.fast_llm | StrOutputParser()
-                
                 # Convert ChatMessage objects to LangChain message objects
                 history_messages = []
                 for m in chat_history:
@@ -1443,23 +846,43 @@ The student is currently working on THIS specific practice passage:
                         history_messages.append(AIMessage(content=m.content))
                     elif m.role == "system":
                         history_messages.append(SystemMessage(content=m.content))
-                
-                response_content = await general_chain.ainvoke({
-                    "chat_history": history_messages,
-                    "user_message": user_message
-                })
+                parts.extend(history_parts(history_messages))
+                parts.append(text_part("user_message", user_message))
+
+                with tracer.span("general_chat", chain="general_chat", history_messages=len(history_messages),
+                                 prompt_version=general_chat.version):
+                    prompt = general_chat_assembler.assemble(parts)
+                    system_message = "\n\n".join(prompt.parts[name] for name in ("persona", "session_context")
+                                                  if prompt.get(name))
+
+                    # Ready SystemMessages, so braces in the passage are not read as template variables
+                    dynamic_chat_prompt = ChatPromptTemplate.from_messages(
+                        [SystemMessage(content=system_message), MessagesPlaceholder(variable_name="chat_history")]
+                        + ([SystemMessage(content=prompt.parts["theory"])] if prompt.get("theory") else [])
+                        + [("user", "{user_message}")]
+                    )
+                    general_chain = dynamic_chat_prompt | self.fast_llm | StrOutputParser()
+
+                    response_content = await general_chain.ainvoke({
+                        "chat_history": prompt.get("older_history", []) + prompt.get("recent_history", []),
+                        "user_message": user_message
+                    })
             except Exception as e:
-                print(f"Error in general chat: {e}")
+                logger.error(f"[GENERAL_CHAT] Error in general chat: {e}")
                 response_content = (
                     "Hi! 👋 I'm ALEX — your IELTS Reading Mentor. "
                     "Tell me what you want to work on today: timing, accuracy, vocabulary, "
                     "matching headings, or general practice. 😊"
                 )
 
-        return ChatMessage(role="assistant", content=response_content)
+        return response_content
 
     async def get_full_context_for_question(self, question_id, student_answer, session_id):
         """Retrieve context for a question, preferring active session memory over mock data."""
+        with tracer.span("context", question_id=str(question_id)):
+            return await self._full_context_for_question(question_id, student_answer, session_id)
+
+    async def _full_context_for_question(self, question_id, student_answer, session_id):
         
         # 1. Try to get from real session memory
         if session_id in self.active_sessions:
@@ -1486,22 +909,19 @@ The student is currently working on THIS specific practice passage:
                         "question_type_theory": "Review the passage carefully to find evidence supporting or contradicting the statement."
                     }
                     
-                    logger.info(f"[CONTEXT] ✅ Found context from session")
-                    logger.info(f"[CONTEXT] Passage (first 150 chars): {memory.current_passage[:150]}")
-                    logger.info(f"[CONTEXT] Question: {target_q.get('question_text', '')}")
+                    logger.debug(f"[CONTEXT] Found context from session for question {question_id}: "
+                                 f"{target_q.get('question_text', '')[:80]}")
                     
                     return context_to_return
 
 
         # 2. Fallback to mock data if no session context found
-        logger.warning(f"[FALLBACK] ⚠️ Using MOCK DATA (ocean mapping)!")
-        logger.warning(f"  → session_id: {session_id}")
-        logger.warning(f"  → session exists: {session_id in self.active_sessions}")
-        if session_id in self.active_sessions:
-            memory = self.active_sessions[session_id]
-            logger.warning(f"  → has passage: {bool(memory.current_passage)}")
-            logger.warning(f"  → has questions: {len(memory.current_questions) if memory.current_questions else 0}")
-            logger.warning(f"  → question_id requested: {question_id}")
+        memory = self.active_sessions.get(session_id)
+        logger.warning(
+            f"[FALLBACK] Using MOCK DATA (ocean mapping): session={session_id} exists={memory is not None} "
+            f"passage={bool(memory and memory.current_passage)} "
+            f"questions={len(memory.current_questions or []) if memory else 0} question_id={question_id}"
+        )
             
         return {
             "passage_text": "The project, which has been ongoing since 2018, aims to map the ocean floor in unprecedented detail. This initiative was first proposed at a conference in late 2017.",
@@ -1516,19 +936,21 @@ The student is currently working on THIS specific practice passage:
         
         # Select the appropriate prompt based on question_type
         # Default to "mixed" if type is unknown or not provided
-        selected_prompt = self.micro_battle_prompts.get(question_type, self.micro_battle_prompts["mixed"])
+        prompt_name = MICRO_BATTLE_PROMPTS.get(question_type, MICRO_BATTLE_PROMPTS["mixed"])
         
         micro_battle_chain = (
-            ChatPromptTemplate.from_template(selected_prompt)
+            self.prompts.template(prompt_name)
             | self.quality_llm
             | JsonOutputParser(pydantic_object=MicroBattle)
         )
         
-        result = await micro_battle_chain.ainvoke({
-            "level": level,
-            "topic": topic or "",
-            "chat_history": chat_history
-        })
+        with tracer.span("micro_battle", chain="micro_battle", level=level, question_type=question_type,
+                         prompt_version=self.prompts.version(prompt_name)):
+            result = await micro_battle_chain.ainvoke({
+                "level": level,
+                "topic": topic or "",
+                "chat_history": chat_history
+            })
         
         # Convert dict to MicroBattle if needed
         battle = result
@@ -1545,50 +967,102 @@ The student is currently working on THIS specific practice passage:
         memory.current_topic = battle.topic
         # Store questions as dicts
         memory.current_questions = [q.dict() for q in battle.questions]
+        # Explanations for the previous battle's answers are no longer needed
+        explanation_prefetcher.cancel(memory)
         
-        logger.info(f"[STORAGE] Stored session {session_id} with {len(memory.current_questions)} questions")
-        logger.info(f"[STORAGE] Active sessions after storing: {list(self.active_sessions.keys())}")
+        logger.info(f"[STORAGE] Stored session {session_id} with {len(memory.current_questions)} questions "
+                    f"({len(self.active_sessions)} active sessions)")
         
         return battle
 
     async def generate_deeper_feedback(self, context: Dict[str, Any]) -> DeeperFeedbackResponse:
         """Generate deeper feedback for incorrect answers."""
         
-        # LOG THE ACTUAL PASSAGE BEING USED
-        logger.warning(f"[FEEDBACK_GEN] ==========================================")
-        logger.warning(f"[FEEDBACK_GEN] Passage (first 200 chars): {context.get('passage_text', '')[:200]}")
-        logger.warning(f"[FEEDBACK_GEN] Question: {context.get('question_statement', '')}")
-        logger.warning(f"[FEEDBACK_GEN] Student answer: {context.get('student_answer', '')}")
-        logger.warning(f"[FEEDBACK_GEN] Correct answer: {context.get('correct_answer', '')}")
-        logger.warning(f"[FEEDBACK_GEN] ==========================================")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[FEEDBACK_GEN] Question: {context.get('question_statement', '')[:120]} | "
+                         f"student: {context.get('student_answer', '')} | correct: {context.get('correct_answer', '')}")
         
+        # Theory for this error: the sections of the question's type that best match the
+        # statement and the answer mix-up (e.g. FALSE vs NOT GIVEN)
+        question_type = question_type_id(context.get('question_type')) or 'true-false-not-given'
+        theory_hits = theory_index.search(
+            f"{context.get('question_statement', '')} Student answered {context.get('student_answer', '')}, "
+            f"correct answer {context.get('correct_answer', '')}. {context.get('student_reasoning', '')}",
+            only=[question_type])
+        if theory_hits:
+            context['theory_context'] = format_hits(theory_hits)
+        else:
+            # Nothing specific matched: the type's prebuilt compact theory
+            context['theory_context'] = compact_theory(question_type, FEEDBACK_THEORY_TOKENS) or ""
+        
+        # Students submitting the same passage at once share one upstream call
+        return await get_single_flight("deeper_feedback").do(
+            make_key({**context, "prompt_version": self.prompts.version("deeper_feedback")}),
+            lambda: self._generate_deeper_feedback(context)
+        )
+
+    async def _generate_deeper_feedback(self, context: Dict[str, Any]) -> DeeperFeedbackResponse:
+        """Run the deeper feedback chain (one upstream call per coalesced group)."""
         deeper_feedback_chain = (
-            ChatPromptTemplate.from_template(self.deeper_feedback_prompt_template)
+            self.prompts.template("deeper_feedback")
             | self.quality_llm
             | JsonOutputParser(pydantic_object=DeeperFeedbackResponse)
         )
-        
-        # Choose theory based on question type from context
-        question_type = context.get('question_type', 'true-false-not-given').lower()
-        
-        if 'matching' in question_type or 'heading' in question_type:
-            # Use Matching Headings theory
-            if not hasattr(self, 'matching_headings_theory_compact'):
-                current_file = Path(__file__).resolve()
-                prompts_dir = current_file.parent.parent / "prompts"
-                self.matching_headings_theory_compact = (prompts_dir / "matching_headings_theory_compact.txt").read_text()
-            context['theory_context'] = self.matching_headings_theory_compact
-        else:
-            # Default to T/F/NG theory
-            if not hasattr(self, 'tfng_theory_compact'):
-                current_file = Path(__file__).resolve()
-                prompts_dir = current_file.parent.parent / "prompts"
-                self.tfng_theory_compact = (prompts_dir / "tfng_theory_compact.txt").read_text()
-            context['theory_context'] = self.tfng_theory_compact
-        
-        result = await deeper_feedback_chain.ainvoke(context)
+        with tracer.span("deeper_feedback", chain="deeper_feedback",
+                         prompt_version=self.prompts.version("deeper_feedback")):
+            result = await deeper_feedback_chain.ainvoke(context)
         
         # Convert dict to DeeperFeedbackResponse if needed
         if isinstance(result, dict):
-            return DeeperFeedbackResponse(**result)
+            result = DeeperFeedbackResponse(**result)
+
+        # Make sure the evidence quote really comes from the passage
+        result.evidence_quote = await self.ground_evidence_quote(result.evidence_quote, context)
         return result
+
+    async def ground_evidence_quote(self, quote: str, context: Dict[str, Any]) -> str:
+        """Snap the quote to the passage text; re-ask the model only if nothing matches."""
+        passage = context.get("passage_text", "")
+        check = grounding_verifier.verify(quote, passage)
+        if check.grounded:
+            if check.outcome == "snapped":
+                logger.info(f"[GROUNDING] Snapped evidence quote ({check.distance} word edits)")
+            return check.quote
+
+        logger.warning(f"[GROUNDING] Evidence quote not found in passage, re-asking: {quote[:120]}")
+        reask_chain = (
+            self.prompts.template("evidence_reask")
+            | self.fast_llm
+            | StrOutputParser()
+        )
+        try:
+            with tracer.span("evidence_reask", chain="evidence_reask"):
+                retry_quote = await reask_chain.ainvoke({
+                    "passage_text": passage,
+                    "question_statement": context.get("question_statement", ""),
+                    "correct_answer": context.get("correct_answer", ""),
+                    "invalid_quote": quote
+                })
+        except Exception as e:
+            logger.error(f"[GROUNDING] Re-ask failed: {e}")
+            retry_quote = ""
+
+        retry_check = grounding_verifier.verify(retry_quote.strip(), passage)
+        if retry_quote.strip().upper() != "NONE" and retry_check.grounded and retry_check.outcome != "skipped":
+            grounding_verifier.record("reask_recovered")
+            return retry_check.quote
+
+        # Never show invented text as evidence
+        grounding_verifier.record("reask_failed")
+        return "No exact quote available - check the passage for the sentence about this statement."
+
+    @staticmethod
+    def fallback_hint(question_statement: str) -> str:
+        """Deterministic hint used when the hint chain misses its deadline."""
+        statement = (question_statement or "").strip()
+        if not statement:
+            return ("💡 Hint: pick two or three key words from the question, scan the passage for them "
+                    "(or their synonyms), then read that sentence and the one after it carefully.")
+        return (f"💡 Hint: underline the key words in *\"{statement}\"*. Scan the passage for them or their "
+                "synonyms, then read that sentence closely - check whether it agrees, contradicts, "
+                "or says nothing about the statement.")
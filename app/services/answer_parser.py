@@ -1,5 +1,83 @@
 import re
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+
+# One tokenizer pass over the message. Alternatives are tried in order at each position:
+#   lpair     "A-2"        matching-headings style: item letter -> paragraph/heading number
+#   decimal   "6.5"        never a question number
+#   qmark     "Q1", "1.", "1)", "1-", "question 3:"   (separator optional)
+#   notgiven  "not given"
+#   word      any word
+#   brk       list separators that end a short answer
+_TOKEN_RE = re.compile(r"""
+    (?P<lpair>\b(?P<lp_letter>[A-Za-z])\s*[-:]\s*(?P<lp_num>\d{1,2})\b)
+  | (?P<decimal>\b\d+[.,]\d+\b)
+  | (?P<qmark>(?:(?P<qprefix>\b(?:question|q)\s*)|\b)(?P<qnum>\d+)\b(?P<qsep>\s*(?:[-:=)]|\.(?!\d)))?)
+  | (?P<notgiven>\bnot[\s_-]+given\b)
+  | (?P<word>\b[A-Za-z]+(?:['’][A-Za-z]+)*\b)
+  | (?P<brk>[,;/&\n])
+""", re.IGNORECASE | re.VERBOSE)
+
+_ROMAN_RE = re.compile(r"x{0,3}(?:ix|iv|v?i{0,3})", re.IGNORECASE)
+_MULTI_LETTER_RE = re.compile(r"[A-J]{2,4}")
+
+_LEAD_IN_RE = re.compile(r"\banswers?\b[^:\n]{0,20}:", re.IGNORECASE)     # "my answers are:"
+
+_LEGACY_SEQUENTIAL = {"A", "B", "C", "TRUE", "FALSE", "NOT GIVEN"}
+_LINK_WORDS = {"is", "was"}     # "Q1 is TRUE"
+MAX_SHORT_ANSWER_WORDS = 4      # IELTS limit is "three words and/or a number"
+MAX_QUESTION_NUMBER = 200       # larger numbers are answers (years, amounts), never question ids
+LEGACY_SEQUENTIAL_LIMIT = 5     # free-text messages: cap on loose A/B/C answers
+
+
+def _classify(token: str) -> Optional[str]:
+    """
+    Normalise a closed-vocabulary answer token, or return None for free text.
+
+    TRUE/FALSE/YES/NO/NOT GIVEN (NG) -> upper case
+    roman numerals (headings)        -> lower case, e.g. "iv"
+    single letters                   -> upper case ("i", "v", "x" read as numerals)
+    2-4 capital letters A-J ("BD")   -> sorted letters for "choose TWO/THREE" answers
+    """
+    upper = token.upper()
+    if upper in ("TRUE", "FALSE", "YES", "NO"):
+        return upper
+    if upper == "NG":
+        return "NOT GIVEN"
+    if len(token) == 1:
+        return token if token in "ivx" else upper
+    if _ROMAN_RE.fullmatch(token) and (token.islower() or token.isupper()):
+        return token.lower()
+    if token.isupper() and _MULTI_LETTER_RE.fullmatch(token):
+        return "".join(sorted(set(token)))
+    return None
+
+
+def _is_letter_answer(value: Optional[str]) -> bool:
+    return value is not None and value.isalpha() and value.isupper() and len(value) <= 4 \
+        and value not in ("TRUE", "FALSE", "YES", "NO")
+
+
+class _Pair:
+    """A question number and the answer tokens collected after it."""
+    __slots__ = ("number", "has_sep", "has_prefix", "linked", "closed", "words", "finished")
+
+    def __init__(self, number: int, has_sep: bool, has_prefix: bool):
+        self.number = number
+        self.has_sep = has_sep          # "1.", "1-", "1)", "Q1:"
+        self.has_prefix = has_prefix    # "Q1"
+        self.linked = False             # "Q1 is ..."
+        self.closed: Optional[str] = None
+        self.words: List[str] = []
+        self.finished = False
+
+    @property
+    def empty(self) -> bool:
+        return self.closed is None and not self.words
+
+    @property
+    def answer(self) -> str:
+        return self.closed if self.closed is not None else " ".join(self.words).upper()
+
 
 def parse_student_answers(message: str) -> Dict[int, str]:
     """
@@ -9,8 +87,16 @@ def parse_student_answers(message: str) -> Dict[int, str]:
     - "1-A, 2-B, 3-C"
     - "Q1: A, Q2: B, Q3: C"
     - "1. A 2. B 3. C"
-    - "my answers: A, B, C" (assumes sequential order)
+    - "my answers: A, B, C" (assumes sequential order; a lone unnumbered answer
+      such as "no" or "NG" is a chat reply unless it follows "answer(s):")
+    - "Q1 is TRUE"
     - "1-TRUE, 2-FALSE, 3-NOT GIVEN"
+    - "A-2, B-1, C-4" (letter items mapped to numbers, e.g. Matching Headings)
+    - full answer sheets: "1 TRUE 2 C 3 iv 4 BD 5 solar panels ... 40 NG"
+      (roman numerals, multi-letter answers and short-answer words)
+    
+    The message is tokenized once and run through a small state machine, so a
+    40-question submission costs the same single pass as a three-answer one.
     
     Args:
         message: User's message text
@@ -18,49 +104,105 @@ def parse_student_answers(message: str) -> Dict[int, str]:
     Returns:
         Dict mapping question_id to answer (e.g., {1: "A", 2: "B", 3: "C"})
     """
-    answers = {}
-
-    # Pattern 0: Letter-number mappings like "A-2, B-1, C-4"
-    # Common in Matching Headings where items are A/B/C/D and answers are 1..n
-    pattern0 = r'\b([A-Za-z])\s*[-:]\s*(\d{1,2})\b'
-    pairs0 = list(re.finditer(pattern0, message))
-    if pairs0:
-        for m in pairs0:
-            letter = m.group(1).upper()
-            q_num = ord(letter) - ord('A') + 1  # A->1, B->2, ...
-            answers[q_num] = m.group(2)  # keep numeric answer as string (e.g., "2")
+    letter_pairs: Dict[int, str] = {}
+    pairs: List[_Pair] = []
+    loose: List[Optional[str]] = []     # closed answers (or None) for words outside numbered answers
+    loose_start: List[int] = []
+    loose_legacy: List[bool] = []       # the word is one the old sequential pattern accepted
+    current: Optional[_Pair] = None
+
+    for m in _TOKEN_RE.finditer(message):
+        kind = m.lastgroup
+
+        if kind == "lpair":
+            q_num = ord(m.group("lp_letter").upper()) - ord('A') + 1  # A->1, B->2, ...
+            letter_pairs[q_num] = m.group("lp_num")  # keep numeric answer as string (e.g., "2")
+
+        elif kind == "qmark":
+            prefix = (m.group("qprefix") or "").strip().lower()
+            number = int(m.group("qnum"))
+            if current is not None and not prefix and (current.empty or number > MAX_QUESTION_NUMBER):
+                # A number straight after a question number is its answer ("14: 1987"),
+                # and so is any number too large to be a question ("5 about 3000")
+                if current.closed is None and not current.finished:
+                    current.words.append(m.group("qnum"))
+                continue
+            if number > MAX_QUESTION_NUMBER:
+                continue
+            current = _Pair(
+                number,
+                has_sep=bool((m.group("qsep") or "").strip()),
+                has_prefix=prefix == "q",   # "question 2 is hard" is not an answer
+            )
+            pairs.append(current)
+
+        elif kind == "brk":
+            if current is not None and not current.empty:
+                current.finished = True
+
+        elif kind == "decimal":
+            if current is not None and current.closed is None and not current.finished:
+                current.words.append(m.group())
+
+        else:  # word / notgiven
+            token = m.group()
+            value = "NOT GIVEN" if kind == "notgiven" else _classify(token)
+            if current is None:
+                loose.append(value)
+                loose_start.append(m.start())
+                loose_legacy.append(kind == "notgiven" or token.upper() in _LEGACY_SEQUENTIAL)
+            elif current.empty and not current.linked and token.lower() in _LINK_WORDS:
+                current.linked = True
+            elif current.empty:
+                if value is not None:
+                    current.closed = value
+                current.words.append(token)
+            elif current.closed == "A" and current.words == ["a"] and value is None and not current.finished:
+                # "5. a new bridge": the article, not option A
+                current.closed = None
+                current.words.append(token)
+            elif _is_letter_answer(current.closed) and _is_letter_answer(value):
+                # "Q4: B, D" / "4 B and D" -> "BD"
+                current.closed = "".join(sorted(set(current.closed + value)))
+            elif current.closed is None and not current.finished:
+                current.words.append(token)
+            # Anything after a closed answer ("1. TRUE because ...") is commentary
 
     # If we parsed any A-1 style pairs, return early to avoid conflicting patterns
+    if letter_pairs:
+        return letter_pairs
+
+    answered = [p for p in pairs if not p.empty and p.number > 0]
+    increasing = all(a.number < b.number for a, b in zip(answered, answered[1:]))
+    answer_sheet = len(answered) >= 3 and increasing
+
+    answers: Dict[int, str] = {}
+    for pair in answered:
+        if pair.closed is not None:
+            # "1. A" / "Q1 A" / "1 is A" on their own, bare "1 A" only alongside other answers
+            keep = pair.has_sep or pair.has_prefix or pair.linked or len(answered) >= 2
+        else:
+            # Free text needs "5: solar panels" or a pasted answer sheet
+            keep = (pair.has_sep or answer_sheet) and len(pair.words) <= MAX_SHORT_ANSWER_WORDS
+        if keep:
+            answers[pair.number] = pair.answer
     if answers:
         return answers
-    
-    # Pattern 1: "1-A, 2-B, 3-C" or "Q1-A, Q2-B" or "1-TRUE, 2-FALSE"
-    pattern1 = r'(?:Q|q)?(\d+)\s*[-:]\s*([A-Ca-c]|TRUE|FALSE|NOT GIVEN|True|False|Not Given|true|false|not given)'
-    matches = re.finditer(pattern1, message)
-    for match in matches:
-        q_num = int(match.group(1))
-        answer = match.group(2).upper()
-        answers[q_num] = answer
-    
-    # Pattern 2: "1. A, 2. B" or "Q1. A, Q2. B"
-    if not answers:
-        pattern2 = r'(?:Q|q)?(\d+)\.\s*([A-Ca-c]|TRUE|FALSE|NOT GIVEN|True|False|Not Given|true|false|not given)'
-        matches = re.finditer(pattern2, message)
-        for match in matches:
-            q_num = int(match.group(1))
-            answer = match.group(2).upper()
-            answers[q_num] = answer
-    
-    # Pattern 3: Sequential answers "A, B, C" or "my answers are A, B, C"
-    # Only use this if we didn't find explicit question numbers
-    if not answers:
-        # Look for sequences like "A, B, C" or "TRUE, FALSE, NOT GIVEN"
-        pattern3 = r'\b([A-Ca-c]|TRUE|FALSE|NOT GIVEN|True|False|Not Given|true|false|not given)\b'
-        matches = re.findall(pattern3, message)
-        if matches and len(matches) <= 5:  # Reasonable limit to avoid false positives
-            for idx, answer in enumerate(matches, start=1):
-                answers[idx] = answer.upper()
-    
+
+    # Sequential answers "A, B, C" or "my answers are: A, B, C, D, ..."
+    # Only use this if we didn't find explicit question numbers.
+    colon = message.rfind(":")
+    candidates = [v for v, start in zip(loose, loose_start) if start > colon]
+    if candidates and all(v is not None for v in candidates) \
+            and (len(candidates) >= 2 or _LEAD_IN_RE.search(message)):
+        # Nothing but answers (after any "my answers:" lead-in): accept them all.
+        # A lone "no" / "NG" / "I" is a chat reply, not an answer sheet.
+        return {idx: v for idx, v in enumerate(candidates, start=1)}
+
+    legacy = [v for v, old in zip(loose, loose_legacy) if old]
+    if legacy and len(legacy) <= LEGACY_SEQUENTIAL_LIMIT:  # Reasonable limit to avoid false positives
+        return {idx: v for idx, v in enumerate(legacy, start=1)}
+
     return answers
 
 
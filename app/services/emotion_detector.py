@@ -1,10 +1,16 @@
 # app/services/emotion_detector.py
 
 from enum import Enum
-from typing import Tuple
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
 import re
 import random
 
+try:  # Python 3.11+
+    from re import _constants as _sre_constants, _parser as _sre_parser
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_constants as _sre_constants
+    import sre_parse as _sre_parser
+
 class UserEmotion(Enum):
     FRUSTRATED = "frustrated"
     CONFUSED = "confused"
@@ -78,6 +84,20 @@ class EmotionDetector:
         "low": [r"a (bit|little) ", r"kind of ", r"somewhat ", r"maybe "],
     }
 
+    def __init__(self):
+        # Compile every pattern once and index them by the literal text any match must
+        # contain, so each message only runs the handful of patterns that can match.
+        self._emotion_scanner = _PatternScanner(
+            (emotion, pattern)
+            for emotion, patterns in self.EMOTION_PATTERNS.items()
+            for pattern in patterns
+        )
+        self._intensity_scanner = _PatternScanner(
+            (level, marker)
+            for level, markers in self.EMOTION_INTENSITY_MARKERS.items()
+            for marker in markers
+        )
+
     def detect(self, message: str) -> Tuple[UserEmotion, float]:
         """
         Detect emotion and intensity (0.0 to 1.0).
@@ -85,11 +105,10 @@ class EmotionDetector:
         """
         message_lower = message.lower()
         
-        emotion_scores = {}
-        for emotion, patterns in self.EMOTION_PATTERNS.items():
-            score = sum(1 for p in patterns if re.search(p, message_lower, re.IGNORECASE))
-            if score > 0:
-                emotion_scores[emotion] = score
+        # Scores count distinct matching patterns per emotion (insertion order = tie-break order)
+        emotion_scores: Dict[UserEmotion, int] = {}
+        for emotion in self._emotion_scanner.matched_labels(message_lower):
+            emotion_scores[emotion] = emotion_scores.get(emotion, 0) + 1
         
         if not emotion_scores:
             return UserEmotion.NEUTRAL, 0.5
@@ -99,21 +118,103 @@ class EmotionDetector:
         
         # Calculate intensity
         intensity = 0.5
-        for marker in self.EMOTION_INTENSITY_MARKERS["high"]:
-            if re.search(marker, message_lower):
+        for level in self._intensity_scanner.matched_labels(message_lower):
+            if level == "high":
                 intensity = min(1.0, intensity + 0.2)
-        for marker in self.EMOTION_INTENSITY_MARKERS["low"]:
-            if re.search(marker, message_lower):
+            else:
                 intensity = max(0.1, intensity - 0.15)
         
         # Exclamation marks and caps increase intensity
         if message.count("!") > 2:
             intensity = min(1.0, intensity + 0.1)
-        if sum(1 for c in message if c.isupper()) / max(len(message), 1) > 0.5:
+        if sum(map(str.isupper, message)) / max(len(message), 1) > 0.5:
             intensity = min(1.0, intensity + 0.15)
             
         return dominant_emotion, round(intensity, 2)
 
+    def detect_many(self, messages: Iterable[str]) -> List[Tuple[UserEmotion, float]]:
+        """Detect emotion for a batch of messages (e.g. stored transcripts for analytics)."""
+        detect = self.detect
+        return [detect(m) for m in messages]
+
+
+class _PatternScanner:
+    """
+    Literal-prefiltered matcher over many regex patterns.
+
+    Each pattern is compiled once and mapped to the literal strings that any match
+    must contain (e.g. r"(tired|exhausted)" -> {"tired", "exhausted"}). A message is
+    checked against the deduplicated literal set in one pass, and only patterns whose
+    literals are present are run. `matched_labels` returns exactly what a plain
+    `re.search` per pattern would report, in pattern order.
+    """
+
+    def __init__(self, labelled_patterns: Iterable[Tuple[object, str]]):
+        self.labels: List[object] = []
+        self.patterns: List[Pattern] = []
+        self.always: List[int] = []                 # patterns without a required literal
+        self.by_literal: Dict[str, List[int]] = {}  # literal -> pattern indices
+        for idx, (label, pattern) in enumerate(labelled_patterns):
+            self.labels.append(label)
+            self.patterns.append(re.compile(pattern, re.IGNORECASE))
+            literals = _required_literals(_sre_parser.parse(pattern))
+            if not literals:
+                self.always.append(idx)
+                continue
+            for literal in literals:
+                self.by_literal.setdefault(literal.lower(), []).append(idx)
+        self.literals = list(self.by_literal.items())
+
+    def matched_indices(self, text: str) -> Set[int]:
+        """Indices of patterns matching `text` (expects lower-cased text)."""
+        candidates = set(self.always)
+        for literal, indices in self.literals:
+            if literal in text:
+                candidates.update(indices)
+        patterns = self.patterns
+        return {idx for idx in candidates if patterns[idx].search(text)}
+
+    def matched_labels(self, text: str) -> List[object]:
+        return [self.labels[idx] for idx in sorted(self.matched_indices(text))]
+
+
+def _required_literals(items) -> Optional[Set[str]]:
+    """
+    Literal strings of which at least one must appear in any match of a parsed
+    pattern, or None if no such set can be derived (the pattern then always runs).
+    Picks the most selective candidate: the set whose shortest literal is longest.
+    """
+    candidates: List[Set[str]] = []
+    run: List[str] = []
+    for op, arg in items:
+        if op is _sre_constants.LITERAL:
+            run.append(chr(arg))
+            continue
+        if run:
+            candidates.append({"".join(run)})
+            run = []
+        if op is _sre_constants.SUBPATTERN:
+            sub = _required_literals(arg[-1])
+        elif op is _sre_constants.BRANCH:
+            sub = set()
+            for branch in arg[1]:
+                branch_literals = _required_literals(branch)
+                if not branch_literals:
+                    sub = None
+                    break
+                sub |= branch_literals
+        elif op in (_sre_constants.MAX_REPEAT, _sre_constants.MIN_REPEAT) and arg[0] >= 1:
+            sub = _required_literals(arg[2])
+        else:
+            sub = None
+        if sub:
+            candidates.append(sub)
+    if run:
+        candidates.append({"".join(run)})
+    if not candidates:
+        return None
+    return max(candidates, key=lambda lits: min(len(lit) for lit in lits))
+
 
 class EmotionalResponseGenerator:
     """Generate emotionally appropriate responses."""
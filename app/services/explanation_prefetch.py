@@ -0,0 +1,141 @@
+# app/services/explanation_prefetch.py
+
+"""
+Speculative "skip" explanations for the Socratic review of wrong answers.
+
+After grading, PROVIDE_FEEDBACK asks the student why they chose each wrong answer,
+one question at a time; the explanation (generate_deeper_feedback, the slowest chain)
+used to start only when the student replied or said skip. ExplanationPrefetcher.start()
+computes the explanation of every pending wrong answer in the background as soon as
+the answers are graded, and each result is stored on the session
+(ConversationMemory.precomputed_explanations), so the skip reply is instant. The
+Socratic follow-up still needs the student's reasoning, but when the explanation is
+ready (peek()) its verified evidence quote goes into the follow-up prompt, and the
+follow-up falls back on the explanation if its own call fails.
+
+The background calls run outside the turn that started them: no turn deadline, not
+cancelled when that request's client disconnects, BACKGROUND priority in the rate
+limiter (interactive turns go first). They are cancelled when the session moves on -
+new answers are graded or a new battle is generated - and a question's call is
+dropped once its review is over.
+
+    SKIP_EXPLANATION_PREFETCH   set to false to explain only on demand (default true)
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.metrics import registry
+from app.core.rate_limiter import BACKGROUND, llm_priority
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+SKIP_EXPLANATION_PREFETCH = os.getenv("SKIP_EXPLANATION_PREFETCH", "true").strip().lower() != "false"
+
+SKIP_EXPLANATIONS = registry.counter(
+    "skip_explanations_total",
+    "Socratic skip explanations: prefetched, served ready, waited for, computed on demand, cancelled, failed.",
+    ["outcome"])
+
+Generate = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class ExplanationPrefetcher:
+    def __init__(self, enabled: bool = SKIP_EXPLANATION_PREFETCH):
+        self.enabled = enabled
+        # session_id -> {question_id: task}
+        self._tasks: Dict[str, Dict[int, "asyncio.Task"]] = {}
+        self.counters: Counter = Counter()
+
+    def start(self, memory: Any, contexts: Dict[int, Dict[str, Any]], generate: Generate) -> None:
+        """Explain every question in `contexts` in the background (replaces the session's earlier ones)."""
+        self.cancel(memory)
+        if not self.enabled or not contexts:
+            return
+        tasks = self._tasks[memory.session_id] = {}
+        for q_id, context in contexts.items():
+            # An empty context: the task does not inherit the turn's deadline, span or request
+            tasks[q_id] = contextvars.Context().run(
+                asyncio.ensure_future, self._explain(memory, q_id, context, generate))
+            tasks[q_id].add_done_callback(lambda task, sid=memory.session_id, q_id=q_id: self._finished(sid, q_id, task))
+        self._count("prefetched", len(tasks))
+        logger.info(f"[PREFETCH] Explaining {len(tasks)} wrong answer(s) for session {memory.session_id} in the background")
+
+    async def _explain(self, memory: Any, q_id: int, context: Dict[str, Any], generate: Generate) -> Any:
+        with llm_priority(BACKGROUND), tracer.span(
+            "skip_prefetch", session_id=memory.session_id, student_id=memory.student_id, question_id=q_id
+        ):
+            result = await generate(context)
+        memory.precomputed_explanations[q_id] = result
+        return result
+
+    def _finished(self, session_id: str, q_id: int, task: "asyncio.Task") -> None:
+        tasks = self._tasks.get(session_id)
+        if tasks is not None and tasks.get(q_id) is task:
+            del tasks[q_id]
+            if not tasks:
+                del self._tasks[session_id]
+        if not task.cancelled() and task.exception() is not None:
+            self._count("failed")
+            logger.warning(f"[PREFETCH] Explanation of Q{q_id} for session {session_id} failed: {task.exception()}")
+
+    async def get(self, memory: Any, q_id: int, context: Dict[str, Any], generate: Generate) -> Any:
+        """The question's explanation: ready, still running (awaited), or computed now."""
+        ready = memory.precomputed_explanations.pop(q_id, None)
+        if ready is not None:
+            self._count("ready")
+            return ready
+        task = self._tasks.get(memory.session_id, {}).get(q_id)
+        if task is not None:
+            self._count("waited")
+            try:
+                # Shielded: a cancelled turn must not cancel the shared background call
+                result = await asyncio.shield(task)
+                memory.precomputed_explanations.pop(q_id, None)
+                return result
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+            except Exception:
+                pass
+        self._count("on_demand")
+        return await generate(context)
+
+    def peek(self, memory: Any, q_id: int) -> Optional[Any]:
+        """The explanation if it is ready, without waiting."""
+        return memory.precomputed_explanations.get(q_id)
+
+    def discard(self, memory: Any, q_id: int) -> None:
+        """The question's review is over: drop its explanation, cancel it if still running."""
+        memory.precomputed_explanations.pop(q_id, None)
+        task = self._tasks.get(memory.session_id, {}).get(q_id)
+        if task is not None and not task.done():
+            task.cancel()
+            self._count("cancelled")
+
+    def cancel(self, memory: Any) -> None:
+        """The session moved on: cancel its outstanding explanations and forget the ready ones."""
+        memory.precomputed_explanations.clear()
+        tasks = self._tasks.pop(memory.session_id, {})
+        running = [task for task in tasks.values() if not task.done()]
+        for task in running:
+            task.cancel()
+        if running:
+            self._count("cancelled", len(running))
+            logger.info(f"[PREFETCH] Cancelled {len(running)} explanation(s) for session {memory.session_id}")
+
+    def _count(self, outcome: str, amount: int = 1) -> None:
+        self.counters[outcome] += amount
+        SKIP_EXPLANATIONS.inc(amount, outcome=outcome)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "running": sum(len(t) for t in self._tasks.values())}
+
+
+# Singleton instance
+explanation_prefetcher = ExplanationPrefetcher()
@@ -0,0 +1,253 @@
+# app/services/grounding.py
+
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.core.metrics import registry
+
+# Word tokens; apostrophes stay inside words so "don't" is one token
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+(?:['’][A-Za-z0-9]+)*")
+# Quotes are often glued together with ellipses: "...began in 2018 ... proposed in 2017"
+_ELLIPSIS_RE = re.compile(r"\s*(?:\.\.\.|…)\s*")
+_HIGHLIGHT_RE = re.compile(r"`([^`]+)`")
+
+# Outcomes counted by the verifier
+EXACT = "exact"
+SNAPPED = "snapped"
+MISSING = "missing"
+SKIPPED = "skipped"
+
+EVIDENCE_GROUNDING = registry.counter(
+    "evidence_grounding_total",
+    "Evidence quote checks: exact, snapped, missing, skipped, reask_recovered, reask_failed.",
+    ["outcome"])
+
+# Placeholder quotes the prompts allow (e.g. ERROR_FEEDBACK_TEMPLATE uses "N/A")
+_PLACEHOLDER_QUOTES = {"", "n/a", "na", "none", "not applicable", "-"}
+
+
+@dataclass
+class GroundingResult:
+    """Outcome of checking one quote against a passage."""
+    outcome: str              # exact | snapped | missing | skipped
+    quote: str                # text to show the student (snapped to the passage when possible)
+    distance: int = 0         # token edits between the quote and the passage span
+    span: Optional[Tuple[int, int]] = None  # char offsets of the span in the passage
+
+    @property
+    def grounded(self) -> bool:
+        return self.outcome in (EXACT, SNAPPED, SKIPPED)
+
+
+class _PassageIndex:
+    """Token list with char offsets plus a bigram -> positions index."""
+
+    __slots__ = ("text", "tokens", "offsets", "bigrams", "unigrams")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens: List[str] = []
+        self.offsets: List[Tuple[int, int]] = []
+        for m in _TOKEN_RE.finditer(text):
+            self.tokens.append(m.group().lower().replace("’", "'"))
+            self.offsets.append(m.span())
+
+        self.unigrams: Dict[str, List[int]] = {}
+        self.bigrams: Dict[Tuple[str, str], List[int]] = {}
+        for i, tok in enumerate(self.tokens):
+            self.unigrams.setdefault(tok, []).append(i)
+            if i + 1 < len(self.tokens):
+                self.bigrams.setdefault((tok, self.tokens[i + 1]), []).append(i)
+
+
+class GroundingVerifier:
+    """
+    Check LLM-quoted evidence against the passage it claims to quote.
+
+    Quotes are compared at word level: case, punctuation and markdown are ignored.
+    Candidate positions come from a bigram index (votes per alignment diagonal); a
+    verbatim quote is confirmed on its diagonal in linear time, otherwise a banded edit
+    distance (O(words * allowed edits)) is computed around the best diagonals only. On an
+    800-word passage a 55-word verbatim quote takes ~0.1 ms, a 25-word near miss ~0.5 ms
+    and a 55-word near miss ~1.5 ms.
+
+    - exact:   every word of the quote appears in order in the passage
+    - snapped: near miss (a few words changed/missing) - replaced with the passage text
+    - missing: no acceptable match - caller should re-ask the model
+    """
+
+    def __init__(self, max_edit_ratio: float = 0.35, max_candidates: int = 3, cache_size: int = 64):
+        self.max_edit_ratio = max_edit_ratio
+        self.max_candidates = max_candidates
+        self.cache_size = cache_size
+        self._indexes: Dict[str, _PassageIndex] = {}
+        self.outcomes: Counter = Counter()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def verify(self, quote: Optional[str], passage: Optional[str]) -> GroundingResult:
+        """Verify a quote and record the outcome."""
+        result = self._verify(quote or "", passage or "")
+        self.record(result.outcome)
+        return result
+
+    def record(self, outcome: str) -> None:
+        """Record an outcome decided by the caller (e.g. 'reask_recovered')."""
+        self.outcomes[outcome] += 1
+        EVIDENCE_GROUNDING.inc(1, outcome=outcome)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.outcomes)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _index(self, passage: str) -> _PassageIndex:
+        index = self._indexes.get(passage)
+        if index is None:
+            if len(self._indexes) >= self.cache_size:
+                # Drop the oldest passage (dicts keep insertion order)
+                self._indexes.pop(next(iter(self._indexes)))
+            index = _PassageIndex(passage)
+            self._indexes[passage] = index
+        return index
+
+    def _verify(self, quote: str, passage: str) -> GroundingResult:
+        cleaned = quote.replace("`", "").replace("**", "").strip().strip("\"'“”‘’ >")
+        if cleaned.lower() in _PLACEHOLDER_QUOTES or not passage.strip():
+            return GroundingResult(outcome=SKIPPED, quote=quote)
+
+        index = self._index(passage)
+        fragments = [f for f in _ELLIPSIS_RE.split(cleaned) if _TOKEN_RE.search(f)]
+        if not fragments:
+            return GroundingResult(outcome=SKIPPED, quote=quote)
+
+        pieces: List[str] = []
+        total_distance = 0
+        first_start: Optional[int] = None
+        last_end = 0
+        for fragment in fragments:
+            match = self._match_fragment(fragment, index)
+            if match is None:
+                return GroundingResult(outcome=MISSING, quote=quote)
+            distance, start, end = match
+            total_distance += distance
+            first_start = start if first_start is None else first_start
+            last_end = end
+            pieces.append(passage[start:end])
+
+        snapped = " ... ".join(pieces)
+        snapped = _reapply_highlights(quote, snapped)
+        outcome = EXACT if total_distance == 0 else SNAPPED
+        return GroundingResult(
+            outcome=outcome,
+            quote=quote if outcome == EXACT else snapped,
+            distance=total_distance,
+            span=(first_start, last_end),
+        )
+
+    def _match_fragment(self, fragment: str, index: _PassageIndex) -> Optional[Tuple[int, int, int]]:
+        """Return (distance, char_start, char_end) of the best passage span, or None."""
+        query = [m.group().lower().replace("’", "'") for m in _TOKEN_RE.finditer(fragment)]
+        m = len(query)
+        if m == 0 or not index.tokens:
+            return None
+        max_edits = int(m * self.max_edit_ratio)
+
+        # Vote for alignment diagonals (passage_pos - query_pos) using bigrams,
+        # falling back to unigrams for one-word quotes or heavily paraphrased ones.
+        votes: Counter = Counter()
+        for qi in range(m - 1):
+            for pi in index.bigrams.get((query[qi], query[qi + 1]), ()):
+                votes[pi - qi] += 1
+        if not votes:
+            for qi, tok in enumerate(query):
+                for pi in index.unigrams.get(tok, ()):
+                    votes[pi - qi] += 1
+        if not votes:
+            return None
+
+        candidates = votes.most_common(self.max_candidates)
+        diagonal = candidates[0][0]
+        if 0 <= diagonal and index.tokens[diagonal:diagonal + m] == query:
+            return 0, index.offsets[diagonal][0], index.offsets[diagonal + m - 1][1]
+
+        best: Optional[Tuple[int, int, int]] = None
+        for diagonal, _ in candidates:
+            found = _banded_alignment(query, index.tokens, diagonal, max_edits)
+            if found is not None and (best is None or found[0] < best[0]):
+                best = found
+                if best[0] == 0:
+                    break
+        if best is None:
+            return None
+        distance, tok_start, tok_end = best
+        return distance, index.offsets[tok_start][0], index.offsets[tok_end - 1][1]
+
+
+def _banded_alignment(query: List[str], tokens: List[str], diagonal: int, k: int) -> Optional[Tuple[int, int, int]]:
+    """
+    Semi-global alignment of `query` against `tokens` near `diagonal`, limited to k edits.
+
+    Only cells within k of the diagonal are computed (O(m*k)). Returns
+    (distance, start_token, end_token_exclusive) or None if more than k edits are needed.
+    """
+    m = len(query)
+    n = len(tokens)
+    lo = max(0, diagonal - k)
+    hi = min(n, diagonal + m + k)
+    if lo >= hi:
+        return None
+    window = tokens[lo:hi]
+    width = len(window)
+    inf = k + 1
+
+    # prev[j] = cost of aligning query[:i] ending at window[:j]; start[j] = where that alignment began
+    prev = [0] * (width + 1)
+    start = list(range(width + 1))
+    for i in range(1, m + 1):
+        centre = diagonal - lo + i
+        j_lo = max(0, centre - k - 1)
+        j_hi = min(width, centre + k)
+        cur = [inf] * (width + 1)
+        cur_start = [0] * (width + 1)
+        if j_lo == 0:
+            cur[0] = i
+            cur_start[0] = 0
+        q = query[i - 1]
+        for j in range(max(1, j_lo), j_hi + 1):
+            best = prev[j - 1] + (0 if window[j - 1] == q else 1)
+            best_start = start[j - 1]
+            if prev[j] + 1 < best:           # quote word missing from passage
+                best = prev[j] + 1
+                best_start = start[j]
+            if cur[j - 1] + 1 < best:        # extra passage word inside the quote
+                best = cur[j - 1] + 1
+                best_start = cur_start[j - 1]
+            cur[j] = best if best < inf else inf
+            cur_start[j] = best_start
+        prev, start = cur, cur_start
+
+    best_j = min(range(width + 1), key=lambda j: prev[j])
+    if prev[best_j] > k or best_j == 0:
+        return None
+    return prev[best_j], lo + start[best_j], lo + best_j
+
+
+def _reapply_highlights(original: str, snapped: str) -> str:
+    """Carry `backtick` highlights from the model's quote over to the snapped passage text."""
+    for phrase in _HIGHLIGHT_RE.findall(original):
+        pattern = re.compile(re.escape(phrase.strip()), re.IGNORECASE)
+        found = pattern.search(snapped)
+        if found and "`" not in snapped[max(0, found.start() - 1):found.end() + 1]:
+            snapped = snapped[:found.start()] + f"`{found.group()}`" + snapped[found.end():]
+    return snapped
+
+
+# Singleton instance
+grounding_verifier = GroundingVerifier()
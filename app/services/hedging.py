@@ -0,0 +1,151 @@
+# app/services/hedging.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, TypeVar
+
+from app.core.deadline import current_deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MIN_SAMPLES = 20        # observed latencies needed before the p95 replaces the default
+WINDOW = 200            # latencies kept per chain
+
+
+@dataclass
+class ChainSLO:
+    """Latency objective for one short chain on the critical path."""
+    hedge_after: float      # seconds before a second request, until enough samples for a p95
+    budget: float           # max seconds the chain may take within a turn
+    hedge_budget_ratio: float = 0.1   # long-run share of calls allowed to hedge
+
+
+CHAIN_SLOS: Dict[str, ChainSLO] = {
+    "router": ChainSLO(
+        hedge_after=float(os.getenv("ROUTER_HEDGE_AFTER_SECONDS", 1.5)),
+        budget=float(os.getenv("ROUTER_BUDGET_SECONDS", 6.0)),
+    ),
+    "hint": ChainSLO(
+        hedge_after=float(os.getenv("HINT_HEDGE_AFTER_SECONDS", 2.5)),
+        budget=float(os.getenv("HINT_BUDGET_SECONDS", 10.0)),
+    ),
+}
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The chain did not answer before its budget or the turn deadline."""
+
+
+class _ChainState:
+    def __init__(self, slo: ChainSLO):
+        self.slo = slo
+        self.latencies: Deque[float] = deque(maxlen=WINDOW)
+        self.hedge_tokens = 1.0
+        self.counters: Counter = Counter()
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < MIN_SAMPLES:
+            return self.slo.hedge_after
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def allow_hedge(self) -> bool:
+        # Token budget: every call earns `ratio` of a hedge, so at most ~ratio of calls hedge
+        if self.hedge_tokens >= 1.0:
+            self.hedge_tokens -= 1.0
+            return True
+        return False
+
+
+class Hedger:
+    """
+    Hedged requests with deadline propagation for short chains.
+
+    A call that has not answered after the chain's observed p95 fires a second,
+    identical request; whichever answers first wins and the other is cancelled.
+    The call is bounded by the chain budget and by the turn deadline set with
+    app.core.deadline.llm_deadline(); past it DeadlineExceeded is raised so the
+    caller can answer deterministically.
+    """
+
+    def __init__(self, slos: Dict[str, ChainSLO] = CHAIN_SLOS):
+        self._chains: Dict[str, _ChainState] = {name: _ChainState(slo) for name, slo in slos.items()}
+
+    def _state(self, chain: str) -> _ChainState:
+        state = self._chains.get(chain)
+        if state is None:
+            state = self._chains[chain] = _ChainState(ChainSLO(hedge_after=2.0, budget=10.0))
+        return state
+
+    async def call(self, chain: str, make_call: Callable[[], Awaitable[T]]) -> T:
+        state = self._state(chain)
+        state.counters["calls"] += 1
+        state.hedge_tokens = min(10.0, state.hedge_tokens + state.slo.hedge_budget_ratio)
+
+        started = time.monotonic()
+        deadline = started + state.slo.budget
+        turn_deadline = current_deadline()
+        if turn_deadline is not None:
+            deadline = min(deadline, turn_deadline)
+
+        attempts: Dict["asyncio.Task", float] = {asyncio.ensure_future(make_call()): started}
+        hedge_at = started + state.hedge_delay()
+        hedge_sent = False
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    state.counters["deadline_exceeded"] += 1
+                    state.latencies.append(now - started)   # censored: the primary had not answered
+                    raise DeadlineExceeded(f"{chain} did not answer within {now - started:.1f}s")
+                wake = deadline if hedge_sent else min(hedge_at, deadline)
+                done, _ = await asyncio.wait(
+                    attempts, timeout=max(0.0, wake - now), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    attempt_started = attempts.pop(task)
+                    if task.exception() is None:
+                        # The primary attempt's latency, or when the hedge won, the time the primary
+                        # had taken so far (a lower bound). Recording the winner's latency instead
+                        # would pull the p95 down and make hedges fire more and more often.
+                        state.latencies.append(time.monotonic() - started)
+                        if hedge_sent and attempt_started > started:
+                            state.counters["hedge_wins"] += 1
+                        return task.result()
+                    if not attempts:
+                        raise task.exception()
+                    # One attempt failed, keep waiting for the other
+
+                if not hedge_sent and not done and time.monotonic() >= hedge_at and state.allow_hedge():
+                    hedge_sent = True
+                    state.counters["hedged"] += 1
+                    logger.info(f"[HEDGE] {chain}: no answer after {time.monotonic() - started:.2f}s, "
+                                f"sending a second request")
+                    attempts[asyncio.ensure_future(make_call())] = time.monotonic()
+                elif not hedge_sent and not done and time.monotonic() >= hedge_at:
+                    hedge_at = deadline  # no hedge budget left; just wait
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, state in self._chains.items():
+            calls = state.counters.get("calls", 0)
+            result[name] = {
+                **state.counters,
+                "hedge_rate": round(state.counters.get("hedged", 0) / calls, 3) if calls else 0.0,
+                "hedge_after_seconds": round(state.hedge_delay(), 3),
+                "samples": len(state.latencies),
+            }
+        return result
+
+
+# Singleton instance
+hedger = Hedger()
@@ -0,0 +1,67 @@
+# app/services/intent_tagger.py
+
+from typing import Dict, FrozenSet, Iterable, List
+
+# Tags produced by the fast-path keyword scan
+GREETING = "greeting"
+MICRO_BATTLE = "micro_battle"
+MATCHING_HEADINGS = "matching_headings"
+TFNG = "tfng"
+
+# Topic tags looked up across recent history (in priority order)
+THEORY_TOPICS = (MATCHING_HEADINGS, TFNG)
+
+FAST_PATH_KEYWORDS: Dict[str, List[str]] = {
+    # Simple greetings (1-2 words)
+    GREETING: [
+        "hello", "hi", "hey", "hiya", "howdy", "greetings",
+        "good morning", "good afternoon", "good evening", "good day",
+        "what's up", "whats up", "sup", "wassup", "yo",
+    ],
+    # User clearly asks for a micro-battle
+    MICRO_BATTLE: [
+        "micro battle", "micro-battle", "micro passage", "micro-passage",
+        "3-minute drill", "three minute drill", "micro drill", "short practice",
+        "micro reading", "micro exercise", "micro passage battle",
+    ],
+    MATCHING_HEADINGS: [
+        "matching heading", "match heading", "heading",
+        "paragraph heading", "match paragraphs", "match title",
+    ],
+    TFNG: [
+        "t/f/ng", "true false", "not given", "tfng",
+        "true or false", "false or not given",
+    ],
+}
+
+HISTORY_WINDOW = 5          # recent history entries scanned for theory topics
+
+
+def _scan(text: str, tags: Iterable[str]) -> FrozenSet[str]:
+    """Tags whose keywords occur in `text` (expected lower case)."""
+    return frozenset(tag for tag in tags if any(k in text for k in FAST_PATH_KEYWORDS[tag]))
+
+
+class IntentTagger:
+    """Tag chat messages with fast-path intents and theory topics (plain substring checks)."""
+
+    def tag(self, message: str) -> FrozenSet[str]:
+        """Every fast-path intent and theory topic whose keywords occur in the message."""
+        return _scan(message.lower(), FAST_PATH_KEYWORDS)
+
+    @staticmethod
+    def is_simple_greeting(message: str, tags: FrozenSet[str]) -> bool:
+        """A bare greeting: the whole message is one, or a 1-2 word message containing one."""
+        if GREETING not in tags:
+            return False
+        lower_msg = message.lower().strip()
+        return lower_msg in FAST_PATH_KEYWORDS[GREETING] or len(message.split()) <= 2
+
+    def recent_topics(self, history: Iterable, window: int = HISTORY_WINDOW) -> FrozenSet[str]:
+        """Theory topics mentioned in the user messages among the last `window` history entries."""
+        recent = " ".join(msg.content.lower() for msg in list(history)[-window:] if msg.role == "user")
+        return _scan(recent, THEORY_TOPICS)
+
+
+# Singleton instance
+intent_tagger = IntentTagger()
@@ -0,0 +1,149 @@
+# app/services/prompt_assembler.py
+
+"""
+Token-budgeted prompt assembly for the general chat path.
+
+The prompt is built from candidate parts, each with a priority: 0 is always kept
+(persona, the new message), higher numbers give way first. Parts are admitted in
+priority order; a part that fits the tokens left is kept whole, one that does not
+is shrunk to what is left when it knows how (theory: only its most relevant
+sections; older history: the oldest messages go first) and dropped otherwise.
+Trimmed and dropped parts are logged with a [PROMPT_BUDGET] line and recorded on
+the current span and in prompt_parts_trimmed_total.
+
+The layout does not change with the budget - parts keep their place, a dropped part
+just leaves a gap - so the cached prompt prefix survives as long as the parts before
+the gap are unchanged. Older history is cut in steps of HISTORY_DROP_STEP messages
+for the same reason: the cut point stays put for several turns.
+
+    GENERAL_CHAT_PROMPT_BUDGET   token budget of the general chat prompt (default 6000)
+    RECENT_HISTORY_MESSAGES      history messages kept with the session context (default 4)
+    HISTORY_DROP_STEP            older history is dropped this many messages at a time (default 6)
+"""
+
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.metrics import registry
+from app.core.token_usage import count_tokens
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+GENERAL_CHAT_PROMPT_BUDGET = int(os.getenv("GENERAL_CHAT_PROMPT_BUDGET", 6000))
+RECENT_HISTORY_MESSAGES = int(os.getenv("RECENT_HISTORY_MESSAGES", 4))
+HISTORY_DROP_STEP = max(1, int(os.getenv("HISTORY_DROP_STEP", 6)))
+
+REQUIRED = 0
+MESSAGE_OVERHEAD_TOKENS = 4     # role and separators the chat format adds per message
+
+PROMPT_PARTS_TRIMMED = registry.counter(
+    "prompt_parts_trimmed_total", "Prompt parts trimmed or dropped to fit the token budget.",
+    ["chain", "part", "outcome"])
+
+
+@dataclass
+class PromptPart:
+    """One candidate piece of the prompt."""
+    name: str
+    content: Any                    # text, or a list of history messages
+    tokens: int
+    priority: int = REQUIRED
+    # shrink(max_tokens) -> (smaller content, its tokens, note), or None when nothing useful fits
+    shrink: Optional[Callable[[int], Optional[Tuple[Any, int, str]]]] = None
+
+
+@dataclass
+class AssembledPrompt:
+    parts: Dict[str, Any]           # part name -> kept content (None when dropped)
+    tokens: int
+    budget: int
+    candidate_tokens: int
+    trimmed: Dict[str, str] = field(default_factory=dict)   # part name -> what was cut
+    dropped: List[str] = field(default_factory=list)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        content = self.parts.get(name)
+        return default if content is None else content
+
+
+def message_tokens(message: Any) -> int:
+    return count_tokens(str(getattr(message, "content", message))) + MESSAGE_OVERHEAD_TOKENS
+
+
+def history_tokens(messages: Sequence[Any]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def trim_oldest(messages: List[Any], max_tokens: int,
+                step: int = HISTORY_DROP_STEP) -> Optional[Tuple[List[Any], int, str]]:
+    """Drop the oldest messages, `step` at a time, until the rest fits."""
+    for start in range(step, len(messages), step):
+        kept = messages[start:]
+        tokens = history_tokens(kept)
+        if tokens <= max_tokens:
+            return kept, tokens, f"dropped {start} oldest messages"
+    return None
+
+
+def text_part(name: str, text: str, priority: int = REQUIRED,
+              shrink: Optional[Callable[[int], Optional[Tuple[Any, int, str]]]] = None) -> PromptPart:
+    return PromptPart(name, text, count_tokens(text), priority, shrink)
+
+
+def history_parts(messages: List[Any], recent: int = RECENT_HISTORY_MESSAGES,
+                  recent_priority: int = 1, older_priority: int = 4) -> List[PromptPart]:
+    """The last `recent` messages and the older rest, which can give up its oldest messages."""
+    split = max(len(messages) - recent, 0)
+    older, latest = messages[:split], messages[split:]
+    return [
+        PromptPart("older_history", older, history_tokens(older), older_priority,
+                   lambda max_tokens: trim_oldest(older, max_tokens)),
+        PromptPart("recent_history", latest, history_tokens(latest), recent_priority),
+    ]
+
+
+class PromptAssembler:
+    def __init__(self, chain: str, budget: int):
+        self.chain = chain
+        self.budget = budget
+
+    def assemble(self, parts: Sequence[PromptPart]) -> AssembledPrompt:
+        candidate = sum(p.tokens for p in parts)
+        kept: Dict[str, Any] = {p.name: None for p in parts}
+        result = AssembledPrompt(kept, 0, self.budget, candidate)
+
+        # Stable sort: equal priorities are admitted in layout order
+        for part in sorted(parts, key=lambda p: p.priority):
+            left = self.budget - result.tokens
+            if not part.tokens:
+                kept[part.name] = part.content
+            elif part.priority == REQUIRED or part.tokens <= left:
+                kept[part.name] = part.content
+                result.tokens += part.tokens
+            elif part.shrink is not None and left > 0 and (shrunk := part.shrink(left)) is not None:
+                content, tokens, note = shrunk
+                kept[part.name] = content
+                result.tokens += tokens
+                result.trimmed[part.name] = f"{part.tokens}->{tokens} tokens, {note}"
+            else:
+                result.dropped.append(part.name)
+
+        if result.trimmed or result.dropped:
+            for name in result.trimmed:
+                PROMPT_PARTS_TRIMMED.inc(1, chain=self.chain, part=name, outcome="trimmed")
+            for name in result.dropped:
+                PROMPT_PARTS_TRIMMED.inc(1, chain=self.chain, part=name, outcome="dropped")
+            cut = [f"{name} trimmed ({note})" for name, note in result.trimmed.items()]
+            cut += [f"{name} dropped" for name in result.dropped]
+            logger.info(f"[PROMPT_BUDGET] {self.chain}: {candidate} -> {result.tokens} tokens "
+                        f"(budget {self.budget}): {'; '.join(cut)}")
+        tracer.annotate(prompt_tokens=result.tokens, prompt_candidate_tokens=candidate,
+                        prompt_trimmed=",".join(result.trimmed), prompt_dropped=",".join(result.dropped))
+        return result
+
+
+# Singleton instance
+general_chat_assembler = PromptAssembler("general_chat", GENERAL_CHAT_PROMPT_BUDGET)
@@ -0,0 +1,146 @@
+# app/services/single_flight.py
+
+import asyncio
+import contextvars
+import copy
+import hashlib
+import json
+import logging
+import re
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.core.deadline import current_deadline, set_deadline
+from app.core.rate_limiter import current_priority, set_priority
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Every SingleFlight by name, for stats/metrics
+_registry: Dict[str, "SingleFlight"] = {}
+
+
+def normalize_input(value: Any) -> Any:
+    """Collapse whitespace in strings (recursively) so trivially different inputs share a key."""
+    if isinstance(value, str):
+        return _WHITESPACE_RE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): normalize_input(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(v) for v in value]
+    return value
+
+
+def make_key(chain_input: Dict[str, Any]) -> str:
+    """Stable key for a chain input dict (normalized, order-independent)."""
+    payload = json.dumps(normalize_input(chain_input), sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _set_urgency(priority: int, deadline: Optional[float]) -> None:
+    set_priority(priority)
+    set_deadline(deadline)
+
+
+class _Flight:
+    __slots__ = ("task", "waiters", "context", "priority", "deadline")
+
+    def __init__(self, priority: int, deadline: Optional[float]):
+        self.task: Optional["asyncio.Task"] = None
+        self.waiters = 0
+        self.context = contextvars.Context()
+        self.priority = priority
+        self.deadline = deadline
+        self.context.run(_set_urgency, priority, deadline)
+
+    def join(self, priority: int, deadline: Optional[float]) -> None:
+        """Serve the most urgent class among the waiters, until the most patient one's deadline."""
+        priority = min(self.priority, priority)
+        deadline = None if deadline is None or self.deadline is None else max(self.deadline, deadline)
+        if (priority, deadline) != (self.priority, self.deadline):
+            self.priority, self.deadline = priority, deadline
+            # The upstream task is suspended while we run: its next LLM calls see the new values
+            self.context.run(_set_urgency, priority, deadline)
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into one upstream call.
+
+    The first caller for a key starts the work as a task; callers arriving while it is
+    in flight wait on the same task and get the same result (followers get a deep copy,
+    so nobody mutates a shared object) or the same exception.
+
+    The upstream task runs in a fresh contextvars.Context, not the leader's: it is not
+    part of the leader's trace or of its request's in-flight calls (a leader whose
+    client disconnects does not charge the shared call as cancelled). Its rate-limiter
+    priority is the most urgent among the waiters and its deadline the latest of
+    theirs (none if any waiter has none), updated as waiters join.
+
+    Cancellation: a cancelled caller only stops waiting. The upstream call is cancelled
+    only when every caller waiting for it has gone away.
+
+    Nothing is cached - once the call finishes the key is free again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+        self.counters: Counter = Counter()
+        _registry[name] = self
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        self.counters["calls"] += 1
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            self.counters["upstream"] += 1
+            flight = _Flight(current_priority(), current_deadline())
+            flight.task = asyncio.get_running_loop().create_task(fn(), context=flight.context)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task, key=key: self._finished(key, task))
+        else:
+            self.counters["coalesced"] += 1
+            flight.join(current_priority(), current_deadline())
+            logger.info(f"[SINGLE_FLIGHT] {self.name}: joined in-flight call ({flight.waiters} waiting)")
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            flight.waiters -= 1
+            if flight.task.cancelled():
+                raise
+            self.counters["cancelled_waiters"] += 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is waiting any more - stop the upstream call
+                self.counters["cancelled_upstream"] += 1
+                flight.task.cancel()
+            raise
+        flight.waiters -= 1
+        return result if leader else copy.deepcopy(result)
+
+    def _finished(self, key: str, task: "asyncio.Task") -> None:
+        if self._flights.get(key) is not None and self._flights[key].task is task:
+            del self._flights[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.counters["errors"] += 1
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "in_flight": self.in_flight}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Named, process-wide SingleFlight (created on first use)."""
+    return _registry.get(name) or SingleFlight(name)
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    return {name: flight.stats() for name, flight in _registry.items()}
@@ -0,0 +1,377 @@
+# app/services/theory_index.py
+
+"""
+Section-level search over the reading theory in backend/data.
+
+reading-theory.json (every question type) and tfng-detailed-theory.json are cut into
+small sections: one per detailed-theory subsection, one per common pitfall, and one
+per remaining block of a question type (what it is, strategy steps, common mistakes,
+signal words, trap patterns, timing...). The quizzes are left out. Sections are
+rendered as plain text and indexed twice, locally and without API calls:
+
+    lexical   BM25 over word stems, title terms counted twice
+    vector    tf-idf vectors of character 3-5 grams, cosine similarity; catches the
+              inflections, hyphenation and typos the word index misses
+              ("headings"/"heading", "not-given", "paraphrasing")
+
+search() fuses the two rankings (reciprocal rank fusion) and returns the top few
+sections. Preferred question types (e.g. the topic of the conversation) get a boost,
+and a search can also be restricted to given types. A query that matches no section
+well enough on either index gets nothing, so small talk carries no theory. The
+index is built on first use and kept in memory.
+
+compact_theory() serves the prebuilt compact theory of a question type instead: the
+largest variant that fits a token budget (app/prompts/theory, made by build_theory.py).
+
+    THEORY_DATA_DIR         directory with the theory JSON files (default backend/data)
+    THEORY_TOP_K            sections per request (default 3)
+    THEORY_MIN_SCORE        BM25 score the best section must reach (default 4.0),
+    THEORY_MIN_SIMILARITY   or its n-gram cosine similarity (default 0.32)
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.prompt_registry import PROMPTS_DIR, prompt_registry
+from app.core.token_usage import count_tokens
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.getenv("THEORY_DATA_DIR", Path(__file__).resolve().parent.parent.parent / "backend" / "data"))
+THEORY_FILES = ("reading-theory.json", "tfng-detailed-theory.json")
+COMPACT_MANIFEST = PROMPTS_DIR / "theory" / "manifest.json"
+TOP_K = int(os.getenv("THEORY_TOP_K", 3))
+MIN_SCORE = float(os.getenv("THEORY_MIN_SCORE", 4.0))
+MIN_SIMILARITY = float(os.getenv("THEORY_MIN_SIMILARITY", 0.32))
+
+# tfng-detailed-theory.json is a single guide without a question type of its own
+FILE_QUESTION_TYPES = {"tfng-detailed-theory": "true-false-not-given"}
+
+# Names used across the app (intent tags, micro-battle types, question metadata) -> type id
+TYPE_ALIASES = {
+    "true-false-not-given": ["tfng", "t/f/ng", "true false not given", "true/false/not given", "yes/no/not given"],
+    "matching-headings": ["matching_headings", "matching headings", "heading"],
+    "multiple-choice": ["multiple_choice", "multiple choice", "mcq"],
+    "gap-fill": ["gap_fill", "gap fill", "sentence completion", "summary completion"],
+    "short-answer": ["short_answer", "short answer"],
+}
+
+SKIPPED_KEYS = {"id", "name", "category", "quiz"}
+UNLABELED_KEYS = {"title", "content", "description", "text"}
+RRF_K = 60                  # reciprocal rank fusion constant
+PREFERRED_TYPE_BOOST = 1.5
+TITLE_WEIGHT = 2
+BM25_K1, BM25_B = 1.2, 0.75
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can could do does did for from had has have how i if in into is it its "
+    "just me my no of on or so than that the their them then there these they this to was we were what "
+    "when where which who why will with would you your "
+    # chat filler that would otherwise match theory text
+    "about get got give help know like need next ok okay please tell thank thanks want yes yourself".split()
+)
+
+
+@dataclass(frozen=True)
+class TheorySection:
+    id: str                 # "matching-headings/section-2/distractor-types"
+    question_type: str      # "matching-headings"
+    type_name: str          # "Matching Headings"
+    title: str
+    text: str
+    tokens: int
+
+
+@dataclass(frozen=True)
+class TheoryHit:
+    section: TheorySection
+    score: float            # fused score
+    lexical: float          # BM25
+    vector: float           # cosine similarity
+
+
+def question_type_id(name: Optional[str]) -> Optional[str]:
+    """Type id for a question type name in any of the app's spellings, or None."""
+    if not name:
+        return None
+    normalized = name.strip().lower().replace("_", " ")
+    for type_id, aliases in TYPE_ALIASES.items():
+        if normalized == type_id or normalized.replace(" ", "-") == type_id:
+            return type_id
+        if any(alias.replace("_", " ") in normalized for alias in aliases):
+            return type_id
+    return None
+
+
+def stem(word: str) -> str:
+    """Crude suffix stripping, enough to match "paraphrases" with "paraphrasing"."""
+    for suffix in ("ing", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if word.endswith("e") and len(word) > 4 else word
+
+
+def word_terms(text: str) -> List[str]:
+    return [stem(w) for w in WORD.findall(text.lower()) if w not in STOPWORDS]
+
+
+def char_grams(text: str) -> Counter:
+    grams: Counter = Counter()
+    for word in WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        padded = f" {word} "
+        for n in (3, 4, 5):
+            grams.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def _label(key: str) -> str:
+    words = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", key).replace("_", " ")
+    return words[:1].upper() + words[1:].lower()
+
+
+def render(value: Any, depth: int = 0) -> List[str]:
+    """JSON theory -> indented plain-text lines."""
+    pad = "  " * depth
+    if isinstance(value, list):
+        lines = []
+        for item in value:
+            item_lines = render(item, depth + 1)
+            if item_lines:
+                item_lines[0] = f"{pad}- {item_lines[0].lstrip()}"
+            lines += item_lines
+        return lines
+    if not isinstance(value, dict):
+        return [f"{pad}{value}"]
+    lines = []
+    for key, item in value.items():
+        if key in SKIPPED_KEYS:
+            continue
+        if isinstance(item, (dict, list)):
+            lines.append(f"{pad}{_label(key)}:")
+            lines += render(item, depth + 1)
+        elif key in UNLABELED_KEYS:
+            lines.append(f"{pad}{item}")
+        else:
+            lines.append(f"{pad}{_label(key)}: {item}")
+    return lines
+
+
+def split_question_type(entry: Dict[str, Any], type_id: str) -> List[Tuple[str, str, str]]:
+    """(id, title, text) sections of one question type."""
+    sections = []
+
+    def add(section_id: str, title: str, value: Any) -> None:
+        text = "\n".join(render(value)).strip()
+        if text:
+            sections.append((f"{type_id}/{section_id}", title, text))
+
+    detailed = entry.get("detailedTheory", {}).get("sections", []) + entry.get("sections", [])
+    for section in detailed:
+        section_title = section.get("title", section.get("id", ""))
+        intro = {k: v for k, v in section.items() if k not in ("id", "title", "subsections")}
+        if intro:
+            add(section["id"], section_title, intro)
+        for sub in section.get("subsections", []):
+            add(f"{section['id']}/{sub.get('id', '')}", f"{section_title} / {sub.get('title', '')}",
+                {k: v for k, v in sub.items() if k != "title"})
+
+    pitfalls = entry.get("commonPitfalls") or {}
+    for mistake in pitfalls.get("mistakes", []):
+        add(f"pitfall-{mistake.get('id')}", f"Common pitfall: {mistake.get('title', '')}",
+            {k: v for k, v in mistake.items() if k != "title"})
+
+    about = {k: v for k, v in entry.items() if isinstance(v, str) and k not in SKIPPED_KEYS}
+    if about:
+        add("overview", "Overview", about)
+    for key, value in entry.items():
+        if key in SKIPPED_KEYS or key in ("detailedTheory", "sections", "commonPitfalls") or isinstance(value, str):
+            continue
+        add(key, _label(key), value)
+    return sections
+
+
+def load_sections(directory: Path = DATA_DIR) -> List[TheorySection]:
+    """All theory sections of the data files, without duplicates (the files overlap)."""
+    sections, seen = [], set()
+    names: Dict[str, str] = {}      # type id -> display name, from reading-theory.json (listed first)
+    for file_name in THEORY_FILES:
+        path = directory / file_name
+        if not path.exists():
+            logger.warning(f"[THEORY] Missing theory file {path}")
+            continue
+        data = json.loads(path.read_text(encoding="utf-8"))
+        entries = data.get("questionTypes") or [dict(data, id=FILE_QUESTION_TYPES.get(data.get("id"), data.get("id")))]
+        for entry in entries:
+            type_id = entry["id"]
+            type_name = names.setdefault(type_id, entry.get("name") or type_id)
+            for section_id, title, text in split_question_type(entry, type_id):
+                digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                sections.append(TheorySection(section_id, type_id, type_name, title, text, count_tokens(text)))
+    return sections
+
+
+class TheoryIndex:
+    def __init__(self, directory: Path = DATA_DIR, top_k: int = TOP_K, min_score: float = MIN_SCORE,
+                 min_similarity: float = MIN_SIMILARITY):
+        self.directory = Path(directory)
+        self.top_k = top_k
+        self.min_score = min_score
+        self.min_similarity = min_similarity
+        self.sections: List[TheorySection] = []
+        self.searches = 0
+        self.empty_results = 0
+        self.build_ms = 0.0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """Build the index (once); returns the number of sections."""
+        if self._loaded:
+            return len(self.sections)
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._build(load_sections(self.directory))
+                self.build_ms = (time.perf_counter() - start) * 1000
+                self._loaded = True
+                logger.info(f"[THEORY] Indexed {len(self.sections)} theory sections in {self.build_ms:.0f} ms")
+        return len(self.sections)
+
+    def search(self, query: str, k: Optional[int] = None, prefer: Iterable[str] = (),
+               only: Iterable[str] = ()) -> List[TheoryHit]:
+        """The k sections most relevant to the query (empty when nothing is relevant enough)."""
+        self.load()
+        self.searches += 1
+        k = k or self.top_k
+        only = {t for t in map(question_type_id, only) if t}
+        prefer = {t for t in map(question_type_id, prefer) if t}
+
+        lexical = self._bm25(word_terms(query))
+        vector = self._cosine(char_grams(query))
+        candidates = [i for i in set(lexical) | set(vector)
+                      if not only or self.sections[i].question_type in only]
+        if (max((lexical.get(i, 0.0) for i in candidates), default=0.0) < self.min_score
+                and max((vector.get(i, 0.0) for i in candidates), default=0.0) < self.min_similarity):
+            self.empty_results += 1
+            return []
+
+        lexical_rank = {i: r for r, i in enumerate(sorted(candidates, key=lambda i: -lexical.get(i, 0.0)))}
+        vector_rank = {i: r for r, i in enumerate(sorted(candidates, key=lambda i: -vector.get(i, 0.0)))}
+        hits = []
+        for i in candidates:
+            score = (1 / (RRF_K + lexical_rank[i]) if i in lexical else 0.0) + \
+                    (1 / (RRF_K + vector_rank[i]) if i in vector else 0.0)
+            if self.sections[i].question_type in prefer:
+                score *= PREFERRED_TYPE_BOOST
+            hits.append(TheoryHit(self.sections[i], score, lexical.get(i, 0.0), vector.get(i, 0.0)))
+        hits.sort(key=lambda h: -h.score)
+        return hits[:k]
+
+    def type_name(self, question_type: str) -> str:
+        """Display name of a question type ("Matching Headings")."""
+        self.load()
+        type_id = question_type_id(question_type)
+        return next((s.type_name for s in self.sections if s.question_type == type_id), question_type)
+
+    def stats(self) -> Dict[str, Any]:
+        by_type = Counter(s.question_type for s in self.sections)
+        return {
+            "sections": len(self.sections),
+            "by_question_type": dict(by_type),
+            "tokens": sum(s.tokens for s in self.sections),
+            "build_ms": round(self.build_ms, 1),
+            "searches": self.searches,
+            "empty_results": self.empty_results,
+        }
+
+    def _build(self, sections: List[TheorySection]) -> None:
+        self.sections = sections
+        # Lexical: BM25 postings over word stems
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._lengths: List[int] = []
+        for i, section in enumerate(sections):
+            terms = word_terms(section.text) + word_terms(f"{section.type_name} {section.title}") * TITLE_WEIGHT
+            self._lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self._postings[term].append((i, tf))
+        self._avg_length = sum(self._lengths) / max(len(self._lengths), 1)
+
+        # Vector: L2-normalized tf-idf over character n-grams, stored as postings
+        doc_grams = [char_grams(f"{s.type_name} {s.title}\n{s.text}") for s in sections]
+        df = Counter(g for grams in doc_grams for g in grams)
+        self._gram_idf = {g: math.log((1 + len(sections)) / (1 + n)) + 1 for g, n in df.items()}
+        self._gram_postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for i, grams in enumerate(doc_grams):
+            weights = {g: (1 + math.log(tf)) * self._gram_idf[g] for g, tf in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for g, w in weights.items():
+                self._gram_postings[g].append((i, w / norm))
+
+    def _bm25(self, terms: List[str]) -> Dict[int, float]:
+        scores: Dict[int, float] = defaultdict(float)
+        n = len(self.sections)
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[i] / self._avg_length)
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + length_norm)
+        return scores
+
+    def _cosine(self, grams: Counter) -> Dict[int, float]:
+        weights = {g: (1 + math.log(tf)) * self._gram_idf[g] for g, tf in grams.items() if g in self._gram_idf}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        scores: Dict[int, float] = defaultdict(float)
+        if not norm:
+            return scores
+        for g, w in weights.items():
+            for i, doc_weight in self._gram_postings[g]:
+                scores[i] += w / norm * doc_weight
+        return scores
+
+
+def format_hits(hits: List[TheoryHit]) -> str:
+    """Sections as prompt text, each under its question type and title."""
+    return "\n\n".join(f"### {h.section.type_name}: {h.section.title}\n{h.section.text}" for h in hits)
+
+
+_compact_variants: Dict[str, List[Tuple[int, str]]] = {}
+
+
+def compact_variants(question_type: str) -> List[Tuple[int, str]]:
+    """(tokens, prompt name) of the prebuilt compact theories of a type, smallest first."""
+    if not _compact_variants and COMPACT_MANIFEST.exists():
+        manifest = json.loads(COMPACT_MANIFEST.read_text(encoding="utf-8"))
+        for type_id, variants in manifest["question_types"].items():
+            _compact_variants[type_id] = sorted(
+                (v["tokens"], f"theory/{v['file'].rsplit('.', 1)[0]}") for v in variants)
+    return _compact_variants.get(question_type_id(question_type) or "", [])
+
+
+def compact_theory(question_type: str, max_tokens: int) -> Optional[str]:
+    """The largest compact theory of the type within max_tokens (None if even the smallest is larger)."""
+    fitting = [name for tokens, name in compact_variants(question_type) if tokens <= max_tokens]
+    return prompt_registry.text(fitting[-1]) if fitting else None
+
+
+# Singleton instance
+theory_index = TheoryIndex()
@@ -0,0 +1,235 @@
+# app/services/turn_guard.py
+
+"""
+One chat turn at a time per session, and idempotent retries.
+
+Two /chat/message requests for the same session (a double-click, a client retry after
+a timeout) would otherwise both mutate the session memory - student_answers,
+pending_socratic_questions, waiting_for_reasoning - and both pay for the same LLM calls.
+TurnGuard.turn() runs the turns of a session one after another (an asyncio.Lock per
+session, dropped once nobody holds or waits for it) and, when the client sends an
+idempotency key, stores the reply: a retry with the same key waits for the first turn
+and gets its reply instead of running the chains again. The same key with a different
+message is a conflict (IdempotencyConflict). A turn that cannot get the session within
+TURN_LOCK_TIMEOUT_SECONDS fails with TurnBusy.
+
+With TURN_LOCK_DB set (several worker processes), the lock is also taken as a lease row
+in that SQLite file and replies are stored there, so a retry that lands on another
+worker is serialized and replayed too. A lease expires after TURN_LOCK_LEASE_SECONDS in
+case its worker died mid-turn.
+
+    TURN_LOCK_TIMEOUT_SECONDS   longest wait for the previous turn of a session (default 45)
+    TURN_LOCK_DB                SQLite path for the cross-process lock and replies (default: off)
+    TURN_LOCK_LEASE_SECONDS     lease length in SQLite (default 60)
+    TURN_LOCK_POLL_MS           retry interval for a lease held by another worker (default 50)
+    IDEMPOTENCY_TTL_SECONDS     how long replies are kept for retries (default 600)
+    IDEMPOTENCY_MAX_ENTRIES     replies kept in memory (default 10000)
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TURN_LOCK_TIMEOUT_SECONDS = float(os.getenv("TURN_LOCK_TIMEOUT_SECONDS", 45))
+TURN_LOCK_DB = os.getenv("TURN_LOCK_DB", "")
+TURN_LOCK_LEASE_SECONDS = float(os.getenv("TURN_LOCK_LEASE_SECONDS", 60))
+TURN_LOCK_POLL_MS = float(os.getenv("TURN_LOCK_POLL_MS", 50))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", 600))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))
+
+CHAT_TURNS_GUARDED = registry.counter(
+    "chat_turns_guarded_total", "Chat turns that waited for, replayed or were refused by the per-session guard.",
+    ["outcome"])
+
+
+class TurnBusy(Exception):
+    """The previous turn of the session did not finish within TURN_LOCK_TIMEOUT_SECONDS."""
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different message."""
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class TurnSlot:
+    """Held for the duration of one turn; `replay` is the stored reply of an earlier try."""
+    session_id: str
+    key: Optional[str]
+    fingerprint: str
+    replay: Optional[str] = None
+    response: Optional[str] = None
+
+    def store(self, response: str) -> None:
+        self.response = response
+
+
+class _SqliteBackend:
+    """Leases and replies in one SQLite file, shared by the worker processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.owner = uuid.uuid4().hex
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS turn_locks (session_id TEXT PRIMARY KEY, owner TEXT, expires REAL)")
+            db.execute("CREATE TABLE IF NOT EXISTS turn_replies (session_id TEXT, key TEXT, fingerprint TEXT, "
+                       "response TEXT, created REAL, PRIMARY KEY (session_id, key))")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def try_acquire(self, session_id: str) -> bool:
+        db = self._connect()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM turn_locks WHERE session_id = ? AND expires < ?", (session_id, now))
+            cursor = db.execute("INSERT OR IGNORE INTO turn_locks VALUES (?, ?, ?)",
+                                (session_id, self.owner, now + TURN_LOCK_LEASE_SECONDS))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def release(self, session_id: str) -> None:
+        self._connect().execute("DELETE FROM turn_locks WHERE session_id = ? AND owner = ?", (session_id, self.owner))
+
+    def get_reply(self, session_id: str, key: str) -> Optional[Tuple[str, str]]:
+        row = self._connect().execute(
+            "SELECT fingerprint, response FROM turn_replies WHERE session_id = ? AND key = ? AND created >= ?",
+            (session_id, key, time.time() - IDEMPOTENCY_TTL_SECONDS)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_reply(self, session_id: str, key: str, fp: str, response: str) -> None:
+        db = self._connect()
+        now = time.time()
+        db.execute("INSERT OR REPLACE INTO turn_replies VALUES (?, ?, ?, ?, ?)", (session_id, key, fp, response, now))
+        db.execute("DELETE FROM turn_replies WHERE created < ?", (now - IDEMPOTENCY_TTL_SECONDS,))
+
+
+class TurnGuard:
+    def __init__(self, db_path: str = TURN_LOCK_DB, timeout: float = TURN_LOCK_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Counter = Counter()
+        # (session_id, key) -> (fingerprint, response, stored at), oldest first
+        self._replies: "OrderedDict[Tuple[str, str], Tuple[str, str, float]]" = OrderedDict()
+        self._db = _SqliteBackend(db_path) if db_path else None
+        self.counters: Counter = Counter()
+
+    @asynccontextmanager
+    async def turn(self, session_id: str, key: Optional[str], message: str) -> AsyncIterator[TurnSlot]:
+        """Hold the session for one turn; store the reply with slot.store() to make retries replay it."""
+        slot = TurnSlot(session_id, key, fingerprint(message))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        self._waiters[session_id] += 1
+        acquired = False
+        try:
+            if lock.locked() or self._waiters[session_id] > 1:
+                self._count("waited")
+                logger.info(f"[TURN_GUARD] Session {session_id} has a turn in progress - waiting")
+            try:
+                # Not wait_for(): on timeout it can drop an acquire that already succeeded.
+                # `acquired` is set in the same step as the acquire, so finally always releases it.
+                async with asyncio.timeout(self.timeout):
+                    acquired = await lock.acquire()
+            except TimeoutError:
+                self._count("busy")
+                raise TurnBusy(f"session {session_id} is busy with another turn") from None
+            if self._db is not None:
+                await self._acquire_lease(session_id, deadline)
+            try:
+                slot.replay = await self._lookup(slot)
+                if slot.replay is not None:
+                    self._count("replayed")
+                    logger.info(f"[TURN_GUARD] Replaying stored reply for session {session_id}, key {key}")
+                yield slot
+                if key and slot.response is not None and slot.replay is None:
+                    await self._remember(slot)
+            finally:
+                if self._db is not None:
+                    await asyncio.to_thread(self._db.release, session_id)
+        finally:
+            if acquired:
+                lock.release()
+            self._waiters[session_id] -= 1
+            if not self._waiters[session_id]:
+                del self._waiters[session_id]
+                self._locks.pop(session_id, None)
+
+    async def _acquire_lease(self, session_id: str, deadline: float) -> None:
+        loop = asyncio.get_running_loop()
+        waited = False
+        while not await asyncio.to_thread(self._db.try_acquire, session_id):
+            if not waited:
+                waited = True
+                self._count("waited_other_worker")
+            if loop.time() >= deadline:
+                self._count("busy")
+                raise TurnBusy(f"session {session_id} is busy with a turn in another worker")
+            await asyncio.sleep(TURN_LOCK_POLL_MS / 1000)
+
+    async def _lookup(self, slot: TurnSlot) -> Optional[str]:
+        if not slot.key:
+            return None
+        entry = self._replies.get((slot.session_id, slot.key))
+        if entry is not None and time.monotonic() - entry[2] > IDEMPOTENCY_TTL_SECONDS:
+            del self._replies[(slot.session_id, slot.key)]
+            entry = None
+        stored = entry[:2] if entry is not None else None
+        if stored is None and self._db is not None:
+            stored = await asyncio.to_thread(self._db.get_reply, slot.session_id, slot.key)
+        if stored is None:
+            return None
+        if stored[0] != slot.fingerprint:
+            self._count("conflict")
+            raise IdempotencyConflict(f"idempotency key {slot.key} was already used for a different message")
+        return stored[1]
+
+    async def _remember(self, slot: TurnSlot) -> None:
+        self._replies[(slot.session_id, slot.key)] = (slot.fingerprint, slot.response, time.monotonic())
+        self._replies.move_to_end((slot.session_id, slot.key))
+        while len(self._replies) > IDEMPOTENCY_MAX_ENTRIES:
+            self._replies.popitem(last=False)
+        if self._db is not None:
+            await asyncio.to_thread(self._db.put_reply, slot.session_id, slot.key, slot.fingerprint, slot.response)
+
+    def _count(self, outcome: str) -> None:
+        self.counters[outcome] += 1
+        CHAT_TURNS_GUARDED.inc(1, outcome=outcome)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self.counters,
+            "sessions_in_turn": len(self._locks),
+            "stored_replies": len(self._replies),
+            "cross_process": self._db is not None,
+        }
+
+
+# Singleton instance
+turn_guard = TurnGuard()
@@ -12,7 +12,14 @@ from .reading_feedback_agent import (
     create_reading_feedback_agent
 )
 from .explain_agent import ExplainAgent
-from .vector_store import PassageVectorStore
+
+# PassageVectorStore тянет langchain_community/FAISS - импортируем только при первом обращении
+def __getattr__(name):
+    if name == "PassageVectorStore":
+        from .vector_store import PassageVectorStore
+        return PassageVectorStore
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __version__ = "1.0.0"
 __all__ = [
@@ -5,15 +5,27 @@ IELTS Reading Explain Agent
 
 import os
 import json
+import asyncio
 import logging
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
 
-from .explain_prompts import EXPLAIN_SYSTEM_PROMPT, EXPLAIN_USER_TEMPLATE
+from app.core.llm import create_chat_model
+from app.core.tracing import tracer
+from app.core.prompt_registry import prompt_registry
+
+from .explain_prompts import (
+    EXPLAIN_SYSTEM_PROMPT,
+    EXPLAIN_USER_TEMPLATE,
+    EXPLAIN_MANY_SYSTEM_PROMPT,
+    EXPLAIN_MANY_USER_TEMPLATE,
+    REGISTERED_PROMPTS,
+)
+from .vocabulary_index import VocabularyIndex, normalize_phrase, passage_hash
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +35,46 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 
+REQUIRED_FIELDS = ["word", "definition", "context_meaning", "example_sentence"]
+
+class ExplanationCache:
+    """
+    LRU-кэш объяснений с ключом (хэш пассажа, нормализованная фраза)
+    
+    Популярные слова общего пассажа объясняются один раз для всех студентов.
+    """
+    
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._items: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return dict(item)
+    
+    def put(self, key: Tuple[str, str], explanation: Dict[str, Any]) -> None:
+        self._items[key] = dict(explanation)
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
 class ExplainAgent:
     """
     Агент для объяснения слов и фраз из IELTS Reading пассажей
@@ -32,7 +84,10 @@ class ExplainAgent:
         self,
         model: str = None,
         temperature: float = 0.3,
-        max_tokens: int = 500
+        max_tokens: int = 500,
+        cache_size: int = 5000,
+        max_batch_size: int = 8,
+        vocabulary_index: Optional[VocabularyIndex] = None
     ):
         """
         Инициализация агента
@@ -40,14 +95,21 @@ class ExplainAgent:
         Args:
             model: Название модели OpenAI (по умолчанию gpt-4o-mini)
             temperature: Температура генерации
-            max_tokens: Максимальное количество токенов
+            max_tokens: Максимальное количество токенов (на одну фразу)
+            cache_size: Размер кэша объяснений
+            max_batch_size: Максимум фраз в одном запросе к LLM
+            vocabulary_index: Заранее рассчитанные объяснения (по умолчанию загружается
+                из VOCABULARY_INDEX_PATH, см. precompute_vocabulary.py)
         """
         self.model = model or os.getenv("EXPLAIN_MODEL", "gpt-4o-mini")
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.cache = ExplanationCache(max_size=cache_size)
+        self.vocabulary = vocabulary_index if vocabulary_index is not None else VocabularyIndex.load()
         
         # Инициализация LLM
-        self.llm = ChatOpenAI(
+        self.llm = create_chat_model(
             model=self.model,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
@@ -63,7 +125,18 @@ class ExplainAgent:
         # Создание цепочки
         self.chain = self.prompt | self.llm | StrOutputParser()
         
-        logger.info(f"ExplainAgent initialized with model: {self.model}")
+        # Промпт для нескольких фраз за один вызов (пассаж отправляется один раз)
+        self.many_prompt = ChatPromptTemplate.from_messages([
+            ("system", EXPLAIN_MANY_SYSTEM_PROMPT),
+            ("human", EXPLAIN_MANY_USER_TEMPLATE)
+        ])
+        
+        # Версии и размер промптов (GET /health/prompts)
+        for name, text in REGISTERED_PROMPTS.items():
+            prompt_registry.register(name, text)
+        self.prompt_version = prompt_registry.version("explain.system", "explain.user")
+        
+        logger.info(f"ExplainAgent initialized with model: {self.model}, prompt_version: {self.prompt_version}")
     
     def explain_text(
         self,
@@ -71,7 +144,9 @@ class ExplainAgent:
         selected_text: str
     ) -> Dict[str, Any]:
         """
-        Объяснить выбранный текст из пассажа
+        Объяснить выбранный текст из пассажа (синхронно)
+        
+        Из async-кода используйте aexplain_text: этот метод блокирует event loop.
         
         Args:
             passage: Полный текст пассажа
@@ -81,34 +156,185 @@ class ExplainAgent:
             Словарь с полями: word, definition, context_meaning, example_sentence
         """
         try:
-            # Валидация входных данных
-            if not passage or not selected_text:
-                raise ValueError("Passage and selected_text must be non-empty")
+            key = self._validate(passage, selected_text)
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
             
             logger.info(f"Explaining text: '{selected_text}'")
             
             # Вызов цепочки
-            response = self.chain.invoke({
-                "passage": passage,
-                "selected_text": selected_text
-            })
+            with tracer.span("explain", chain="explain"):
+                response = self.chain.invoke({
+                    "passage": passage,
+                    "selected_text": selected_text
+                })
             
-            # Парсинг JSON ответа
-            explanation = self._parse_response(response)
+            return self._store(key, selected_text, self._parse_response(response))
             
-            logger.info(f"Explanation generated successfully for: '{selected_text}'")
+        except Exception as e:
+            logger.error(f"Error explaining text: {str(e)}")
+            return self._error_explanation(selected_text, e)
+    
+    async def aexplain_text(
+        self,
+        passage: str,
+        selected_text: str
+    ) -> Dict[str, Any]:
+        """
+        Объяснить выбранный текст из пассажа (асинхронно, с кэшем)
+        
+        Args:
+            passage: Полный текст пассажа
+            selected_text: Выбранное слово или фраза для объяснения
             
-            return explanation
+        Returns:
+            Словарь с полями: word, definition, context_meaning, example_sentence
+        """
+        try:
+            key = self._validate(passage, selected_text)
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+            
+            logger.info(f"Explaining text (async): '{selected_text}'")
+            
+            with tracer.span("explain", chain="explain"):
+                response = await self.chain.ainvoke({
+                    "passage": passage,
+                    "selected_text": selected_text
+                })
+            
+            return self._store(key, selected_text, self._parse_response(response))
             
         except Exception as e:
             logger.error(f"Error explaining text: {str(e)}")
-            return {
-                "word": selected_text,
-                "definition": f"Sorry, unable to generate explanation. Error: {str(e)}",
-                "context_meaning": "",
-                "example_sentence": "",
-                "error": str(e)
-            }
+            return self._error_explanation(selected_text, e)
+    
+    async def aexplain_many(
+        self,
+        passage: str,
+        selected_texts: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Объяснить несколько фраз одного пассажа
+        
+        Фразы из кэша не отправляются в LLM; остальные (без дубликатов) уходят
+        одним структурированным запросом на каждые max_batch_size фраз.
+        
+        Args:
+            passage: Полный текст пассажа
+            selected_texts: Список выбранных слов или фраз
+            
+        Returns:
+            Список объяснений в порядке selected_texts
+        """
+        if not passage or not selected_texts:
+            return [self._error_explanation(text, ValueError("Passage and selected_text must be non-empty"))
+                    for text in selected_texts]
+        
+        p_hash = passage_hash(passage)
+        results: Dict[str, Dict[str, Any]] = {}
+        pending: "OrderedDict[str, str]" = OrderedDict()  # нормализованная фраза -> исходный текст
+        for text in selected_texts:
+            phrase = normalize_phrase(text or "")
+            if not phrase or phrase in results or phrase in pending:
+                continue
+            cached = self._lookup((p_hash, phrase))
+            if cached is not None:
+                results[phrase] = cached
+            else:
+                pending[phrase] = text
+        
+        if pending:
+            items = list(pending.items())
+            batches = [items[i:i + self.max_batch_size] for i in range(0, len(items), self.max_batch_size)]
+            logger.info(f"Explaining {len(items)} phrases in {len(batches)} call(s), "
+                        f"{len(results)} from cache")
+            for batch_result in await asyncio.gather(*[self._explain_batch(passage, p_hash, b) for b in batches]):
+                results.update(batch_result)
+        
+        return [
+            results.get(normalize_phrase(text or ""))
+            or self._error_explanation(text, ValueError("Passage and selected_text must be non-empty"))
+            for text in selected_texts
+        ]
+    
+    async def _explain_batch(
+        self,
+        passage: str,
+        p_hash: str,
+        batch: List[Tuple[str, str]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Один вызов LLM для пачки фраз; пропущенные моделью фразы объясняются по одной"""
+        results: Dict[str, Dict[str, Any]] = {}
+        try:
+            # Лимит токенов растёт с числом фраз в пачке
+            chain = self.many_prompt | self.llm.bind(max_tokens=self.max_tokens * len(batch)) | StrOutputParser()
+            with tracer.span("explain_batch", chain="explain", phrases=len(batch)):
+                response = await chain.ainvoke({
+                    "passage": passage,
+                    "selected_texts": "\n".join(f"- {text.strip()}" for _, text in batch)
+                })
+            explanations = self._parse_many_response(response)
+            
+            by_word = {normalize_phrase(str(e.get("word", ""))): e for e in explanations}
+            for index, (phrase, text) in enumerate(batch):
+                # Совпадение по слову, иначе по позиции (модель может изменить регистр/форму)
+                explanation = by_word.get(phrase)
+                if explanation is None and len(explanations) == len(batch):
+                    explanation = explanations[index]
+                if explanation is not None:
+                    results[phrase] = self._store((p_hash, phrase), text, explanation)
+        except Exception as e:
+            logger.error(f"Error explaining batch: {str(e)}")
+        
+        missing = [(phrase, text) for phrase, text in batch if phrase not in results]
+        if missing:
+            logger.warning(f"Batch response missed {len(missing)} phrase(s), explaining individually")
+            singles = await asyncio.gather(*[self.aexplain_text(passage, text) for _, text in missing])
+            for (phrase, _), explanation in zip(missing, singles):
+                results[phrase] = explanation
+        return results
+    
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Сначала индекс корпуса (без LLM), затем кэш объяснений"""
+        explanation = self.vocabulary.get(*key)
+        if explanation is not None:
+            return explanation
+        return self.cache.get(key)
+    
+    def _validate(self, passage: str, selected_text: str) -> Tuple[str, str]:
+        """Проверка входных данных; возвращает ключ кэша"""
+        if not passage or not selected_text or not normalize_phrase(selected_text):
+            raise ValueError("Passage and selected_text must be non-empty")
+        return passage_hash(passage), normalize_phrase(selected_text)
+    
+    def _store(self, key: Tuple[str, str], selected_text: str, explanation: Dict[str, Any]) -> Dict[str, Any]:
+        """Дополнить обязательные поля и сохранить в кэш (кроме ответов без JSON)"""
+        for field in REQUIRED_FIELDS:
+            explanation.setdefault(field, "")
+        if not explanation["word"]:
+            explanation["word"] = selected_text
+        if not explanation.get("unparsed"):
+            self.cache.put(key, explanation)
+        explanation.pop("unparsed", None)
+        logger.info(f"Explanation generated successfully for: '{selected_text}'")
+        return explanation
+    
+    @staticmethod
+    def _error_explanation(selected_text: str, error: Exception) -> Dict[str, Any]:
+        return {
+            "word": selected_text,
+            "definition": f"Sorry, unable to generate explanation. Error: {str(error)}",
+            "context_meaning": "",
+            "example_sentence": "",
+            "error": str(error)
+        }
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша объяснений и индекса корпуса"""
+        return {**self.cache.stats(), "vocabulary_index": self.vocabulary.stats()}
     
     def _parse_response(self, response: str) -> Dict[str, Any]:
         """
@@ -123,16 +349,10 @@ class ExplainAgent:
         try:
             # Попытка распарсить как JSON
             # Иногда модель возвращает JSON в markdown блоке
-            if "```json" in response:
-                response = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                response = response.split("```")[1].split("```")[0].strip()
-            
-            data = json.loads(response)
+            data = json.loads(self._strip_code_fence(response))
             
             # Проверка наличия обязательных полей
-            required_fields = ["word", "definition", "context_meaning", "example_sentence"]
-            for field in required_fields:
+            for field in REQUIRED_FIELDS:
                 if field not in data:
                     data[field] = ""
             
@@ -144,6 +364,35 @@ class ExplainAgent:
                 "word": "",
                 "definition": response,
                 "context_meaning": "",
-                "example_sentence": ""
+                "example_sentence": "",
+                "unparsed": True  # не кэшируется
             }
+    
+    def _parse_many_response(self, response: str) -> List[Dict[str, Any]]:
+        """
+        Парсинг ответа с несколькими объяснениями
+        
+        Args:
+            response: Строковый ответ от модели ({"explanations": [...]} или список)
+            
+        Returns:
+            Список словарей-объяснений (пустой, если JSON не распознан)
+        """
+        try:
+            data = json.loads(self._strip_code_fence(response))
+        except json.JSONDecodeError:
+            logger.warning("Batch response is not valid JSON")
+            return []
+        if isinstance(data, dict):
+            data = data.get("explanations", [])
+        return [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+    
+    @staticmethod
+    def _strip_code_fence(response: str) -> str:
+        # Иногда модель возвращает JSON в markdown блоке
+        if "```json" in response:
+            return response.split("```json")[1].split("```")[0].strip()
+        if "```" in response:
+            return response.split("```")[1].split("```")[0].strip()
+        return response
 
@@ -2,27 +2,60 @@
 Промпты для IELTS Reading Explain Agent
 """
 
-EXPLAIN_SYSTEM_PROMPT = """You are an expert IELTS Reading tutor helping students understand vocabulary and concepts from passages.
+# Литеральные фигурные скобки удвоены: промпты проходят через ChatPromptTemplate (f-string)
+EXPLAIN_RULES = """You are an expert IELTS Reading tutor helping students understand vocabulary and concepts from passages.
 
 RULES:
 1. Explain words/phrases based ONLY on their usage in the provided passage
 2. Provide clear, concise definitions suitable for IELTS level
 3. Give context-specific meanings
 4. Include an example sentence using the word/phrase
-5. Keep explanations educational and encouraging
+5. Keep explanations educational and encouraging"""
 
-You must respond in valid JSON format:
-{
+EXPLANATION_JSON = """{{
   "word": "the selected word or phrase",
   "definition": "general definition of the word/phrase",
   "context_meaning": "what it means in this specific passage context",
   "example_sentence": "an example sentence using this word/phrase"
-}"""
+}}"""
+
+EXPLAIN_SYSTEM_PROMPT = EXPLAIN_RULES + """
+
+You must respond in valid JSON format:
+""" + EXPLANATION_JSON
+
+EXPLAIN_MANY_SYSTEM_PROMPT = EXPLAIN_RULES + """
+6. Explain every selected item, in the order given
+
+You must respond in valid JSON format:
+{{
+  "explanations": [
+    """ + EXPLANATION_JSON.replace("\n", "\n    ") + """
+  ]
+}}"""
 
+# Пассаж перед выбранным текстом: общий префикс для всех запросов по одному пассажу (кэш промптов провайдера)
 EXPLAIN_USER_TEMPLATE = """PASSAGE:
 {passage}
 
-SELECTED TEXT: {selected_text}
+Explain the selected text based on how it's used in this passage. Provide a clear explanation in JSON format.
+
+SELECTED TEXT: {selected_text}"""
+
+
+EXPLAIN_MANY_USER_TEMPLATE = """PASSAGE:
+{passage}
+
+Explain each selected text based on how it's used in this passage. Return one explanation per selected text, in the same order, in JSON format.
+
+SELECTED TEXTS (one per line):
+{selected_texts}"""
 
-Explain the selected text based on how it's used in this passage. Provide a clear explanation in JSON format."""
 
+# Имена промптов в реестре (app.core.prompt_registry, check_prompt_prefixes.py)
+REGISTERED_PROMPTS = {
+    "explain.system": EXPLAIN_SYSTEM_PROMPT,
+    "explain.user": EXPLAIN_USER_TEMPLATE,
+    "explain_many.system": EXPLAIN_MANY_SYSTEM_PROMPT,
+    "explain_many.user": EXPLAIN_MANY_USER_TEMPLATE,
+}
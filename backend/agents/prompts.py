@@ -19,19 +19,10 @@ Be constructive and encouraging. Help students improve their IELTS Reading skill
 
 
 # Main feedback generation template
+# Layout for provider prompt caching: static instructions first, then the
+# per-question-type guidance, the passage and finally the per-request answers.
 FEEDBACK_TEMPLATE = """Analyze the student's answer to this IELTS Reading question and provide detailed feedback.
 
-PASSAGE:
-{passage}
-
-QUESTION TYPE: {question_type}
-QUESTION: {question}
-CORRECT ANSWER: {correct_answer}
-STUDENT'S ANSWER: {student_answer}
-
-QUESTION TYPE GUIDANCE:
-{question_type_guidance}
-
 ANALYSIS STEPS:
 1. Locate relevant passage section
 2. Compare student answer with correct answer
@@ -39,7 +30,18 @@ ANALYSIS STEPS:
 4. Explain reasoning clearly
 5. Provide strategy tip
 
-{format_instructions}"""
+{format_instructions}
+
+QUESTION TYPE GUIDANCE:
+{question_type_guidance}
+
+PASSAGE:
+{passage}
+
+QUESTION TYPE: {question_type}
+QUESTION: {question}
+CORRECT ANSWER: {correct_answer}
+STUDENT'S ANSWER: {student_answer}"""
 
 
 # Question type-specific guidance with conditional T/F/NG theory
@@ -221,6 +223,21 @@ ERROR_FEEDBACK_TEMPLATE = {
 }
 
 
+# Targeted re-ask when the passage_reference quote cannot be found in the passage
+EVIDENCE_REASK_TEMPLATE = """The quote below was NOT found in the passage.
+
+Copy the ONE sentence (or part of a sentence) from the passage that supports the correct answer.
+Copy it WORD FOR WORD - no paraphrasing and no quotation marks.
+If the passage contains no relevant sentence, reply with exactly: NONE
+
+PASSAGE:
+{passage}
+
+QUESTION: {question}
+CORRECT ANSWER: {correct_answer}
+QUOTE NOT FOUND: {invalid_quote}"""
+
+
 # Validation prompt for checking agent output
 VALIDATION_PROMPT = """Review this feedback and ensure it follows all rules:
 
@@ -239,3 +256,11 @@ CHECK:
 
 If any check fails, explain what's wrong. Otherwise, respond with "VALID".
 """
+
+
+# Registry names of the prompts above (app.core.prompt_registry, check_prompt_prefixes.py)
+REGISTERED_PROMPTS = {
+    "reading_feedback.system": SYSTEM_PROMPT,
+    "reading_feedback.user": FEEDBACK_TEMPLATE,
+    "reading_feedback.evidence_reask": EVIDENCE_REASK_TEMPLATE,
+}
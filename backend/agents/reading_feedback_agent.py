@@ -10,16 +10,22 @@ import os
 import logging
 from typing import Dict, Any, Optional
 from pydantic import BaseModel, Field, validator
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 
 from .prompts import (
     SYSTEM_PROMPT,
     FEEDBACK_TEMPLATE,
+    EVIDENCE_REASK_TEMPLATE,
+    REGISTERED_PROMPTS,
     get_question_type_guidance
 )
+from app.core.llm import create_chat_model
+from app.core.tracing import tracer
+from app.core.prompt_registry import prompt_registry
+from app.services.grounding import grounding_verifier
+from app.services.single_flight import get_single_flight, make_key
 
 # Configure logging
 logging.basicConfig(
@@ -126,7 +132,7 @@ class ReadingFeedbackAgent:
         self.max_tokens = max_tokens
         
         # Initialize LLM with strict parameters to minimize hallucinations
-        self.llm = ChatOpenAI(
+        self.llm = create_chat_model(
             model=model_name,
             temperature=temperature,
             max_tokens=max_tokens,
@@ -158,9 +164,24 @@ class ReadingFeedbackAgent:
             | self.output_parser
         )
         
+        # Short chain used only when the quoted evidence is not in the passage
+        self.reask_chain = (
+            ChatPromptTemplate.from_template(EVIDENCE_REASK_TEMPLATE)
+            | self.llm
+            | StrOutputParser()
+        )
+        
+        # Prompt versions go into the single-flight key (see app.core.prompt_registry)
+        for name, text in REGISTERED_PROMPTS.items():
+            prompt_registry.register(name, text)
+        self.prompt_version = prompt_registry.version("reading_feedback.system", "reading_feedback.user")
+        
+        # Coalesces identical concurrent generate_feedback calls
+        self.single_flight = get_single_flight("reading_feedback")
+        
         logger.info(
             f"ReadingFeedbackAgent initialized with model={model_name}, "
-            f"temperature={temperature}"
+            f"temperature={temperature}, prompt_version={self.prompt_version}"
         )
     
     async def generate_feedback(
@@ -193,11 +214,12 @@ class ReadingFeedbackAgent:
                 "student_answer": feedback_input.student_answer
             }
             
-            # Invoke the chain
-            result = await self.chain.ainvoke(chain_input)
-            
-            # Validate output
-            feedback_output = FeedbackOutput(**result)
+            # Identical requests in flight at the same time share one LLM call
+            feedback_output = await self.single_flight.do(
+                make_key({**chain_input, "model": self.model_name, "temperature": self.temperature,
+                          "prompt_version": self.prompt_version}),
+                lambda: self._generate_feedback(chain_input, feedback_input)
+            )
             
             logger.info(
                 f"Feedback generated successfully: is_correct={feedback_output.is_correct}"
@@ -209,6 +231,28 @@ class ReadingFeedbackAgent:
             logger.error(f"Error generating feedback: {str(e)}", exc_info=True)
             raise Exception(f"Failed to generate feedback: {str(e)}")
     
+    async def _generate_feedback(
+        self,
+        chain_input: Dict[str, Any],
+        feedback_input: FeedbackInput
+    ) -> FeedbackOutput:
+        """Run the chain and verify the quoted evidence (one upstream call per coalesced group)."""
+        with tracer.span("reading_feedback", chain="reading_feedback"):
+            result = await self.chain.ainvoke(chain_input)
+        
+        # Validate output
+        feedback_output = FeedbackOutput(**result)
+        
+        # Check the quoted evidence against the passage
+        check = grounding_verifier.verify(feedback_output.passage_reference, feedback_input.passage)
+        if check.grounded:
+            feedback_output.passage_reference = check.quote
+        else:
+            retry_quote = await self._reask_evidence(chain_input, feedback_output.passage_reference)
+            feedback_output.passage_reference = self._finish_grounding(retry_quote, feedback_output, feedback_input)
+        
+        return feedback_output
+    
     def generate_feedback_sync(
         self,
         feedback_input: FeedbackInput
@@ -237,11 +281,20 @@ class ReadingFeedbackAgent:
             }
             
             # Invoke the chain synchronously
-            result = self.chain.invoke(chain_input)
+            with tracer.span("reading_feedback", chain="reading_feedback"):
+                result = self.chain.invoke(chain_input)
             
             # Validate output
             feedback_output = FeedbackOutput(**result)
             
+            # Check the quoted evidence against the passage
+            check = grounding_verifier.verify(feedback_output.passage_reference, feedback_input.passage)
+            if check.grounded:
+                feedback_output.passage_reference = check.quote
+            else:
+                retry_quote = self._reask_evidence_sync(chain_input, feedback_output.passage_reference)
+                feedback_output.passage_reference = self._finish_grounding(retry_quote, feedback_output, feedback_input)
+            
             logger.info(
                 f"Feedback generated successfully: is_correct={feedback_output.is_correct}"
             )
@@ -252,6 +305,47 @@ class ReadingFeedbackAgent:
             logger.error(f"Error generating feedback: {str(e)}", exc_info=True)
             raise Exception(f"Failed to generate feedback: {str(e)}")
     
+    async def _reask_evidence(self, chain_input: Dict[str, Any], invalid_quote: str) -> str:
+        """Ask the model once more for a verbatim quote (async)."""
+        logger.warning(f"passage_reference not found in passage, re-asking: {invalid_quote[:120]}")
+        try:
+            with tracer.span("evidence_reask", chain="evidence_reask"):
+                return await self.reask_chain.ainvoke({**chain_input, "invalid_quote": invalid_quote})
+        except Exception as e:
+            logger.error(f"Evidence re-ask failed: {str(e)}")
+            return ""
+    
+    def _reask_evidence_sync(self, chain_input: Dict[str, Any], invalid_quote: str) -> str:
+        """Ask the model once more for a verbatim quote (sync)."""
+        logger.warning(f"passage_reference not found in passage, re-asking: {invalid_quote[:120]}")
+        try:
+            with tracer.span("evidence_reask", chain="evidence_reask"):
+                return self.reask_chain.invoke({**chain_input, "invalid_quote": invalid_quote})
+        except Exception as e:
+            logger.error(f"Evidence re-ask failed: {str(e)}")
+            return ""
+    
+    def _finish_grounding(
+        self,
+        retry_quote: str,
+        feedback_output: FeedbackOutput,
+        feedback_input: FeedbackInput
+    ) -> str:
+        """
+        Verify the re-asked quote and pick the passage_reference to return.
+        
+        Falls back to "N/A" with low confidence rather than returning invented text.
+        """
+        retry_quote = (retry_quote or "").strip()
+        retry_check = grounding_verifier.verify(retry_quote, feedback_input.passage)
+        if retry_quote.upper() != "NONE" and retry_check.grounded and retry_check.outcome != "skipped":
+            grounding_verifier.record("reask_recovered")
+            return retry_check.quote
+        
+        grounding_verifier.record("reask_failed")
+        feedback_output.confidence = "low"
+        return "N/A"
+    
     def update_temperature(self, temperature: float) -> None:
         """
         Update the temperature parameter for the LLM.
@@ -9,11 +9,12 @@ import pickle
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS  # Вместо Chroma!
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
+from app.core.llm import create_embeddings
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
@@ -30,11 +31,13 @@ class PassageVectorStore:
         Args:
             persist_directory: Путь для сохранения векторной БД
         """
-        self.embeddings = OpenAIEmbeddings(
+        self.embeddings = create_embeddings(
             model="text-embedding-3-small",
             api_key=os.getenv("OPENAI_API_KEY")
         )
         self.persist_directory = persist_directory
+        # Загруженные FAISS индексы по passage_id (чтобы не читать с диска на каждый поиск)
+        self._indexes: Dict[str, FAISS] = {}
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=300,
             chunk_overlap=50,
@@ -89,6 +92,7 @@ class PassageVectorStore:
             # Сохраняем на диск
             save_path = os.path.join(self.persist_directory, passage_id)
             vectorstore.save_local(save_path)
+            self._indexes[passage_id] = vectorstore
             
             logger.info(f"Added passage '{passage_id}' with {len(chunks)} chunks to FAISS")
             
@@ -114,14 +118,7 @@ class PassageVectorStore:
             Список релевантных текстовых фрагментов
         """
         try:
-            save_path = os.path.join(self.persist_directory, passage_id)
-            
-            # Загружаем FAISS index
-            vectorstore = FAISS.load_local(
-                save_path,
-                embeddings=self.embeddings,
-                allow_dangerous_deserialization=True  # Нужно для FAISS
-            )
+            vectorstore = self._load_index(passage_id)
             
             # Поиск похожих документов
             docs = vectorstore.similarity_search(query, k=k)
@@ -137,6 +134,32 @@ class PassageVectorStore:
             logger.error(f"Error searching FAISS: {str(e)}")
             return []
     
+    def _load_index(self, passage_id: str) -> FAISS:
+        """Загрузить FAISS index passage с диска (один раз, дальше из памяти)"""
+        if passage_id not in self._indexes:
+            self._indexes[passage_id] = FAISS.load_local(
+                os.path.join(self.persist_directory, passage_id),
+                embeddings=self.embeddings,
+                allow_dangerous_deserialization=True  # Нужно для FAISS
+            )
+        return self._indexes[passage_id]
+    
+    def preload(self) -> int:
+        """
+        Загрузить все сохранённые индексы заранее (на старте сервиса)
+        
+        Returns:
+            Количество загруженных индексов
+        """
+        for passage_id in sorted(os.listdir(self.persist_directory)):
+            if os.path.isdir(os.path.join(self.persist_directory, passage_id)):
+                try:
+                    self._load_index(passage_id)
+                except Exception as e:
+                    logger.error(f"Error preloading FAISS index '{passage_id}': {str(e)}")
+        logger.info(f"Preloaded {len(self._indexes)} FAISS indexes")
+        return len(self._indexes)
+    
     def passage_exists(self, passage_id: str) -> bool:
         """
         Проверить существует ли passage в БД
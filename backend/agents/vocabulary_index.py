@@ -0,0 +1,215 @@
+"""
+Vocabulary Index для заранее рассчитанных объяснений слов
+Компактный индекс (хэш пассажа, фраза) -> объяснение для пассажей из backend/data
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DEFAULT_INDEX_PATH = DATA_DIR / "vocabulary" / "index.json"
+COMMON_WORDS_PATH = DATA_DIR / "vocabulary" / "common-words.txt"
+
+INDEX_VERSION = 1
+EXPLANATION_FIELDS = ("definition", "context_meaning", "example_sentence")
+
+_EDGE_PUNCTUATION = "\"'“”‘’.,;:!?()[]"
+_WORD_RE = re.compile(r"[A-Za-z]+(?:-[A-Za-z]+)*")
+# Суффиксы, типичные для академической лексики
+_ACADEMIC_SUFFIXES = (
+    "tion", "sion", "ment", "ity", "ence", "ance", "ous", "ive", "ism",
+    "ise", "ize", "ify", "ical", "ial", "ible", "able", "ally",
+)
+_INFLECTIONS = ("ing", "ed", "es", "s", "ly", "er", "d")
+
+
+def normalize_phrase(text: str) -> str:
+    """
+    Нормализация фразы для ключа кэша: регистр, пробелы и пунктуация по краям
+
+    "  Arctic   Amplification," -> "arctic amplification"
+    """
+    return re.sub(r"\s+", " ", text).strip().strip(_EDGE_PUNCTUATION).strip().lower()
+
+
+def passage_hash(passage: str) -> str:
+    """Короткий стабильный хэш пассажа (пробелы и переносы строк не влияют)"""
+    normalized = re.sub(r"\s+", " ", passage).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def load_common_words(path: Path = COMMON_WORDS_PATH) -> Set[str]:
+    """
+    Загрузка локального частотного списка (частые слова, которые не нужно объяснять)
+
+    Args:
+        path: Текстовый файл, слова через пробел/перенос строки, # - комментарий
+
+    Returns:
+        Множество слов в нижнем регистре
+    """
+    words: Set[str] = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith("#"):
+                words.update(w.lower() for w in line.split())
+    return words
+
+
+def _is_common(word: str, common_words: Set[str]) -> bool:
+    if word in common_words:
+        return True
+    for suffix in _INFLECTIONS:
+        if word.endswith(suffix) and word[:-len(suffix)] in common_words:
+            return True
+    return False
+
+
+def extract_candidates(
+    passage: str,
+    common_words: Set[str],
+    limit: int = 40,
+    min_length: int = 6
+) -> List[str]:
+    """
+    Выбор слов пассажа, которые студенты, скорее всего, выделят
+
+    Отбрасываются короткие и частые слова (по локальному списку) и имена
+    собственные (слова, которые в пассаже всегда с заглавной буквы).
+    Остальные ранжируются по длине и академическим суффиксам.
+
+    Args:
+        passage: Текст пассажа
+        common_words: Частые слова (load_common_words)
+        limit: Максимум слов на пассаж
+        min_length: Минимальная длина слова
+
+    Returns:
+        Слова в нижнем регистре, в порядке первого появления в пассаже
+    """
+    first_seen: Dict[str, int] = {}
+    lowercase_seen: Set[str] = set()
+    for position, match in enumerate(_WORD_RE.finditer(passage)):
+        token = match.group()
+        word = token.lower()
+        if token[0].islower():
+            lowercase_seen.add(word)
+        if word in first_seen or len(word) < min_length:
+            continue
+        parts = word.split("-")
+        if all(_is_common(part, common_words) or len(part) < min_length for part in parts):
+            continue
+        first_seen[word] = position
+
+    candidates = [w for w in first_seen if w in lowercase_seen]
+    scored = sorted(
+        candidates,
+        key=lambda w: (-(len(w) + (3 if w.endswith(_ACADEMIC_SUFFIXES) else 0)), first_seen[w])
+    )[:limit]
+    return sorted(scored, key=first_seen.__getitem__)
+
+
+class VocabularyIndex:
+    """
+    Компактный индекс объяснений: хэш пассажа -> нормализованная фраза -> объяснение
+
+    Файл хранит поля объяснения списком [definition, context_meaning, example_sentence];
+    в памяти это плоский словарь, поэтому поиск - один lookup в dict.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.passages: Dict[str, Dict[str, Any]] = {}
+        self._lookup: Dict[Tuple[str, str], List[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "VocabularyIndex":
+        """
+        Загрузка индекса (пустой индекс, если файла нет)
+
+        Args:
+            path: Путь к индексу (по умолчанию VOCABULARY_INDEX_PATH или data/vocabulary/index.json)
+        """
+        path = Path(path or os.getenv("VOCABULARY_INDEX_PATH", DEFAULT_INDEX_PATH))
+        index = cls(path)
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                for p_hash, entry in data.get("passages", {}).items():
+                    index._add_passage(p_hash, entry)
+                logger.info(f"Vocabulary index loaded: {len(index._lookup)} explanations, "
+                            f"{len(index.passages)} passages")
+            else:
+                logger.warning(f"Ignoring vocabulary index {path}: unsupported version")
+        return index
+
+    def get(self, p_hash: str, phrase: str) -> Optional[Dict[str, Any]]:
+        """Объяснение из индекса или None"""
+        fields = self._lookup.get((p_hash, phrase))
+        if fields is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        explanation = dict(zip(EXPLANATION_FIELDS, fields))
+        explanation["word"] = phrase
+        return explanation
+
+    def words_for(self, p_hash: str) -> Set[str]:
+        """Фразы, уже рассчитанные для пассажа"""
+        return set(self.passages.get(p_hash, {}).get("words", {}))
+
+    def add(self, p_hash: str, title: str, explanations: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Добавить объяснения для пассажа
+
+        Args:
+            p_hash: passage_hash(текст пассажа)
+            title: Название пассажа (для отладки)
+            explanations: нормализованная фраза -> объяснение
+        """
+        entry = self.passages.setdefault(p_hash, {"title": title, "words": {}})
+        words = {
+            phrase: [str(explanation.get(field, "")) for field in EXPLANATION_FIELDS]
+            for phrase, explanation in explanations.items()
+        }
+        self._add_passage(p_hash, {"title": entry["title"] or title, "words": words})
+
+    def save(self, path: Optional[Path] = None) -> None:
+        """Атомарная запись (временный файл + rename), безопасно прерывать в любой момент"""
+        path = Path(path or self.path or DEFAULT_INDEX_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": INDEX_VERSION, "passages": self.passages},
+                f, ensure_ascii=False, separators=(",", ":")
+            )
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "passages": len(self.passages),
+            "explanations": len(self._lookup),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def __len__(self) -> int:
+        return len(self._lookup)
+
+    def _add_passage(self, p_hash: str, entry: Dict[str, Any]) -> None:
+        stored = self.passages.setdefault(p_hash, {"title": entry.get("title", ""), "words": {}})
+        for phrase, fields in entry.get("words", {}).items():
+            stored["words"][phrase] = fields
+            self._lookup[(p_hash, phrase)] = fields
+
@@ -12,32 +12,49 @@ from pathlib import Path
 load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".pip")
 
 import os
+import sys
+import time
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, ValidationError
 import uvicorn
 
+# Shared helpers (e.g. app.services.grounding) live in the top-level app package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 from agents.reading_feedback_agent import (
     ReadingFeedbackAgent,
     FeedbackInput,
     FeedbackOutput,
     create_reading_feedback_agent
 )
+from agents.explain_agent import ExplainAgent
+from app.core.http_client import aclose_http_clients, http_client_stats
+from app.core.rate_limiter import BATCH, llm_priority
+from app.services.single_flight import single_flight_stats
+from app.services.grounding import grounding_verifier
+from app.core.token_usage import token_ledger
+from app.core.prompt_registry import prompt_registry
+from app.core.metrics import CONTENT_TYPE, LoopLagMonitor, MetricsMiddleware, register_cache, render_metrics
+from app.core.log_pipeline import configure_logging, log_stats
+from app.core.disconnect import ClientDisconnected, run_until_disconnect
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (queue-backed, see app/core/log_pipeline.py)
+configure_logging("feedback")
 logger = logging.getLogger(__name__)
 
-# Global agent instance
+# Global agent instances
 agent: ReadingFeedbackAgent = None
+explain_agent: ExplainAgent = None
+vector_store = None     # PassageVectorStore, only when persisted FAISS indexes exist
+loop_lag_monitor = LoopLagMonitor()
+
+FAISS_DB_DIR = os.getenv("FAISS_DB_DIR", "./data/faiss_db")
 
 
 @asynccontextmanager
@@ -47,7 +64,11 @@ async def lifespan(app: FastAPI):
     Handles startup and shutdown events.
     """
     # Startup
-    global agent
+    global agent, explain_agent, vector_store
+    loop_lag_monitor.start()
+    started = time.perf_counter()
+    # Read the prompt files now rather than on the first request
+    prompt_registry.preload()
     try:
         logger.info("Initializing Reading Feedback Agent...")
         agent = create_reading_feedback_agent(
@@ -62,10 +83,29 @@ async def lifespan(app: FastAPI):
         # Do not crash the app; allow non-AI endpoints to work
         agent = None
     
+    try:
+        explain_agent = ExplainAgent()
+    except Exception as e:
+        logger.error(f"Failed to initialize explain agent: {str(e)}")
+        explain_agent = None
+    
+    # FAISS (and LangChain's community package) is only imported when there are indexes to load
+    if os.path.isdir(FAISS_DB_DIR) and os.listdir(FAISS_DB_DIR):
+        try:
+            from agents.vector_store import PassageVectorStore
+            vector_store = PassageVectorStore(persist_directory=FAISS_DB_DIR)
+            vector_store.preload()
+        except Exception as e:
+            logger.error(f"Failed to preload vector store: {str(e)}")
+            vector_store = None
+    
+    logger.info(f"[STARTUP] Ready in {(time.perf_counter() - started) * 1000:.0f} ms")
     yield
     
     # Shutdown
     logger.info("Shutting down Reading Feedback Service...")
+    await loop_lag_monitor.stop()
+    await aclose_http_clients()
 
 
 # Initialize FastAPI app
@@ -86,6 +126,30 @@ app.add_middleware(
 )
 
 
+# Request count/latency per route for /metrics
+app.add_middleware(MetricsMiddleware, app_name="feedback")
+
+
+def _explain_cache_stats():
+    if explain_agent is None:
+        return 0, 0
+    return explain_agent.cache.hits, explain_agent.cache.misses
+
+
+def _vocabulary_stats():
+    if explain_agent is None:
+        return 0, 0
+    return explain_agent.vocabulary.hits, explain_agent.vocabulary.misses
+
+
+register_cache("explain", _explain_cache_stats)
+register_cache("vocabulary_index", _vocabulary_stats)
+register_cache("single_flight", lambda: (
+    sum(s.get("coalesced", 0) for s in single_flight_stats().values()),
+    sum(s.get("upstream", 0) for s in single_flight_stats().values()),
+))
+
+
 # Health check models
 class HealthResponse(BaseModel):
     """Health check response model."""
@@ -101,6 +165,28 @@ class ErrorResponse(BaseModel):
     status_code: int
 
 
+# Explain models
+class ExplainRequest(BaseModel):
+    """Explain one word or phrase from a passage."""
+    passage: str
+    selected_text: str
+
+
+class ExplainBatchRequest(BaseModel):
+    """Explain several words or phrases from the same passage."""
+    passage: str
+    selected_texts: List[str]
+
+
+class ExplainResponse(BaseModel):
+    """Explanation of a word or phrase."""
+    word: str
+    definition: str
+    context_meaning: str
+    example_sentence: str
+    error: Optional[str] = None
+
+
 # API Endpoints
 
 @app.get("/", response_model=Dict[str, Any])
@@ -113,6 +199,8 @@ async def root():
         "endpoints": {
             "health": "/health",
             "feedback": "/api/feedback",
+            "explain": "/api/explain",
+            "explain_batch": "/api/explain/batch",
             "docs": "/docs"
         }
     }
@@ -132,6 +220,48 @@ async def health_check():
     )
 
 
+@app.get("/health/http", response_model=Dict[str, Any])
+async def http_health():
+    """Connection reuse stats of the shared LLM/embeddings HTTP clients."""
+    return http_client_stats()
+
+
+@app.get("/health/single-flight", response_model=Dict[str, Any])
+async def single_flight_health():
+    """Counters for coalesced identical in-flight LLM calls."""
+    return single_flight_stats()
+
+
+@app.get("/health/grounding", response_model=Dict[str, Any])
+async def grounding_health():
+    """Evidence quote checks: exact, snapped, missing, and re-asks recovered or failed."""
+    return grounding_verifier.stats()
+
+
+@app.get("/health/tokens", response_model=Dict[str, Any])
+async def token_usage():
+    """Real token usage and estimated cost per chain."""
+    return token_ledger.snapshot()
+
+
+@app.get("/health/prompts", response_model=Dict[str, Any])
+async def prompts_health():
+    """Version and token count of the feedback and explain prompts."""
+    return prompt_registry.stats()
+
+
+@app.get("/health/logging", response_model=Dict[str, Any])
+async def logging_health():
+    """Log records, drops by reason and the logging cost per record."""
+    return log_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
 @app.post(
     "/api/feedback",
     response_model=FeedbackOutput,
@@ -141,7 +271,7 @@ async def health_check():
         500: {"model": ErrorResponse, "description": "Internal server error"},
     }
 )
-async def generate_feedback(feedback_input: FeedbackInput):
+async def generate_feedback(feedback_input: FeedbackInput, request: Request):
     """
     Generate intelligent feedback for an IELTS Reading answer.
     
@@ -185,12 +315,16 @@ async def generate_feedback(feedback_input: FeedbackInput):
                 detail="Feedback agent is not initialized. Please try again later."
             )
         
-        # Generate feedback
-        result = await agent.generate_feedback(feedback_input)
+        # Generate feedback (cancelled if the client disconnects)
+        result = await run_until_disconnect(
+            request, agent.generate_feedback(feedback_input), "feedback", "/api/feedback")
         
         logger.info("Feedback generated successfully")
         return result
         
+    except ClientDisconnected:
+        raise
+    
     except ValidationError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(
@@ -207,7 +341,7 @@ async def generate_feedback(feedback_input: FeedbackInput):
 
 
 @app.post("/api/feedback/batch", response_model=Dict[str, Any])
-async def generate_feedback_batch(feedback_inputs: list[FeedbackInput]):
+async def generate_feedback_batch(feedback_inputs: list[FeedbackInput], request: Request):
     """
     Generate feedback for multiple questions in batch.
     
@@ -241,25 +375,31 @@ async def generate_feedback_batch(feedback_inputs: list[FeedbackInput]):
         
         logger.info(f"Processing batch of {len(feedback_inputs)} questions")
         
-        results = []
-        failed = 0
+        async def process_batch():
+            results = []
+            failed = 0
+            for idx, feedback_input in enumerate(feedback_inputs):
+                try:
+                    # Batch grading yields to interactive requests in the rate limiter
+                    with llm_priority(BATCH):
+                        result = await agent.generate_feedback(feedback_input)
+                    results.append({
+                        "index": idx,
+                        "status": "success",
+                        "feedback": result.dict()
+                    })
+                except Exception as e:
+                    logger.error(f"Failed to process question {idx}: {str(e)}")
+                    results.append({
+                        "index": idx,
+                        "status": "error",
+                        "error": str(e)
+                    })
+                    failed += 1
+            return results, failed
         
-        for idx, feedback_input in enumerate(feedback_inputs):
-            try:
-                result = await agent.generate_feedback(feedback_input)
-                results.append({
-                    "index": idx,
-                    "status": "success",
-                    "feedback": result.dict()
-                })
-            except Exception as e:
-                logger.error(f"Failed to process question {idx}: {str(e)}")
-                results.append({
-                    "index": idx,
-                    "status": "error",
-                    "error": str(e)
-                })
-                failed += 1
+        # The remaining questions are not graded once the client has gone away
+        results, failed = await run_until_disconnect(request, process_batch(), "feedback", "/api/feedback/batch")
         
         logger.info(f"Batch processing complete: {len(results) - failed} successful, {failed} failed")
         
@@ -270,7 +410,7 @@ async def generate_feedback_batch(feedback_inputs: list[FeedbackInput]):
             "failed": failed
         }
         
-    except HTTPException:
+    except (HTTPException, ClientDisconnected):
         raise
     except Exception as e:
         logger.error(f"Batch processing error: {str(e)}", exc_info=True)
@@ -280,6 +420,72 @@ async def generate_feedback_batch(feedback_inputs: list[FeedbackInput]):
         )
 
 
+def _require_explain_agent() -> ExplainAgent:
+    if explain_agent is None:
+        logger.error("Explain agent not initialized")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Explain agent is not initialized. Please try again later."
+        )
+    return explain_agent
+
+
+@app.post("/api/explain", response_model=ExplainResponse)
+async def explain_text(explain_request: ExplainRequest, request: Request):
+    """
+    Explain a word or phrase from a passage.
+    
+    Explanations are cached per (passage, normalized phrase), so a popular word
+    in a shared passage is explained once for all students.
+    """
+    if not explain_request.passage.strip() or not explain_request.selected_text.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="passage and selected_text must be non-empty"
+        )
+    work = _require_explain_agent().aexplain_text(explain_request.passage, explain_request.selected_text)
+    return await run_until_disconnect(request, work, "feedback", "/api/explain")
+
+
+@app.post("/api/explain/batch", response_model=Dict[str, Any])
+async def explain_text_batch(explain_request: ExplainBatchRequest, request: Request):
+    """
+    Explain several words or phrases from the same passage.
+    
+    Cached phrases are answered without an LLM call; the rest are explained
+    together in one structured call (the passage is sent once).
+    
+    **Note:** Maximum batch size is 20 phrases.
+    """
+    if len(explain_request.selected_texts) > 20:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch size exceeds maximum of 20 phrases"
+        )
+    if not explain_request.passage.strip() or not explain_request.selected_texts:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="passage and selected_texts must be non-empty"
+        )
+    
+    agent_instance = _require_explain_agent()
+    # Cancels the per-batch LLM calls (gathered) if the client disconnects
+    explanations = await run_until_disconnect(
+        request, agent_instance.aexplain_many(explain_request.passage, explain_request.selected_texts),
+        "feedback", "/api/explain/batch")
+    return {
+        "explanations": explanations,
+        "total": len(explanations),
+        "cache": agent_instance.cache_stats()
+    }
+
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request, exc):
+    """The client is gone; 499 only shows up in the access log and metrics."""
+    return Response(status_code=499)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler for unhandled errors."""
@@ -0,0 +1,175 @@
+"""
+Offline vocabulary precomputation for the bundled reading passages.
+
+Extracts candidate vocabulary from every passage in data/reading-tests/*.json and
+data/reading-passages.json (local common-word list, no network), explains it with
+ExplainAgent.aexplain_many and stores the results in the compact vocabulary index
+that ExplainAgent consults before calling the LLM.
+
+The index file doubles as the checkpoint: it is rewritten atomically after every
+passage, and a re-run only explains words that are not in it yet.
+
+Usage (from the backend directory):
+    python precompute_vocabulary.py                 # all passages, 4 concurrent
+    python precompute_vocabulary.py --dry-run       # list candidates only, no LLM
+    python precompute_vocabulary.py --concurrency 8 --per-passage 60
+"""
+
+# Load environment variables FIRST, before any other imports
+from dotenv import load_dotenv
+load_dotenv()
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+# Shared helpers (app.core, app.services) live in the top-level app package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.http_client import aclose_http_clients
+from app.core.rate_limiter import BACKGROUND, llm_priority
+from agents.explain_agent import ExplainAgent
+from agents.vocabulary_index import (
+    DATA_DIR,
+    DEFAULT_INDEX_PATH,
+    VocabularyIndex,
+    extract_candidates,
+    load_common_words,
+    passage_hash,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("precompute_vocabulary")
+
+
+def _load_json(path: Path):
+    """JSON with a UTF-8 or UTF-16 byte order mark (some test files were saved from PowerShell)."""
+    raw = path.read_bytes()
+    if raw.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return json.loads(raw.decode("utf-16"))
+    return json.loads(raw.decode("utf-8-sig"))
+
+
+def passage_text(passage: Dict) -> str:
+    """Passage text as shown to students: paragraphs separated by blank lines."""
+    return "\n\n".join(p.get("text", "") for p in passage.get("paragraphs", []))
+
+
+def load_corpus(data_dir: Path = DATA_DIR) -> List[Tuple[str, str, str]]:
+    """
+    Collect unique passages from the bundled data.
+
+    Returns:
+        List of (passage_hash, title, text), duplicates removed
+    """
+    sources: List[Path] = sorted((data_dir / "reading-tests").glob("*.json"))
+    sources.append(data_dir / "reading-passages.json")
+
+    corpus: List[Tuple[str, str, str]] = []
+    seen = set()
+    for path in sources:
+        try:
+            data = _load_json(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path.name}: {e}")
+            continue
+        passages: Iterable[Dict] = data.get("passages", []) if isinstance(data, dict) else data
+        for passage in passages:
+            text = passage_text(passage)
+            p_hash = passage_hash(text)
+            if text.strip() and p_hash not in seen:
+                seen.add(p_hash)
+                corpus.append((p_hash, passage.get("title", ""), text))
+    return corpus
+
+
+async def precompute(
+    agent: ExplainAgent,
+    index: VocabularyIndex,
+    corpus: List[Tuple[str, str, str]],
+    candidates: Dict[str, List[str]],
+    concurrency: int
+) -> Dict[str, int]:
+    """Explain missing candidates, at most `concurrency` passages at a time, saving after each."""
+    semaphore = asyncio.Semaphore(concurrency)
+    totals = {"passages": 0, "explained": 0, "failed": 0}
+
+    async def run_one(p_hash: str, title: str, text: str):
+        missing = [w for w in candidates[p_hash] if w not in index.words_for(p_hash)]
+        if not missing:
+            return
+        async with semaphore:
+            explanations = await agent.aexplain_many(text, missing)
+        done = {
+            word: explanation
+            for word, explanation in zip(missing, explanations)
+            if not explanation.get("error")
+        }
+        index.add(p_hash, title, done)
+        index.save()  # checkpoint
+        totals["passages"] += 1
+        totals["explained"] += len(done)
+        totals["failed"] += len(missing) - len(done)
+        logger.info(f"[{title}] {len(done)}/{len(missing)} explained ({len(index)} in index)")
+
+    try:
+        # Lowest priority: never competes with student-facing calls in the rate limiter
+        with llm_priority(BACKGROUND):
+            await asyncio.gather(*[run_one(*item) for item in corpus])
+    finally:
+        await aclose_http_clients()
+    return totals
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Precompute vocabulary explanations for bundled passages")
+    parser.add_argument("--output", type=Path, default=DEFAULT_INDEX_PATH, help="index file (also the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="passages explained in parallel")
+    parser.add_argument("--per-passage", type=int, default=40, help="max candidate words per passage")
+    parser.add_argument("--dry-run", action="store_true", help="print candidates without calling the LLM")
+    args = parser.parse_args()
+
+    common_words = load_common_words()
+    corpus = load_corpus()
+    candidates = {
+        p_hash: extract_candidates(text, common_words, limit=args.per_passage)
+        for p_hash, _, text in corpus
+    }
+    total = sum(len(words) for words in candidates.values())
+    logger.info(f"{len(corpus)} passages, {total} candidate words")
+
+    index = VocabularyIndex.load(args.output)
+    pending = sum(
+        len([w for w in candidates[p_hash] if w not in index.words_for(p_hash)])
+        for p_hash in candidates
+    )
+    logger.info(f"{total - pending} already in {args.output}, {pending} to explain")
+
+    if args.dry_run:
+        for p_hash, title, _ in corpus:
+            print(f"{title}: {', '.join(candidates[p_hash])}")
+        return 0
+    if not pending:
+        return 0
+
+    # Separate, empty index for the agent: every candidate here is a miss anyway
+    agent = ExplainAgent(vocabulary_index=VocabularyIndex(path=None))
+    started = time.perf_counter()
+    totals = asyncio.run(precompute(agent, index, corpus, candidates, args.concurrency))
+    logger.info(
+        f"Done in {time.perf_counter() - started:.1f}s: {totals['explained']} explained, "
+        f"{totals['failed']} failed across {totals['passages']} passages; re-run to retry failures"
+    )
+    return 0 if not totals["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
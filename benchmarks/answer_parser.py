@@ -0,0 +1,50 @@
+"""
+Benchmark for parse_student_answers: answers parsed per second for 3-answer and
+40-answer submissions, against the old four-regex parser.
+
+The answer sheets are generated, and the old parser is kept, in tests/answer_sheets.py
+(shared with the randomized equivalence tests).
+
+Run from the repo root:
+    python benchmarks/answer_parser.py
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.answer_parser import parse_student_answers
+from tests.answer_sheets import legacy_parse, random_sheet, render
+
+
+def throughput(parse, messages, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for m in messages:
+            parse(m)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def main():
+    rng = random.Random(3)
+    short = [render(random_sheet(rng, 3, allow_short=False), rng) for _ in range(2000)]
+    full = [render(random_sheet(rng, 40, allow_short=True), rng) for _ in range(500)]
+    for label, parse, messages, per in (
+        ("legacy, 3 answers", legacy_parse, short, 3),
+        ("tokenizer, 3 answers", parse_student_answers, short, 3),
+        ("tokenizer, 40 answers", parse_student_answers, full, 40),
+    ):
+        rate = throughput(parse, messages)
+        print(f"{label:24} {rate:10,.0f} msg/s  {rate * per:12,.0f} answers/s")
+    parsed_by_legacy = sum(len(legacy_parse(m)) == 40 for m in full)
+    print(f"40-answer sheets fully parsed: legacy {parsed_by_legacy}/{len(full)}, "
+          f"tokenizer {sum(len(parse_student_answers(m)) == 40 for m in full)}/{len(full)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Benchmark: end-to-end load test of POST /api/chat/message (app/main.py).
+
+Starts one uvicorn worker of the tutor app in a subprocess with the fake LLM
+(LLM_PROVIDER=fake, see app/core/fake_llm.py) and drives virtual students through
+multi-turn scenarios, each student sending the full conversation every turn like
+the frontend does:
+
+  practice   greet, ask for practice, pick a level, submit answers, explain the
+             reasoning (Socratic reply), skip, ask for the full breakdown
+  chitchat   greet, then general strategy questions
+  hint       get a practice passage, then ask for hints on dropped questions
+
+Reports throughput, p50/p95/p99 latency (overall and per step) and the server's
+event-loop lag, and writes everything as JSON (benchmarks/results/ by default) so
+runs can be compared across commits.
+
+Run from the repo root:
+    python benchmarks/chat_load.py [--users 20] [--duration 60] [--latency lognormal:800:0.4]
+    python benchmarks/chat_load.py --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+
+@dataclass
+class Turn:
+    step: str
+    message: str
+    dropped_question_id: Optional[str] = None
+
+
+SCENARIOS: Dict[str, List[Turn]] = {
+    "practice": [
+        Turn("greet", "Hi!"),
+        Turn("request_practice", "Let's do a practice battle"),
+        Turn("choose_level", "Intermediate"),
+        Turn("submit_answers", "1. B\n2. 2,000\n3. NOT GIVEN"),
+        Turn("socratic_reply", "I thought the second paragraph said the experts did not agree about it"),
+        Turn("skip", "skip"),
+        Turn("breakdown", "Can you explain all the answers?"),
+    ],
+    "chitchat": [
+        Turn("greet", "Hello"),
+        Turn("general_question", "How should I manage my time in the reading test?"),
+        Turn("general_question", "What is the difference between FALSE and NOT GIVEN?"),
+        Turn("chitchat", "Thanks, that helps a lot"),
+    ],
+    "hint": [
+        Turn("request_practice", "Give me an advanced practice battle"),
+        Turn("choose_level", "3"),
+        Turn("hint", "Can I get a hint for this one?", dropped_question_id="q1"),
+        Turn("hint", "Another clue please", dropped_question_id="q3"),
+    ],
+}
+
+
+# ---------------------------------------------------------------------------
+# Server side (--serve): the app plus an event-loop lag probe
+# ---------------------------------------------------------------------------
+
+def serve(port: int) -> None:
+    import uvicorn
+    from app.core.metrics import LoopLagMonitor
+    from app.main import app
+
+    # A finer probe than the app's own (LOOP_LAG_INTERVAL), keeping every sample
+    monitor = LoopLagMonitor(interval=0.05, keep_samples=True)
+    app.add_api_route("/__bench/loop-lag", lambda: summarize([lag * 1000 for lag in monitor.samples]),
+                      methods=["GET"])
+    app.add_api_route("/__bench/reset", lambda: monitor.samples.clear(), methods=["POST"])
+
+    async def main():
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        monitor.start()
+        try:
+            await server.serve()
+        finally:
+            await monitor.stop()
+
+    asyncio.run(main())
+
+
+# ---------------------------------------------------------------------------
+# Client side
+# ---------------------------------------------------------------------------
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.mean(ordered), 2) if ordered else 0.0,
+        "p50": round(percentile(ordered, 0.50), 2),
+        "p95": round(percentile(ordered, 0.95), 2),
+        "p99": round(percentile(ordered, 0.99), 2),
+        "max": round(ordered[-1], 2) if ordered else 0.0,
+    }
+
+
+class LoadRun:
+    def __init__(self, base_url: str, args: argparse.Namespace):
+        self.base_url = base_url
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.records: List[Dict] = []
+        self.errors: Dict[str, int] = {}
+
+    async def student(self, client, user: int, deadline: float) -> None:
+        rng = random.Random(self.args.seed + user)
+        await asyncio.sleep(rng.uniform(0, self.args.ramp))
+        conversation = 0
+        while time.monotonic() < deadline:
+            scenario = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+            session_id = f"load-{user}-{conversation}"
+            conversation += 1
+            messages: List[Dict[str, str]] = []
+            for turn in SCENARIOS[scenario]:
+                if time.monotonic() >= deadline:
+                    return
+                messages.append({"role": "user", "content": turn.message})
+                payload = {"session_id": session_id, "messages": messages,
+                           "dropped_question_id": turn.dropped_question_id}
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f"{self.base_url}/api/chat/message", json=payload)
+                    status = response.status_code
+                except Exception as e:
+                    status = type(e).__name__
+                latency = (time.perf_counter() - started) * 1000
+                self.records.append({"scenario": scenario, "step": turn.step, "ms": latency, "ok": status == 200})
+                if status != 200:
+                    key = f"{turn.step}:{status}"
+                    self.errors[key] = self.errors.get(key, 0) + 1
+                    break
+                messages.append({"role": "assistant", "content": response.json()["content"]})
+                await asyncio.sleep(rng.uniform(0, self.args.think))
+
+    async def run(self) -> Dict:
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.args.users, max_keepalive_connections=self.args.users)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            await client.post(f"{self.base_url}/__bench/reset")
+            started = time.monotonic()
+            deadline = started + self.args.duration
+            await asyncio.gather(*[self.student(client, user, deadline) for user in range(self.args.users)])
+            elapsed = time.monotonic() - started
+            loop_lag = (await client.get(f"{self.base_url}/__bench/loop-lag")).json()
+        return self.report(elapsed, loop_lag)
+
+    def report(self, elapsed: float, loop_lag: Dict) -> Dict:
+        ok = [r for r in self.records if r["ok"]]
+        steps: Dict[str, List[float]] = {}
+        for record in ok:
+            steps.setdefault(record["step"], []).append(record["ms"])
+        return {
+            "benchmark": "chat_load",
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {k: v for k, v in vars(self.args).items() if k not in ("compare", "serve", "output")},
+            "duration_s": round(elapsed, 2),
+            "turns": len(self.records),
+            "errors": sum(self.errors.values()),
+            "error_breakdown": self.errors,
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": summarize([r["ms"] for r in ok]),
+            "steps_ms": {step: summarize(values) for step, values in sorted(steps.items())},
+            "loop_lag_ms": loop_lag,
+        }
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r} (known: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": "fake",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-fake-load-test"),
+        "FAKE_LLM_LATENCY": args.latency,
+        "FAKE_LLM_MS_PER_TOKEN": str(args.ms_per_token),
+    }
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--serve", "--port", str(args.port)],
+        cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_until_up(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise SystemExit(f"Server exited with code {process.returncode} (see --server-log)")
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit("Server did not start in time")
+
+
+def print_report(result: Dict) -> None:
+    lat, lag = result["latency_ms"], result["loop_lag_ms"]
+    print(f"commit {result['commit']}  users {result['config']['users']}  {result['duration_s']}s  "
+          f"fake latency {result['config']['latency']}")
+    print(f"turns {result['turns']}  errors {result['errors']}  throughput {result['throughput_rps']} turns/s")
+    print(f"latency ms   p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"loop lag ms  p50 {lag['p50']}  p95 {lag['p95']}  p99 {lag['p99']}  max {lag['max']}")
+    print(f"{'step':18} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for step, s in result["steps_ms"].items():
+        print(f"{step:18} {s['count']:6d} {s['p50']:8.1f} {s['p95']:8.1f} {s['p99']:8.1f}")
+    for key, count in result["error_breakdown"].items():
+        print(f"  error {key}: {count}")
+
+
+def compare(old_path: str, new_path: str) -> None:
+    old, new = (json.loads(Path(p).read_text()) for p in (old_path, new_path))
+    rows = [("throughput_rps", old["throughput_rps"], new["throughput_rps"])]
+    for section in ("latency_ms", "loop_lag_ms"):
+        for q in ("p50", "p95", "p99"):
+            rows.append((f"{section}.{q}", old[section][q], new[section][q]))
+    print(f"{'metric':22} {old['commit']:>10} {new['commit']:>10} {'change':>8}")
+    for name, before, after in rows:
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        print(f"{name:22} {before:10.2f} {after:10.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual students")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load")
+    parser.add_argument("--ramp", type=float, default=5, help="spread user start over N seconds")
+    parser.add_argument("--think", type=float, default=1.0, help="max think time between turns, seconds")
+    parser.add_argument("--mix", default="practice=6,chitchat=3,hint=1", help="scenario weights")
+    parser.add_argument("--latency", default="lognormal:800:0.4", help="FAKE_LLM_LATENCY for the server")
+    parser.add_argument("--ms-per-token", type=float, default=5, help="FAKE_LLM_MS_PER_TOKEN for the server")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="use an already running server (must be started with --serve)")
+    parser.add_argument("--server-log", help="write the server output to this file")
+    parser.add_argument("--output", help="results JSON path (default benchmarks/results/chat_load-<commit>-<time>.json)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    process = None if args.url else start_server(args)
+    try:
+        if process is not None:
+            asyncio.run(wait_until_up(base_url, process))
+        result = asyncio.run(LoadRun(base_url, args).run())
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print_report(result)
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"chat_load-{result['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"results written to {output}")
+
+    if result["turns"] and result["errors"] / result["turns"] > args.max_error_rate:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Microbenchmark: EmotionDetector throughput (messages per second).
+
+Compares the previous implementation (one uncompiled re.search per pattern) with the
+literal-prefiltered scanner, checks both give identical results, and times detect_many.
+
+Run from the repo root:
+    python benchmarks/emotion_detector.py
+"""
+
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.emotion_detector import EmotionDetector, UserEmotion
+
+SAMPLE_MESSAGES = [
+    "hello",
+    "1-A, 2-B, 3-C",
+    "I don't understand this at all???",
+    "ugh this is so hard, I'm so frustrated",
+    "my exam is tomorrow and I'm really nervous",
+    "I'm tired, been studying for hours",
+    "got it! bring it on",
+    "let's go, show me another one",
+    "Can you explain why Q2 is FALSE and not NOT GIVEN?",
+    "I think the passage says the project began in 2018 because of the conference",
+    "THIS IS IMPOSSIBLE!!!",
+    "maybe a bit confused about matching headings",
+    "skip",
+    "what is the difference between false and not given",
+    "I have a problem with timing, I'm always running out of time",
+]
+
+
+def legacy_detect(detector: EmotionDetector, message: str):
+    """The pre-scanner implementation, kept here as the baseline."""
+    message_lower = message.lower()
+    emotion_scores = {}
+    for emotion, patterns in detector.EMOTION_PATTERNS.items():
+        score = sum(1 for p in patterns if re.search(p, message_lower, re.IGNORECASE))
+        if score > 0:
+            emotion_scores[emotion] = score
+    if not emotion_scores:
+        return UserEmotion.NEUTRAL, 0.5
+    dominant_emotion = max(emotion_scores, key=emotion_scores.get)
+    intensity = 0.5
+    for marker in detector.EMOTION_INTENSITY_MARKERS["high"]:
+        if re.search(marker, message_lower):
+            intensity = min(1.0, intensity + 0.2)
+    for marker in detector.EMOTION_INTENSITY_MARKERS["low"]:
+        if re.search(marker, message_lower):
+            intensity = max(0.1, intensity - 0.15)
+    if message.count("!") > 2:
+        intensity = min(1.0, intensity + 0.1)
+    if sum(1 for c in message if c.isupper()) / max(len(message), 1) > 0.5:
+        intensity = min(1.0, intensity + 0.15)
+    return dominant_emotion, round(intensity, 2)
+
+
+def build_corpus(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        # Mix single messages with longer multi-sentence ones
+        parts = rng.sample(SAMPLE_MESSAGES, rng.randint(1, 3))
+        corpus.append(" ".join(parts))
+    return corpus
+
+
+def throughput(fn, corpus, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(corpus)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best
+
+
+def main():
+    detector = EmotionDetector()
+    corpus = build_corpus(5000)
+
+    mismatches = [m for m in corpus if legacy_detect(detector, m) != detector.detect(m)]
+    print(f"Equivalence check: {len(corpus) - len(mismatches)}/{len(corpus)} identical")
+    for m in mismatches[:5]:
+        print(f"  MISMATCH {m!r}: {legacy_detect(detector, m)} vs {detector.detect(m)}")
+
+    before = throughput(lambda c: [legacy_detect(detector, m) for m in c], corpus)
+    after = throughput(lambda c: [detector.detect(m) for m in c], corpus)
+    batch = throughput(detector.detect_many, corpus)
+
+    print(f"{'legacy re.search loop':28} {before:12,.0f} msg/s")
+    print(f"{'prefiltered detect()':28} {after:12,.0f} msg/s  ({after / before:.1f}x)")
+    print(f"{'detect_many()':28} {batch:12,.0f} msg/s  ({batch / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: tail latency of a short chain with and without hedged requests.
+
+Runs against the local OpenAI-compatible stub (benchmarks/openai_stub.py) with an
+injected long tail: most calls are fast, a few stall. Scenarios:
+
+  no hedge          one request per call (what the router/hint chains did)
+  hedged            app.services.hedging.Hedger - a second request past the p95
+  hedged+deadline   hedged, inside a tight llm_deadline(); misses count as fallbacks
+
+Only the stdlib is needed (requests go through urllib in worker threads).
+
+Run from the repo root:
+    python benchmarks/hedging.py [--calls 400] [--concurrency 8] [--tail-rate 0.08]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.deadline import llm_deadline
+from app.services.hedging import ChainSLO, DeadlineExceeded, Hedger
+from benchmarks.openai_stub import StubConfig, run_stub
+
+BODY = json.dumps({"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hello"}]}).encode()
+
+
+def post(base_url: str) -> bytes:
+    request = urllib.request.Request(
+        f"{base_url}/chat/completions", data=BODY, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+async def run(call, calls: int, concurrency: int):
+    """Returns (latencies ms, deadline misses)."""
+    latencies, misses = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal misses
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call()
+            except DeadlineExceeded:
+                misses += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*[one() for _ in range(calls)])
+    return latencies, misses
+
+
+def percentile(ordered, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def main_async(calls: int, concurrency: int, tail_rate: float, fast: float, slow: float, deadline: float):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency * 3))
+    rng = random.Random(7)
+    config = StubConfig(latency=lambda: slow if rng.random() < tail_rate else fast * (0.8 + 0.4 * rng.random()))
+
+    with run_stub(config=config) as base_url:
+        send = lambda: asyncio.to_thread(post, base_url)
+        slo = ChainSLO(hedge_after=fast * 4, budget=slow * 3, hedge_budget_ratio=0.15)
+        results = []
+
+        before = config.requests
+        latencies, misses = await run(send, calls, concurrency)
+        results.append(("no hedge", latencies, misses, config.requests - before, None))
+
+        hedger = Hedger({"router": slo})
+        await run(lambda: hedger.call("router", send), 50, concurrency)  # learn the p95
+        before = config.requests
+        warm = dict(hedger.stats()["router"])
+        latencies, misses = await run(lambda: hedger.call("router", send), calls, concurrency)
+        stats = hedger.stats()["router"]
+        stats["hedge_rate"] = round((stats.get("hedged", 0) - warm.get("hedged", 0)) / calls, 3)
+        results.append(("hedged", latencies, misses, config.requests - before, stats))
+
+        async def with_deadline():
+            with llm_deadline(deadline):
+                return await hedger.call("router", send)
+
+        before = config.requests
+        latencies, misses = await run(with_deadline, calls, concurrency)
+        results.append(("hedged+deadline", latencies, misses, config.requests - before, None))
+
+    print(f"{calls} calls, concurrency {concurrency}, tail {tail_rate:.0%} at {slow * 1000:.0f} ms, "
+          f"fast ~{fast * 1000:.0f} ms, deadline {deadline * 1000:.0f} ms")
+    print(f"{'scenario':16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'requests':>9} {'fallbacks':>10}")
+    for name, latencies, misses, requests, _ in results:
+        ordered = sorted(latencies)
+        print(f"{name:16} {statistics.median(ordered):8.1f} {percentile(ordered, 0.95):8.1f} "
+              f"{percentile(ordered, 0.99):8.1f} {ordered[-1]:8.1f} {requests:9d} {misses:10d}")
+    print(f"hedger stats (hedged run): {results[1][4]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tail-rate", type=float, default=0.08)
+    parser.add_argument("--fast", type=float, default=0.05, help="typical latency, seconds")
+    parser.add_argument("--slow", type=float, default=1.0, help="tail latency, seconds")
+    parser.add_argument("--deadline", type=float, default=0.5, help="turn deadline, seconds")
+    args = parser.parse_args()
+    asyncio.run(main_async(args.calls, args.concurrency, args.tail_rate, args.fast, args.slow, args.deadline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark: per-call overhead of the shared LLM HTTP client vs per-client pools.
+
+Runs against the local OpenAI-compatible stub (benchmarks/openai_stub.py), so the
+numbers are pure client/connection overhead. Scenarios:
+
+  fresh client per call   a new connection (TCP, and TLS in production) every call
+  one pool per LLM object what the five separate ChatOpenAI/OpenAIEmbeddings objects did
+  shared pool             app.core.http_client (one pool per process)
+
+Run from the repo root:
+    python benchmarks/http_client.py [--calls 2000] [--concurrency 16]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.http_client import HttpClientFactory, HttpClientSettings
+from benchmarks.openai_stub import StubConfig, run_stub
+
+CLIENT_NAMES = ["quality_llm", "fast_llm", "feedback_llm", "explain_llm", "embeddings"]
+BODY = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hello"}]}
+
+
+async def run(get_client, base_url: str, calls: int, concurrency: int):
+    """Issue `calls` requests, `concurrency` at a time; returns per-call latencies (ms)."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            client, close = get_client(i)
+            start = time.perf_counter()
+            response = await client.post(f"{base_url}/chat/completions", json=BODY)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if close:
+                await client.aclose()
+
+    await asyncio.gather(*[one(i) for i in range(calls)])
+    return latencies
+
+
+async def main_async(calls: int, concurrency: int):
+    config = StubConfig()
+    with run_stub(config=config) as base_url:
+        results = []
+
+        # Warm-up (imports, stub threads)
+        async with httpx.AsyncClient() as client:
+            await run(lambda i: (client, False), base_url, 50, concurrency)
+
+        before = config.connections
+        latencies = await run(lambda i: (httpx.AsyncClient(), True), base_url, calls, concurrency)
+        results.append(("fresh client per call", latencies, config.connections - before))
+
+        pools = {name: httpx.AsyncClient() for name in CLIENT_NAMES}
+        before = config.connections
+        latencies = await run(
+            lambda i: (pools[CLIENT_NAMES[i % len(CLIENT_NAMES)]], False), base_url, calls, concurrency
+        )
+        results.append(("one pool per LLM object", latencies, config.connections - before))
+        for client in pools.values():
+            await client.aclose()
+
+        factory = HttpClientFactory(HttpClientSettings(http2=False))  # the stub speaks HTTP/1.1
+        shared = factory.get_async_client()
+        before = config.connections
+        latencies = await run(lambda i: (shared, False), base_url, calls, concurrency)
+        results.append(("shared pool", latencies, config.connections - before))
+        stats = factory.stats()["async"]
+        await factory.aclose()
+
+    print(f"{calls} calls, concurrency {concurrency}")
+    print(f"{'scenario':26} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'connections':>12}")
+    for name, latencies, connections in results:
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{name:26} {statistics.mean(latencies):8.2f} {statistics.median(latencies):8.2f} "
+              f"{p95:8.2f} {connections:12d}")
+    print(f"shared pool stats: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.calls, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
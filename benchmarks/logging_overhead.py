@@ -0,0 +1,102 @@
+"""
+Benchmark: logging cost per chat turn in the calling thread (the event loop).
+
+Replays the log lines of one PROVIDE_FEEDBACK turn as agent_service used to write
+them (six WARNING lines with a passage excerpt, the active session keys, context
+lines) and as it writes them now, through:
+
+  sync       the old setup: logging.basicConfig(DEBUG) with a FileHandler and a
+             StreamHandler, formatting and writing on the calling thread
+  pipeline   app.core.log_pipeline: QueueHandler with sampling, rate limits and
+             redaction; formatting and I/O on the listener thread
+
+Console output goes to /dev/null in both cases so only the logging work is timed.
+
+Run from the repo root:
+    python benchmarks/logging_overhead.py [--turns 2000] [--sessions 200]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+PASSAGE = ("The project, which has been ongoing since 2018, aims to map the ocean floor in unprecedented "
+           "detail. This initiative was first proposed at a conference in late 2017. ") * 4
+
+CHILD = r'''
+import logging, sys, time
+sys.path.insert(0, {root!r})
+mode, turns, sessions, log_file, passage = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), sys.argv[4], sys.argv[5]
+sys.stderr = open("/dev/null", "w")
+if mode == "sync":
+    logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.FileHandler(log_file), logging.StreamHandler()])
+else:
+    from app.core.log_pipeline import configure_logging
+    configure_logging("bench")
+logger = logging.getLogger("app.services.agent_service")
+keys = [f"session-{{i:04d}}" for i in range(sessions)]
+
+
+def old_turn(i):
+    logger.info(f"[ANSWER_PARSE] Parsed answers: {{{{'1': 'B', '2': 'NOT GIVEN'}}}}")
+    logger.info(f"[FEEDBACK] session_id: {{keys[i % sessions]}}")
+    logger.info(f"[FEEDBACK] Active sessions: {{keys}}")
+    logger.info("[CONTEXT] Found context from session")
+    logger.info(f"[CONTEXT] Passage (first 150 chars): {{passage[:150]}}")
+    logger.info("[CONTEXT] Question: The research began before 2018.")
+    logger.warning("[FEEDBACK_GEN] ==========================================")
+    logger.warning(f"[FEEDBACK_GEN] Passage (first 200 chars): {{passage[:200]}}")
+    logger.warning("[FEEDBACK_GEN] Question: The research began before 2018.")
+    logger.warning("[FEEDBACK_GEN] Student answer: TRUE")
+    logger.warning("[FEEDBACK_GEN] Correct answer: FALSE")
+    logger.warning("[FEEDBACK_GEN] ==========================================")
+
+
+def new_turn(i):
+    logger.info(f"[ANSWER_PARSE] Parsed answers: {{{{'1': 'B', '2': 'NOT GIVEN'}}}}")
+    logger.info(f"[FEEDBACK] session_id: {{keys[i % sessions]}} ({{sessions}} active sessions)")
+    logger.debug("[CONTEXT] Found context from session for question 2: The research began before 2018.")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[FEEDBACK_GEN] Question: The research began before 2018. | student: TRUE | correct: FALSE")
+
+
+turn = old_turn if mode == "sync" else new_turn
+start = time.perf_counter()
+for i in range(turns):
+    turn(i)
+elapsed = time.perf_counter() - start
+print(elapsed / turns * 1e6)
+'''
+
+
+def run(mode: str, turns: int, sessions: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "LOG_LEVEL": "INFO", "LOG_FILE": os.path.join(tmp, "pipeline.log")}
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD.format(root=str(REPO_ROOT)), mode, str(turns), str(sessions),
+             os.path.join(tmp, "sync.log"), PASSAGE],
+            env=env, capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=200, help="active sessions listed by the old log lines")
+    args = parser.parse_args()
+
+    sync = run("sync", args.turns, args.sessions)
+    pipeline = run("pipeline", args.turns, args.sessions)
+    print(f"{'setup':10} {'us per turn':>12}")
+    print(f"{'sync':10} {sync:12.1f}")
+    print(f"{'pipeline':10} {pipeline:12.1f}  ({sync / pipeline:.1f}x less time on the calling thread)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: cost of the /metrics instrumentation per request and per chat turn.
+
+Measures, without any server or network:
+
+  middleware      MetricsMiddleware around a no-op ASGI app vs the bare app
+  turn tracing    one chat turn worth of spans (root, 6 stages, 2 LLM calls)
+                  with and without the metrics exporter attached
+  scrape          rendering /metrics with a realistic number of series
+
+Run from the repo root:
+    python benchmarks/metrics_overhead.py [--iterations 20000]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.metrics import MetricsMiddleware, MetricsSpanExporter, registry
+from app.core.token_usage import LLM_TOKENS
+from app.core.tracing import Tracer
+
+STAGES = ["parse_answers", "intent_tag", "router", "context", "action", "format"]
+ACTIONS = ["CHITCHAT", "GENERATE_HINT", "PROVIDE_FEEDBACK", "GENERATE_MICRO_BATTLE", "GENERATE_EXPLANATION"]
+
+
+class _Route:
+    path = "/api/chat/message"
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def time_asgi(app, iterations: int) -> float:
+    scope = {"type": "http", "method": "POST", "path": "/api/chat/message", "route": _Route()}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def time_turns(tracer: Tracer, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        with tracer.span("chat.turn", session_id=f"s{i % 50}"):
+            for stage in STAGES:
+                with tracer.span(stage, **({"chain": "router"} if stage == "router" else {})):
+                    if stage in ("router", "action"):
+                        span = tracer.start_span("llm router", chain="router",
+                                                 **{"gen_ai.request.model": "gpt-4o-mini"})
+                        span.set_attribute("gen_ai.usage.input_tokens", 900)
+                        span.set_attribute("gen_ai.usage.output_tokens", 40)
+                        tracer.end_span(span)
+            tracer.annotate_root(action=ACTIONS[i % len(ACTIONS)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    bare = asyncio.run(time_asgi(noop_app, n))
+    wrapped = asyncio.run(time_asgi(MetricsMiddleware(noop_app, "bench"), n))
+
+    # The global tracer already exports to metrics; use private tracers for a clean A/B
+    plain = time_turns(Tracer(), n // 4)
+    exported = time_turns(Tracer(exporters=[MetricsSpanExporter()]), n // 4)
+
+    for chain in ["router", "micro_battle", "deeper_feedback", "hint", "general_chat", "socratic", "explain"]:
+        LLM_TOKENS.inc(1, chain=chain, type="input", source="usage")
+    start = time.perf_counter()
+    for _ in range(200):
+        body = registry.render()
+    scrape = (time.perf_counter() - start) / 200 * 1e3
+
+    print(f"{'measurement':34} {'value':>10}")
+    print(f"{'request, bare ASGI app':34} {bare:8.2f} us")
+    print(f"{'request, with MetricsMiddleware':34} {wrapped:8.2f} us")
+    print(f"{'middleware overhead / request':34} {wrapped - bare:8.2f} us")
+    print(f"{'turn tracing, no exporter':34} {plain:8.2f} us")
+    print(f"{'turn tracing + metrics exporter':34} {exported:8.2f} us")
+    print(f"{'metrics overhead / turn':34} {exported - plain:8.2f} us")
+    print(f"{'scrape /metrics':34} {scrape:8.2f} ms  ({len(body.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Minimal OpenAI-compatible stub server for benchmarks (stdlib only).
+
+Serves POST /v1/chat/completions and /v1/embeddings over HTTP/1.1 keep-alive with
+a canned reply and optional injected latency, so client-side overhead can be
+measured without network noise or API cost.
+
+    python benchmarks/openai_stub.py --port 8765 --latency-ms 50
+
+From another script:
+    with run_stub(latency_ms=20) as base_url:   # e.g. "http://127.0.0.1:54321/v1"
+        ...
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator, Optional
+
+DEFAULT_REPLY = '{"action": "CHITCHAT", "parameters": {}}'
+
+
+class StubConfig:
+    """Reply content and latency; `latency` returns seconds for one request."""
+
+    def __init__(self, reply: str = DEFAULT_REPLY, latency: Optional[Callable[[], float]] = None):
+        self.reply = reply
+        self.latency = latency or (lambda: 0.0)
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+def make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def setup(self):
+            super().setup()
+            config.count("connections")
+
+        def log_message(self, *args):  # silence per-request logging
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            config.count("requests")
+            delay = config.latency()
+            if delay > 0:
+                time.sleep(delay)
+
+            if self.path.endswith("/embeddings"):
+                inputs = body.get("input", [])
+                inputs = inputs if isinstance(inputs, list) else [inputs]
+                payload = {
+                    "object": "list",
+                    "model": body.get("model", "stub"),
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": [0.01] * 8}
+                        for i in range(len(inputs))
+                    ],
+                    "usage": {"prompt_tokens": 8 * len(inputs), "total_tokens": 8 * len(inputs)},
+                }
+            else:
+                payload = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": config.reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+                }
+
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+@contextmanager
+def run_stub(
+    reply: str = DEFAULT_REPLY,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    config: Optional[StubConfig] = None,
+    port: int = 0,
+) -> Iterator[str]:
+    """Run the stub in a background thread; yields the OpenAI base_url."""
+    if config is None:
+        config = StubConfig(
+            reply=reply,
+            latency=lambda: max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000,
+        )
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    args = parser.parse_args()
+    with run_stub(args.reply, args.latency_ms, args.jitter_ms, port=args.port) as base_url:
+        print(f"Stub listening on {base_url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark: cold start of the tutor app (app/main.py).
+
+Measures, with the fake LLM (LLM_PROVIDER=fake, no latency) so only our own startup
+work is timed:
+
+  import          `import app.main` in a fresh interpreter (median of --runs), and the
+                  slowest modules from `python -X importtime`
+  ready           process spawn -> first 200 from GET /health
+  first turn      the first POST /api/chat/message after ready, then the second one
+                  (the difference is what the first student pays for lazy setup)
+
+Each server run is done with the lifespan warm-up on and off (STARTUP_WARMUP=false),
+and the warm-up steps reported by GET /health/startup are printed.
+
+Run from the repo root:
+    python benchmarks/startup.py [--runs 5] [--top 15]
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+ENV = {
+    **os.environ,
+    "LLM_PROVIDER": "fake",
+    "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-fake-startup"),
+    "FAKE_LLM_LATENCY": "none",
+    "FAKE_LLM_MS_PER_TOKEN": "0",
+}
+
+IMPORT_SNIPPET = "import time; s = time.perf_counter(); import app.main; print((time.perf_counter() - s) * 1000)"
+
+
+def import_ms() -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=REPO_ROOT, env=ENV,
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int) -> List[Tuple[str, float]]:
+    """Top-level packages by cumulative import time, from -X importtime."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=REPO_ROOT,
+                         env=ENV, capture_output=True, text=True, check=True).stderr
+    totals: Dict[str, float] = {}
+    for line in err.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        # Indent 1 is a module imported directly by app.main's import chain root
+        if match and len(match.group(2)) == 1:
+            totals[match.group(3)] = totals.get(match.group(3), 0) + int(match.group(1)) / 1000
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(url: str, payload: Dict = None, timeout: float = 30) -> Tuple[int, bytes]:
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def chat_turn_ms(base_url: str, session_id: str) -> float:
+    payload = {"session_id": session_id, "messages": [{"role": "user", "content": "Hi! How do I get better at reading?"}]}
+    start = time.perf_counter()
+    request(f"{base_url}/api/chat/message", payload)
+    return (time.perf_counter() - start) * 1000
+
+
+def server_run(warmup: bool, timeout: float = 60) -> Dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**ENV, "STARTUP_WARMUP": "true" if warmup else "false"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise SystemExit(f"Server exited with code {process.returncode}")
+            if time.perf_counter() - start > timeout:
+                raise SystemExit("Server did not start in time")
+            try:
+                if request(f"{base_url}/health", timeout=1)[0] == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.02)
+        ready = (time.perf_counter() - start) * 1000
+        first = chat_turn_ms(base_url, "startup-1")
+        second = chat_turn_ms(base_url, "startup-2")
+        steps = json.loads(request(f"{base_url}/health/startup")[1])
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"ready_ms": ready, "first_turn_ms": first, "second_turn_ms": second, "steps": steps}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list (0 to skip)")
+    args = parser.parse_args()
+
+    imports = [import_ms() for _ in range(args.runs)]
+    print(f"import app.main       median {statistics.median(imports):8.1f} ms  "
+          f"(min {min(imports):.1f}, max {max(imports):.1f})")
+    if args.top:
+        print("slowest imports (cumulative ms)")
+        for module, ms in slowest_imports(args.top):
+            print(f"  {module:32} {ms:8.1f}")
+
+    print(f"\n{'warm-up':8} {'ready ms':>9} {'1st turn ms':>12} {'2nd turn ms':>12}")
+    for warmup in (True, False):
+        runs = [server_run(warmup) for _ in range(args.runs)]
+        med = {key: statistics.median(r[key] for r in runs) for key in ("ready_ms", "first_turn_ms", "second_turn_ms")}
+        print(f"{'on' if warmup else 'off':8} {med['ready_ms']:9.1f} {med['first_turn_ms']:12.1f} {med['second_turn_ms']:12.1f}")
+        if warmup:
+            print(f"         steps: {runs[-1]['steps']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Build pipeline for the theory artifacts the services read.
+
+Sources (edited by hand):
+    backend/data/reading-theory.json        every question type (also read by the frontend)
+    backend/data/tfng-detailed-theory.json  the detailed T/F/NG guide, merged into T/F/NG
+
+Stages, each with declared inputs and outputs:
+    split:<type>     both sources -> .cache/theory/<type>.json, one question type merged
+    compact:<type>   .cache/theory/<type>.json -> app/prompts/theory/<type>.<budget>.txt,
+                     the most useful sections that fit each token budget
+    manifest         all compact files -> app/prompts/theory/manifest.json (token count
+                     of every variant; the services pick the largest one that fits)
+
+A stage runs only when the content hash of its inputs, parameters or code differs from
+the last run (.cache/build_theory.json) or an output is missing or was edited, so
+editing one question type rebuilds only that type's compact files.
+
+    python build_theory.py            # run the stages that are out of date
+    python build_theory.py --force    # run every stage
+    python build_theory.py --check    # exit code 1 when a committed output is stale (CI)
+    python build_theory.py --list     # show the stages with their inputs and outputs
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+
+from app.core.token_usage import count_tokens
+from app.services.theory_index import FILE_QUESTION_TYPES, render, split_question_type
+
+DATA_DIR = ROOT / 'backend' / 'data'
+READING_THEORY = DATA_DIR / 'reading-theory.json'
+TFNG_DETAILED = DATA_DIR / 'tfng-detailed-theory.json'
+CACHE_DIR = ROOT / '.cache'
+CACHE_FILE = CACHE_DIR / 'build_theory.json'
+OUTPUT_DIR = ROOT / 'app' / 'prompts' / 'theory'
+
+BUDGETS = (300, 600, 1200)
+
+# Which sections a compact variant takes first: the first pattern found in the section's
+# id or title decides, lower goes first. What helps with a wrong answer (the key
+# distinction, strategy, signal words, pitfalls) beats general description, and worked
+# examples are the most expensive per idea
+COMPACT_PRIORITIES = [
+    ('example', 9), ('walkthrough', 9),
+    ('key distinction', 0),
+    ('step-by-step', 1), ('strategy', 1),
+    ('signal word', 2), ('distractor', 2),
+    ('pitfall', 3), ('mistake', 3), ('trap', 3),
+    ('quick reference', 4), ('time management', 4), ('tips', 4),
+    ('what is it', 5), ('overview', 5),
+]
+DEFAULT_PRIORITY = 6
+
+
+@dataclass
+class Stage:
+    name: str
+    inputs: List[Path]
+    outputs: List[Path]
+    # run(input contents) -> output contents, both keyed by path
+    run: Callable[[Dict[Path, str]], Dict[Path, str]]
+    params: Dict = field(default_factory=dict)
+    code: Sequence[Callable] = ()   # functions whose source is part of the cache key
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def rel(path: Path) -> str:
+    return path.relative_to(ROOT).as_posix()
+
+
+# --- stages -----------------------------------------------------------------------
+
+def question_types() -> List[str]:
+    return [entry['id'] for entry in json.loads(READING_THEORY.read_text(encoding='utf-8'))['questionTypes']]
+
+
+def split_type(type_id: str, reading_theory: str, tfng_detailed: str) -> str:
+    """One question type of reading-theory.json, with the detailed guide merged in."""
+    entry = next(e for e in json.loads(reading_theory)['questionTypes'] if e['id'] == type_id)
+    detailed = json.loads(tfng_detailed)
+    if FILE_QUESTION_TYPES.get(detailed.get('id')) == type_id:
+        entry = dict(entry, detailedTheory={'sections': detailed['sections']})
+    return json.dumps(entry, indent=2, ensure_ascii=False) + '\n'
+
+
+def compact_priority(section_id: str, title: str) -> int:
+    """Priority from the section's own id and title, else from its parent section's title."""
+    own = f"{section_id.rsplit('/', 1)[-1]} {title.rsplit(' / ', 1)[-1]}"
+    for haystack in (own, f"{section_id} {title}"):
+        haystack = haystack.lower().replace('_', ' ')
+        for pattern, priority in COMPACT_PRIORITIES:
+            if pattern in haystack or pattern.replace(' ', '-') in haystack or pattern.replace(' ', '') in haystack:
+                return priority
+    return DEFAULT_PRIORITY
+
+
+def compact_text(entry: Dict, budget: int) -> str:
+    """The highest-priority sections that fit the budget, most important first."""
+    blocks = []
+    for index, (section_id, title, text) in enumerate(split_question_type(entry, entry['id'])):
+        block = f"## {title.rsplit(' / ', 1)[-1].upper()}\n{text}"
+        blocks.append((compact_priority(section_id, title), index, block, count_tokens(block) + 1))
+    chosen, used = [], 0
+    for priority, index, block, tokens in sorted(blocks):
+        if used + tokens <= budget:
+            chosen.append(block)
+            used += tokens
+    return '\n\n'.join(chosen) + '\n'
+
+
+def build_stages() -> List[Stage]:
+    stages = []
+    types = question_types()
+    for type_id in types:
+        split_output = CACHE_DIR / 'theory' / f'{type_id}.json'
+        stages.append(Stage(
+            f'split:{type_id}', [READING_THEORY, TFNG_DETAILED], [split_output],
+            lambda files, type_id=type_id, out=split_output: {
+                out: split_type(type_id, files[READING_THEORY], files[TFNG_DETAILED])},
+            code=[split_type],
+        ))
+
+        variants = {budget: OUTPUT_DIR / f'{type_id}.{budget}.txt' for budget in BUDGETS}
+
+        def run_compact(files, source=split_output, variants=variants):
+            entry = json.loads(files[source])
+            return {path: compact_text(entry, budget) for budget, path in variants.items()}
+
+        stages.append(Stage(
+            f'compact:{type_id}', [split_output], list(variants.values()), run_compact,
+            params={'budgets': BUDGETS, 'priorities': COMPACT_PRIORITIES},
+            code=[run_compact, compact_text, compact_priority, split_question_type, render],
+        ))
+
+    variant_files = [OUTPUT_DIR / f'{t}.{b}.txt' for t in types for b in BUDGETS]
+    manifest = OUTPUT_DIR / 'manifest.json'
+
+    def run_manifest(files):
+        entries = {}
+        for type_id in types:
+            entries[type_id] = [
+                {'budget': budget, 'file': f'{type_id}.{budget}.txt',
+                 'tokens': count_tokens(files[OUTPUT_DIR / f'{type_id}.{budget}.txt'])}
+                for budget in BUDGETS
+            ]
+        return {manifest: json.dumps({'budgets': list(BUDGETS), 'question_types': entries}, indent=2) + '\n'}
+
+    stages.append(Stage('manifest', variant_files, [manifest], run_manifest, code=[run_manifest]))
+    return stages
+
+
+# --- runner -----------------------------------------------------------------------
+
+def stage_key(stage: Stage, files: Dict[Path, str]) -> str:
+    parts = [stage.name, json.dumps(stage.params, sort_keys=True, default=str)]
+    parts += [inspect.getsource(fn) for fn in stage.code]
+    parts += [f"{rel(path)}:{sha256(files[path])}" for path in stage.inputs]
+    return sha256('\n'.join(parts))
+
+
+def read(path: Path, produced: Dict[Path, str]) -> str:
+    """An input as produced earlier in this run, else from disk."""
+    return produced[path] if path in produced else path.read_text(encoding='utf-8')
+
+
+def run_pipeline(stages: List[Stage], force: bool = False, check: bool = False) -> int:
+    cache = {} if force or check or not CACHE_FILE.exists() else json.loads(CACHE_FILE.read_text(encoding='utf-8'))
+    produced: Dict[Path, str] = {}
+    stale = 0
+    for stage in stages:
+        files = {path: read(path, produced) for path in stage.inputs}
+        key = stage_key(stage, files)
+        cached = cache.get(stage.name, {})
+        up_to_date = cached.get('key') == key and all(
+            path.exists() and sha256(path.read_text(encoding='utf-8')) == cached['outputs'].get(rel(path))
+            for path in stage.outputs)
+        if up_to_date:
+            print(f"  cached  {stage.name}")
+            continue
+
+        start = time.perf_counter()
+        outputs = stage.run(files)
+        elapsed = (time.perf_counter() - start) * 1000
+        produced.update(outputs)
+        changed = [path for path, text in outputs.items()
+                   if not path.exists() or path.read_text(encoding='utf-8') != text]
+        if check:
+            # Intermediate files are not committed; only stale outputs in the tree count
+            stale_outputs = [path for path in changed if CACHE_DIR not in path.parents]
+            stale += len(stale_outputs)
+            for path in stale_outputs:
+                print(f"  STALE   {stage.name}: {rel(path)}")
+            continue
+        for path in changed:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(outputs[path], encoding='utf-8')
+        cache[stage.name] = {'key': key, 'outputs': {rel(p): sha256(t) for p, t in outputs.items()}}
+        print(f"  ran     {stage.name} ({elapsed:.0f} ms, {len(changed)}/{len(outputs)} outputs changed)")
+
+    if not check:
+        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        CACHE_FILE.write_text(json.dumps(cache, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--force', action='store_true', help='ignore the cache and run every stage')
+    parser.add_argument('--check', action='store_true', help='only report outputs that are out of date')
+    parser.add_argument('--list', action='store_true', help='list the stages and exit')
+    args = parser.parse_args()
+
+    stages = build_stages()
+    if args.list:
+        for stage in stages:
+            print(stage.name)
+            print(f"    in:  {', '.join(rel(p) for p in stage.inputs)}")
+            print(f"    out: {', '.join(rel(p) for p in stage.outputs)}")
+        return
+
+    stale = run_pipeline(stages, force=args.force, check=args.check)
+    if args.check:
+        if stale:
+            print(f"\n{stale} theory output(s) are out of date; run: python build_theory.py")
+            sys.exit(1)
+        print("\nAll theory outputs are up to date.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Regression check for the static prompt prefixes.
+
+Provider-side prompt caching only reuses the part of a prompt that is identical,
+byte for byte, to an earlier call, so every prompt keeps its static instructions
+first (see app/core/prompt_registry.py). The static prefix of each prompt - the
+text before its first template variable - is pinned in app/prompts/prefixes.lock.json.
+This check (also run by tests/test_prompt_prefixes.py) fails when a prefix changed,
+disappeared or is not pinned yet; when the change is intended, update the lock in the
+same commit:
+
+    python check_prompt_prefixes.py            # exit code 1 on any difference
+    python check_prompt_prefixes.py --update   # pin the current prefixes
+"""
+
+import argparse
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+
+from app.core.prompt_registry import prompt_registry
+
+LOCK_PATH = ROOT / 'app' / 'prompts' / 'prefixes.lock.json'
+# Modules whose REGISTERED_PROMPTS are checked too (loaded by path: the agents
+# package imports LangChain, the prompt modules themselves do not)
+CODE_PROMPT_MODULES = [
+    ROOT / 'backend' / 'agents' / 'prompts.py',
+    ROOT / 'backend' / 'agents' / 'explain_prompts.py',
+]
+# OpenAI caches prompts from this length on; a shorter prefix is still reused as the
+# start of a longer prompt (e.g. a system prompt followed by the passage)
+PROVIDER_MIN_CACHE_TOKENS = 1024
+
+
+def load_prompts():
+    prompt_registry.preload()
+    for path in CODE_PROMPT_MODULES:
+        spec = importlib.util.spec_from_file_location(f"_prompts_{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        for name, text in module.REGISTERED_PROMPTS.items():
+            prompt_registry.register(name, text)
+    return {
+        name: {'prefix_version': info['prefix_version'], 'prefix_tokens': info['prefix_tokens']}
+        for name, info in prompt_registry.stats()['prompts'].items()
+    }
+
+
+def load_lock():
+    return json.loads(LOCK_PATH.read_text(encoding='utf-8')) if LOCK_PATH.exists() else {}
+
+
+def compare(current, locked):
+    """Status of every prompt against the lock file: 'ok', or what changed."""
+    statuses = {}
+    for name in sorted(set(current) | set(locked)):
+        now, pinned = current.get(name), locked.get(name)
+        if now is None:
+            statuses[name] = 'MISSING (prompt removed - run with --update if intended)'
+        elif pinned is None:
+            statuses[name] = 'NEW (not pinned - run with --update)'
+        elif now['prefix_version'] != pinned['prefix_version']:
+            statuses[name] = f"CHANGED ({pinned['prefix_tokens']} -> {now['prefix_tokens']} tokens)"
+        else:
+            statuses[name] = 'ok'
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--update', action='store_true', help='write the current prefixes to the lock file')
+    args = parser.parse_args()
+
+    current = load_prompts()
+    if args.update:
+        LOCK_PATH.write_text(json.dumps(current, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print(f"Pinned {len(current)} prompt prefixes in {LOCK_PATH.relative_to(ROOT)}")
+        return
+
+    locked = load_lock()
+    failures = 0
+    print(f"{'prompt':36} {'prefix tokens':>13} {'cacheable':>9}  status")
+    for name, status in compare(current, locked).items():
+        now, pinned = current.get(name), locked.get(name)
+        failures += status != 'ok'
+        tokens = now['prefix_tokens'] if now else pinned['prefix_tokens']
+        cacheable = 'yes' if tokens >= PROVIDER_MIN_CACHE_TOKENS else '-'
+        print(f"{name:36} {tokens:13,} {cacheable:>9}  {status}")
+
+    if failures:
+        print(f"\n{failures} prompt prefix(es) differ from {LOCK_PATH.relative_to(ROOT)}. "
+              "Changing a static prefix invalidates the provider's prompt cache for that chain; "
+              "if the change is intended, run: python check_prompt_prefixes.py --update")
+        sys.exit(1)
+    print("\nAll static prompt prefixes match the lock file.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Random answer sheets for parse_student_answers, and the old four-regex parser as the
+reference for the documented formats. Used by tests/test_answer_parser.py and
+benchmarks/answer_parser.py.
+"""
+
+import random
+import re
+
+CLOSED_ANSWERS = ["A", "B", "C", "D", "TRUE", "FALSE", "NOT GIVEN", "YES", "NO",
+                  "i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x", "BD", "ACE"]
+SHORT_ANSWERS = ["solar panels", "1987", "the harbour", "three million", "wooden boxes", "rice"]
+
+# number -> answer separators, per format
+SEPARATORS = ["-", ": ", ". ", ") ", " - ", " "]
+JOINERS = [", ", " ", "\n", "; "]
+
+
+def legacy_parse(message: str) -> dict:
+    """The previous four-strategy regex parser, kept here as the baseline."""
+    answers = {}
+    for m in re.finditer(r'\b([A-Za-z])\s*[-:]\s*(\d{1,2})\b', message):
+        answers[ord(m.group(1).upper()) - ord('A') + 1] = m.group(2)
+    if answers:
+        return answers
+    vocab = r'([A-Ca-c]|TRUE|FALSE|NOT GIVEN|True|False|Not Given|true|false|not given)'
+    for m in re.finditer(r'(?:Q|q)?(\d+)\s*[-:]\s*' + vocab, message):
+        answers[int(m.group(1))] = m.group(2).upper()
+    if not answers:
+        for m in re.finditer(r'(?:Q|q)?(\d+)\.\s*' + vocab, message):
+            answers[int(m.group(1))] = m.group(2).upper()
+    if not answers:
+        matches = re.findall(r'\b' + vocab + r'\b', message)
+        if matches and len(matches) <= 5:
+            for idx, answer in enumerate(matches, start=1):
+                answers[idx] = answer.upper()
+    return answers
+
+
+def random_sheet(rng: random.Random, n: int, allow_short: bool) -> dict:
+    pool = CLOSED_ANSWERS + (SHORT_ANSWERS if allow_short else [])
+    start = rng.choice([1, 1, 1, 14, 27])
+    return {start + i: rng.choice(pool) for i in range(n)}
+
+
+def render(sheet: dict, rng: random.Random) -> str:
+    sep = rng.choice(SEPARATORS)
+    joiner = rng.choice(JOINERS)
+    prefix = rng.choice(["", "", "Q"]) if sep != " " else ""
+    parts = []
+    for q, answer in sheet.items():
+        if answer.isupper() and answer not in ("NOT GIVEN",) and rng.random() < 0.3:
+            answer = answer.lower() if len(answer) == 1 else answer  # "1 a 2 b" style
+        parts.append(f"{prefix}{q}{sep}{answer}")
+    text = joiner.join(parts)
+    return rng.choice(["", "", "My answers: ", "Here you go\n"]) + text
+
+
+def expected(sheet: dict) -> dict:
+    # Roman numerals stay lower case, everything else is upper-cased
+    return {q: (a.upper() if a in SHORT_ANSWERS or not a.islower() else a) for q, a in sheet.items()}
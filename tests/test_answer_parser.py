@@ -0,0 +1,63 @@
+"""
+Randomized equivalence checks for parse_student_answers.
+
+- random answer sheets (2-60 questions) rendered in every supported format parse back
+  to exactly the answers that were written;
+- the documented formats give the same result as the old four-regex parser;
+- chat replies in an active review ("no", "NG", "I don't understand why it's NG")
+  are not answer submissions.
+"""
+
+import random
+
+import pytest
+
+from app.services.answer_parser import parse_student_answers
+from tests.answer_sheets import CLOSED_ANSWERS, expected, legacy_parse, random_sheet, render
+
+CASES = 2000
+
+LEGACY_FORMATS = [
+    "1-A, 2-B, 3-C", "Q1: A, Q2: B, Q3: C", "1. A 2. B 3. C", "my answers: A, B, C",
+    "1-TRUE, 2-FALSE, 3-NOT GIVEN", "A-2, B-1, C-4", "1-a, 2-c", "Q1-B", "I think it's a",
+    "hello", "why is question 2 wrong?", "A B C", "Q1 is TRUE",
+]
+
+CHAT_REPLIES = [
+    "Yes", "no", "NG", "I", "I don't understand why it's NG", "Why?", "skip",
+    "because the passage says so", "question 2 is hard", "ok", "No.", "i", "x",
+]
+
+
+def test_random_answer_sheets_round_trip():
+    rng = random.Random(11)
+    for _ in range(CASES):
+        sheet = random_sheet(rng, rng.randint(2, 60), allow_short=True)
+        text = render(sheet, rng)
+        assert parse_student_answers(text) == expected(sheet), text
+
+
+def test_random_sequential_answers():
+    rng = random.Random(12)
+    for _ in range(CASES // 4):
+        answers = [rng.choice(CLOSED_ANSWERS) for _ in range(rng.randint(2, 40))]
+        text = rng.choice(["", "my answers: "]) + rng.choice([", ", " "]).join(answers)
+        want = {i: (a if a.islower() else a.upper()) for i, a in enumerate(answers, start=1)}
+        assert parse_student_answers(text) == want, text
+
+
+@pytest.mark.parametrize("answer", CLOSED_ANSWERS)
+def test_single_answer_needs_lead_in(answer):
+    want = answer if answer.islower() else answer.upper()
+    assert parse_student_answers(f"my answers: {answer}") == {1: want}
+    assert parse_student_answers(f"Answer: {answer}") == {1: want}
+
+
+@pytest.mark.parametrize("message", LEGACY_FORMATS)
+def test_documented_formats_match_legacy_parser(message):
+    assert parse_student_answers(message) == legacy_parse(message)
+
+
+@pytest.mark.parametrize("message", CHAT_REPLIES)
+def test_chat_replies_are_not_answers(message):
+    assert parse_student_answers(message) == {}
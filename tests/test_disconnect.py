@@ -0,0 +1,97 @@
+"""
+Cancelling a request's work when its client disconnects.
+
+- work that finishes first is returned as usual;
+- on disconnect the work is cancelled, ClientDisconnected is raised and the LLM
+  calls it had in flight are charged to the token ledger as cancelled;
+- work under finish_anyway() completes and its result goes to the callback.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.disconnect import ClientDisconnected, finish_anyway, run_until_disconnect, track_llm_call, untrack_llm_call
+from app.core.token_usage import token_ledger
+
+
+def client():
+    """A request whose receive() reports a disconnect once `gone` is set."""
+    gone = asyncio.Event()
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    return SimpleNamespace(receive=receive), gone
+
+
+def cancelled_calls(chain: str) -> int:
+    return token_ledger.snapshot()["cancelled"].get(chain, {}).get("calls", 0)
+
+
+def test_finished_work_is_returned():
+    async def run():
+        request, _ = client()
+
+        async def work():
+            track_llm_call("run-1", "test_finished", "gpt-4o-mini")
+            await asyncio.sleep(0)
+            untrack_llm_call("run-1")
+            return "reply"
+
+        return await run_until_disconnect(request, work(), app="test", route="/chat")
+
+    assert asyncio.run(run()) == "reply"
+    assert cancelled_calls("test_finished") == 0
+
+
+def test_disconnect_cancels_work_and_charges_calls_in_flight():
+    async def run():
+        request, gone = client()
+        cancelled = asyncio.Event()
+
+        async def work():
+            track_llm_call("run-1", "test_disconnect", "gpt-4o-mini")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        endpoint = asyncio.create_task(run_until_disconnect(request, work(), app="test", route="/chat"))
+        await asyncio.sleep(0)
+        gone.set()
+        with pytest.raises(ClientDisconnected):
+            await endpoint
+        return cancelled.is_set()
+
+    assert asyncio.run(run())
+    assert cancelled_calls("test_disconnect") == 1
+
+
+def test_finish_anyway_keeps_the_result():
+    async def run():
+        request, gone = client()
+        kept, done = [], asyncio.Event()
+
+        async def battle():
+            track_llm_call("run-1", "test_finish_anyway", "gpt-4o-mini")
+            await done.wait()
+            return "battle"
+
+        async def work():
+            return await finish_anyway(battle(), kept.append, kind="battle")
+
+        endpoint = asyncio.create_task(run_until_disconnect(request, work(), app="test", route="/chat"))
+        await asyncio.sleep(0)
+        gone.set()
+        with pytest.raises(ClientDisconnected):
+            await endpoint
+        done.set()
+        await asyncio.sleep(0.01)
+        return kept
+
+    assert asyncio.run(run()) == ["battle"]
+    assert cancelled_calls("test_finish_anyway") == 0
@@ -0,0 +1,95 @@
+"""
+Prefetched skip explanations.
+
+- get() serves a ready explanation, waits for a running one, or computes it on demand;
+- a cancelled turn waiting for an explanation does not cancel the background call;
+- discard() and cancel() stop the calls nobody needs any more.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from app.core.rate_limiter import BACKGROUND, current_priority
+from app.services.explanation_prefetch import ExplanationPrefetcher
+
+
+def session():
+    return SimpleNamespace(session_id="s1", student_id="st1", precomputed_explanations={})
+
+
+class Explain:
+    """generate() for the prefetcher: answers once released and records what it saw."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.calls = []
+        self.cancelled = 0
+
+    async def __call__(self, context):
+        self.calls.append((context["q"], current_priority()))
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"explanation {context['q']}"
+
+
+def test_ready_running_and_on_demand():
+    async def run():
+        prefetcher, memory, explain = ExplanationPrefetcher(enabled=True), session(), Explain()
+        prefetcher.start(memory, {1: {"q": 1}, 2: {"q": 2}}, explain)
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(prefetcher.get(memory, 1, {"q": 1}, explain))
+        await asyncio.sleep(0)
+        explain.release.set()
+        running = await waiting
+        await asyncio.sleep(0)
+        ready = prefetcher.get(memory, 2, {"q": 2}, explain)
+        on_demand = prefetcher.get(memory, 3, {"q": 3}, explain)
+        return prefetcher, explain, [running, await ready, await on_demand]
+
+    prefetcher, explain, results = asyncio.run(run())
+    assert results == ["explanation 1", "explanation 2", "explanation 3"]
+    assert explain.calls[:2] == [(1, BACKGROUND), (2, BACKGROUND)] and len(explain.calls) == 3
+    assert prefetcher.stats() == {"prefetched": 2, "waited": 1, "ready": 1, "on_demand": 1, "running": 0}
+
+
+def test_cancelled_turn_leaves_background_call_running():
+    async def run():
+        prefetcher, memory, explain = ExplanationPrefetcher(enabled=True), session(), Explain()
+        prefetcher.start(memory, {1: {"q": 1}}, explain)
+        await asyncio.sleep(0)
+        turn = asyncio.create_task(prefetcher.get(memory, 1, {"q": 1}, explain))
+        await asyncio.sleep(0)
+        turn.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await turn
+        explain.release.set()
+        await asyncio.sleep(0.01)
+        return memory, explain
+
+    memory, explain = asyncio.run(run())
+    assert explain.cancelled == 0
+    assert memory.precomputed_explanations == {1: "explanation 1"}
+
+
+def test_discard_and_cancel_stop_running_calls():
+    async def run():
+        prefetcher, memory, explain = ExplanationPrefetcher(enabled=True), session(), Explain()
+        prefetcher.start(memory, {1: {"q": 1}, 2: {"q": 2}, 3: {"q": 3}}, explain)
+        await asyncio.sleep(0)
+        prefetcher.discard(memory, 1)
+        await asyncio.sleep(0.01)
+        assert prefetcher.stats()["running"] == 2
+        prefetcher.cancel(memory)
+        await asyncio.sleep(0.01)
+        return prefetcher, explain
+
+    prefetcher, explain = asyncio.run(run())
+    assert explain.cancelled == 3
+    assert prefetcher.stats() == {"prefetched": 3, "cancelled": 3, "running": 0}
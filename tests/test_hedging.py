@@ -0,0 +1,117 @@
+"""
+Hedged calls: the first answer wins and the other attempt is cancelled.
+
+- a primary that answers before the hedge delay is the only request;
+- a slow primary gets a second request; the hedge wins and the primary is cancelled;
+- hedges are limited by the chain's hedge budget;
+- past the chain budget or the turn deadline every attempt is cancelled and
+  DeadlineExceeded is raised.
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.deadline import llm_deadline
+from app.services.hedging import ChainSLO, DeadlineExceeded, Hedger
+
+
+class Attempts:
+    """make_call for Hedger.call: attempt n sleeps delays[n] and returns its number."""
+
+    def __init__(self, *delays: float):
+        self.delays = delays
+        self.started = 0
+        self.cancelled = []
+
+    def __call__(self):
+        n, self.started = self.started, self.started + 1
+        return self._attempt(n)
+
+    async def _attempt(self, n: int) -> int:
+        try:
+            await asyncio.sleep(self.delays[n])
+        except asyncio.CancelledError:
+            self.cancelled.append(n)
+            raise
+        return n
+
+
+def hedger(budget: float = 1.0) -> Hedger:
+    return Hedger({"router": ChainSLO(hedge_after=0.02, budget=budget)})
+
+
+async def settle():
+    await asyncio.sleep(0)   # let the cancelled attempts run their except blocks
+
+
+def test_fast_primary_is_not_hedged():
+    async def run():
+        h, attempts = hedger(), Attempts(0.0)
+        return h, attempts, await h.call("router", attempts)
+
+    h, attempts, winner = asyncio.run(run())
+    assert winner == 0 and attempts.started == 1
+    assert "hedged" not in h.stats()["router"]
+
+
+def test_hedge_wins_and_primary_is_cancelled():
+    async def run():
+        h, attempts = hedger(), Attempts(0.5, 0.0)
+        winner = await h.call("router", attempts)
+        await settle()
+        return h, attempts, winner
+
+    h, attempts, winner = asyncio.run(run())
+    assert winner == 1 and attempts.cancelled == [0]
+    stats = h.stats()["router"]
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_primary_wins_and_hedge_is_cancelled():
+    async def run():
+        h, attempts = hedger(), Attempts(0.05, 0.5)
+        winner = await h.call("router", attempts)
+        await settle()
+        return h, attempts, winner
+
+    h, attempts, winner = asyncio.run(run())
+    assert winner == 0 and attempts.cancelled == [1]
+    assert "hedge_wins" not in h.stats()["router"]
+
+
+def test_hedges_are_limited_by_budget():
+    async def run():
+        h = hedger()
+        first, second = Attempts(0.1, 0.0), Attempts(0.1, 0.0)
+        await h.call("router", first)
+        await h.call("router", second)   # the budget (10% of calls) is spent
+        return second
+
+    second = asyncio.run(run())
+    assert second.started == 1
+
+
+def test_chain_budget_cancels_every_attempt():
+    async def run():
+        h, attempts = hedger(budget=0.05), Attempts(1.0, 1.0)
+        with pytest.raises(DeadlineExceeded):
+            await h.call("router", attempts)
+        await settle()
+        return h, attempts
+
+    h, attempts = asyncio.run(run())
+    assert sorted(attempts.cancelled) == [0, 1]
+    assert h.stats()["router"]["deadline_exceeded"] == 1
+
+
+def test_turn_deadline_bounds_the_call():
+    async def run():
+        h, attempts = hedger(budget=5.0), Attempts(1.0)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with llm_deadline(0.01), pytest.raises(DeadlineExceeded):
+            await h.call("router", attempts)
+        return loop.time() - started
+
+    assert asyncio.run(run()) < 0.5
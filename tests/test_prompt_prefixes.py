@@ -0,0 +1,10 @@
+"""The static prompt prefixes still match app/prompts/prefixes.lock.json (see check_prompt_prefixes.py)."""
+
+from check_prompt_prefixes import compare, load_lock, load_prompts
+
+
+def test_static_prefixes_match_lock_file():
+    changed = {name: status for name, status in compare(load_prompts(), load_lock()).items() if status != 'ok'}
+    assert not changed, (
+        f"Static prompt prefixes differ from the lock file: {changed}. If intended, run "
+        "python check_prompt_prefixes.py --update")
@@ -0,0 +1,92 @@
+"""
+Admission order and cancellation in the shared RateLimiter.
+
+- queued waiters are admitted strictly by priority class, FIFO within a class;
+- a waiter cancelled after the pump admitted it (but before it resumed) gives its
+  slot back and the next waiter is admitted without waiting for another release.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from app.core.rate_limiter import (
+    BACKGROUND, BATCH, INTERACTIVE, RateLimiter, RateLimiterSettings, llm_priority,
+)
+
+
+def single_slot_limiter() -> RateLimiter:
+    return RateLimiter(RateLimiterSettings(rpm=100000, tpm=10000000, max_concurrency=1, min_concurrency=1))
+
+
+async def queue_waiter(limiter: RateLimiter, priority: int, admitted: list, name: str) -> asyncio.Task:
+    async def wait():
+        await limiter.acquire(10)
+        admitted.append(name)
+
+    with llm_priority(priority):
+        task = asyncio.create_task(wait())
+    await asyncio.sleep(0)   # let it queue
+    return task
+
+
+def test_admits_by_priority_then_fifo():
+    async def run():
+        limiter = single_slot_limiter()
+        await limiter.acquire(10)   # hold the only slot
+        admitted = []
+        tasks = [
+            await queue_waiter(limiter, BACKGROUND, admitted, "background"),
+            await queue_waiter(limiter, BATCH, admitted, "batch"),
+            await queue_waiter(limiter, INTERACTIVE, admitted, "interactive-1"),
+            await queue_waiter(limiter, INTERACTIVE, admitted, "interactive-2"),
+        ]
+        for _ in tasks:
+            limiter.release(200, {})
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(asyncio.gather(*tasks), 1.0)
+        return admitted
+
+    assert asyncio.run(run()) == ["interactive-1", "interactive-2", "batch", "background"]
+
+
+def test_cancelled_after_admission_hands_slot_on():
+    async def run():
+        limiter = single_slot_limiter()
+        await limiter.acquire(10)
+        admitted = []
+        first = await queue_waiter(limiter, INTERACTIVE, admitted, "first")
+        second = await queue_waiter(limiter, INTERACTIVE, admitted, "second")
+
+        with limiter._lock:
+            limiter.in_flight -= 1   # the holder finishes; pump right away instead of via the timer
+        limiter._pump()
+        assert limiter.in_flight == 1 and not admitted
+        first.cancel()               # admitted, but cancelled before it resumed
+
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, 1.0)
+        return limiter, admitted
+
+    limiter, admitted = asyncio.run(run())
+    assert admitted == ["second"]
+    assert limiter.in_flight == 1
+
+
+def test_cancelled_while_queued_leaves_queue():
+    async def run():
+        limiter = single_slot_limiter()
+        await limiter.acquire(10)
+        admitted = []
+        waiter = await queue_waiter(limiter, BATCH, admitted, "batch")
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.stats()["queued_now"]["batch"] == 0
+    assert limiter.in_flight == 1
@@ -0,0 +1,152 @@
+"""
+SingleFlight coalescing, cancellation and the upstream's context.
+
+- identical concurrent calls share one upstream call; followers get copies;
+- a cancelled caller only stops waiting, the last one cancels the upstream call;
+- the upstream runs with the most urgent priority of its waiters, outside the leader's
+  request: a leader whose client disconnects does not charge it as cancelled.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from app.core.deadline import current_deadline, llm_deadline
+from app.core.disconnect import ClientDisconnected, run_until_disconnect, track_llm_call
+from app.core.rate_limiter import BACKGROUND, INTERACTIVE, current_priority, llm_priority
+from app.core.token_usage import token_ledger
+from app.services.single_flight import SingleFlight
+
+
+class Upstream:
+    """An upstream call that blocks until released and records what it saw."""
+
+    def __init__(self, result=None):
+        self.result = result if result is not None else {"feedback": ["ok"]}
+        self.release = asyncio.Event()
+        self.started = 0
+        self.cancelled = False
+        self.seen = {}
+
+    async def __call__(self):
+        self.started += 1
+        track_llm_call("run-1", "reading_feedback", "gpt-4o-mini")
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        self.seen = {"priority": current_priority(), "deadline": current_deadline()}
+        return self.result
+
+
+async def start(flight: SingleFlight, upstream: Upstream, priority: int = INTERACTIVE) -> asyncio.Task:
+    with llm_priority(priority):
+        task = asyncio.create_task(flight.do("key", upstream))
+    await asyncio.sleep(0)
+    return task
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    async def run():
+        flight, upstream = SingleFlight("test_coalesce"), Upstream()
+        tasks = [await start(flight, upstream) for _ in range(3)]
+        assert flight.in_flight == 1
+        upstream.release.set()
+        return flight, upstream, await asyncio.gather(*tasks)
+
+    flight, upstream, results = asyncio.run(run())
+    assert upstream.started == 1
+    assert all(result == upstream.result for result in results)
+    assert results[0] is upstream.result and results[1] is not results[2]
+    assert flight.stats() == {"calls": 3, "upstream": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def run():
+        flight, upstream = SingleFlight("test_cancel_one"), Upstream()
+        leader = await start(flight, upstream)
+        follower = await start(flight, upstream)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        upstream.release.set()
+        return flight, upstream, await follower
+
+    flight, upstream, result = asyncio.run(run())
+    assert result == upstream.result and not upstream.cancelled
+    assert flight.counters["cancelled_waiters"] == 1 and "cancelled_upstream" not in flight.counters
+
+
+def test_last_waiter_gone_cancels_upstream():
+    async def run():
+        flight, upstream = SingleFlight("test_cancel_all"), Upstream()
+        tasks = [await start(flight, upstream) for _ in range(2)]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flight, upstream
+
+    flight, upstream = asyncio.run(run())
+    assert upstream.cancelled
+    assert flight.counters["cancelled_upstream"] == 1 and flight.in_flight == 0
+
+
+def test_upstream_gets_most_urgent_priority_and_latest_deadline():
+    async def run():
+        flight, upstream = SingleFlight("test_urgency"), Upstream()
+        with llm_deadline(5):
+            leader = await start(flight, upstream, BACKGROUND)
+        with llm_deadline(30):
+            follower = await start(flight, upstream, INTERACTIVE)
+        upstream.release.set()
+        await asyncio.gather(leader, follower)
+        return upstream.seen
+
+    seen = asyncio.run(run())
+    assert seen["priority"] == INTERACTIVE
+    assert seen["deadline"] - time.monotonic() > 20
+
+
+def test_upstream_runs_without_deadline_when_a_waiter_has_none():
+    async def run():
+        flight, upstream = SingleFlight("test_no_deadline"), Upstream()
+        with llm_deadline(5):
+            leader = await start(flight, upstream)
+        follower = await start(flight, upstream)
+        upstream.release.set()
+        await asyncio.gather(leader, follower)
+        return upstream.seen
+
+    assert asyncio.run(run())["deadline"] is None
+
+
+def test_leader_disconnect_does_not_charge_shared_call():
+    async def run():
+        flight, upstream = SingleFlight("test_disconnect"), Upstream()
+        gone = asyncio.Event()
+
+        async def receive():
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        request = SimpleNamespace(receive=receive)
+        leader = asyncio.create_task(
+            run_until_disconnect(request, flight.do("key", upstream), app="test", route="/feedback"))
+        await asyncio.sleep(0)
+        follower = await start(flight, upstream)
+        before = token_ledger.snapshot()["cancelled"]
+        gone.set()
+        with pytest.raises(ClientDisconnected):
+            await leader
+        upstream.release.set()
+        return upstream, await follower, before
+
+    upstream, result, before = asyncio.run(run())
+    assert result == upstream.result and not upstream.cancelled
+    assert token_ledger.snapshot()["cancelled"] == before
@@ -0,0 +1,130 @@
+"""
+TurnGuard: one turn at a time per session, idempotent retries.
+
+- turns of one session run one after another, other sessions are not held up;
+- a turn that cannot get the session in time fails with TurnBusy;
+- a retry with the same key replays the stored reply, with another message it conflicts;
+- the same holds across workers sharing the SQLite lock file.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.turn_guard import IdempotencyConflict, TurnBusy, TurnGuard
+
+
+async def hold(guard: TurnGuard, session_id: str, entered: asyncio.Event, leave: asyncio.Event) -> None:
+    async with guard.turn(session_id, None, "first"):
+        entered.set()
+        await leave.wait()
+
+
+def test_turns_of_a_session_run_one_at_a_time():
+    async def run():
+        guard, order = TurnGuard(), []
+
+        async def turn(name):
+            async with guard.turn("s1", None, name):
+                order.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} end")
+
+        await asyncio.gather(turn("a"), turn("b"), turn("c"))
+        return guard, order
+
+    guard, order = asyncio.run(run())
+    assert order == ["a start", "a end", "b start", "b end", "c start", "c end"]
+    assert guard.counters["waited"] == 2
+    assert guard.stats()["sessions_in_turn"] == 0
+
+
+def test_other_sessions_are_not_held_up():
+    async def run():
+        guard = TurnGuard(timeout=0.05)
+        entered, leave = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(guard, "s1", entered, leave))
+        await entered.wait()
+        async with guard.turn("s2", None, "hello"):
+            pass
+        leave.set()
+        await holder
+
+    asyncio.run(run())
+
+
+def test_busy_session_times_out_and_lock_is_released():
+    async def run():
+        guard = TurnGuard(timeout=0.05)
+        entered, leave = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(guard, "s1", entered, leave))
+        await entered.wait()
+        with pytest.raises(TurnBusy):
+            async with guard.turn("s1", None, "second"):
+                pass
+        leave.set()
+        await holder
+        async with guard.turn("s1", None, "third"):
+            pass
+        return guard
+
+    guard = asyncio.run(run())
+    assert guard.counters["busy"] == 1
+    assert guard.stats()["sessions_in_turn"] == 0
+
+
+def test_retry_replays_stored_reply():
+    async def run():
+        guard, replays = TurnGuard(), []
+
+        async def turn():
+            async with guard.turn("s1", "key-1", "1-A, 2-B") as slot:
+                replays.append(slot.replay)
+                if slot.replay is None:
+                    await asyncio.sleep(0.01)
+                    slot.store("graded")
+
+        await asyncio.gather(turn(), turn())   # the retry arrives while the first turn runs
+        return guard, replays
+
+    guard, replays = asyncio.run(run())
+    assert replays == [None, "graded"]
+    assert guard.counters["replayed"] == 1 and guard.stats()["stored_replies"] == 1
+
+
+def test_key_reused_for_another_message_conflicts():
+    async def run():
+        guard = TurnGuard()
+        async with guard.turn("s1", "key-1", "1-A, 2-B") as slot:
+            slot.store("graded")
+        with pytest.raises(IdempotencyConflict):
+            async with guard.turn("s1", "key-1", "something else"):
+                pass
+        async with guard.turn("s2", "key-1", "something else") as slot:   # keys are per session
+            return slot.replay
+
+    assert asyncio.run(run()) is None
+
+
+def test_workers_share_lock_and_replies(tmp_path):
+    db_path = str(tmp_path / "turns.db")
+
+    async def run():
+        first, second = TurnGuard(db_path=db_path, timeout=0.2), TurnGuard(db_path=db_path, timeout=0.2)
+        entered, leave = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(first, "s1", entered, leave))
+        await entered.wait()
+        with pytest.raises(TurnBusy):
+            async with second.turn("s1", None, "second"):
+                pass
+        leave.set()
+        await holder
+
+        async with first.turn("s1", "key-1", "1-A") as slot:
+            slot.store("graded")
+        async with second.turn("s1", "key-1", "1-A") as slot:
+            return second, slot.replay
+
+    second, replay = asyncio.run(run())
+    assert replay == "graded"
+    assert second.counters["waited_other_worker"] == 1